@@ -0,0 +1,140 @@
+"""
+Mesh decoding that does not depend on Qt or OpenGL, so that it can run in
+worker processes. Meshes are passed around as dicts of float32/uint32 arrays
+(see MeshData.FromArrays), which pickle cheaply between processes.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+	import pyassimp as ai
+except ImportError:
+	ai = None  # only needed for formats other than OBJ
+
+from bvh import BVH
+from common import *
+from mesh_cache import MeshCache
+from mesh_optimizer import format_stats, optimize_mesh
+from mesh_simplifier import generate_lods
+from obj_loader import load_obj
+from vertex_format import VertexLayout
+
+
+def _use_builtin_loader ( file_name ):
+	return file_name.lower().endswith('.obj') and (MESH_LOADER == 'builtin' or ai is None)
+
+
+def _cache_key ( cache, file_name, offset ):
+	optimizer = (MESH_WELD_TOLERANCE, VERTEX_CACHE_SIZE) if MESH_OPTIMIZE else None
+	return cache.key(file_name, offset, 'builtin' if _use_builtin_loader(file_name) else 'assimp', optimizer,
+	                 tuple(MESH_LOD_GRID_SIZES), (VERTEX_POSITION_FORMAT, VERTEX_NORMAL_FORMAT, VERTEX_COLOR_ATTRIBUTE))
+
+
+def _pack_vertices ( arrays, layout ):
+	"""
+	Add the interleaved vertex buffer of a mesh, so that uploads do not pack on the render thread
+	"""
+	arrays['vertex_data'], arrays['position_scale'], arrays['position_offset'] = \
+		layout.pack(arrays['vertices'], arrays['colors'], arrays['normals'])
+	return arrays
+
+
+def read_mesh_arrays ( file_name, offset = 0.0, cache = None ):
+	"""
+	Parse a mesh file, generate its levels of detail, optimize them, pack their vertices with the
+	configured VertexLayout and build the BVH,
+	OBJ files are read with the built-in loader unless MESH_LOADER asks for pyassimp
+	:param offset: subtracted from every vertex position
+	:param cache: optional MeshCache, on a hit the arrays are memory-mapped instead of parsed
+	:return: dict of arrays, level n is stored under the 'lod<n>_' prefix
+	"""
+	if cache is not None:
+		key = _cache_key(cache, file_name, offset)
+		arrays = cache.load(key)
+		if arrays is not None:
+			return arrays
+
+	if _use_builtin_loader(file_name):
+		vertices, colors, normals, indices, texturecoords = load_obj(file_name)
+		vertices -= offset
+	else:
+		scene = ai.load(file_name)
+		mesh = scene.meshes[0]
+		vertices = (mesh.vertices - offset).astype(np.float32)
+		indices = mesh.faces.flatten().astype(np.uint32)  # make 1d for passing
+		colors = np.asarray(mesh.colors, dtype = np.float32)
+		normals = np.asarray(mesh.normals, dtype = np.float32)
+		texturecoords = np.asarray(mesh.texturecoords, dtype = np.float32)
+
+	arrays = dict(vertices = vertices,
+	              colors = colors,
+	              normals = normals,
+	              indices = indices,
+	              texturecoords = texturecoords)
+	lods = generate_lods(arrays, MESH_LOD_GRID_SIZES)
+	if MESH_OPTIMIZE:
+		arrays, stats = optimize_mesh(arrays, MESH_WELD_TOLERANCE, VERTEX_CACHE_SIZE)
+		if MESH_OPTIMIZER_VERBOSE:
+			print(format_stats(file_name, stats))
+		lods = [optimize_mesh(lod, MESH_WELD_TOLERANCE, VERTEX_CACHE_SIZE)[0] for lod in lods]
+	layout = VertexLayout(VERTEX_POSITION_FORMAT, VERTEX_NORMAL_FORMAT, VERTEX_COLOR_ATTRIBUTE)
+	_pack_vertices(arrays, layout)
+	for lod in lods:
+		_pack_vertices(lod, layout)
+	for level, lod in enumerate(lods, 1):
+		for k, v in lod.items():
+			arrays['lod{}_{}'.format(level, k)] = v
+	# after the optimizer, which reorders triangles, so that hit ids index the stored indices
+	for k, v in BVH(arrays['vertices'], arrays['indices']).to_arrays().items():
+		arrays['bvh_' + k] = v
+
+	if cache is not None:
+		cache.store(key, arrays)
+	return arrays
+
+
+def _read_mesh_worker ( file_name, offset, cache_directory ):
+	cache = MeshCache(cache_directory) if cache_directory is not None else None
+	return read_mesh_arrays(file_name, offset, cache)
+
+
+class MeshReader(object):
+	"""
+	Long-lived reader for loading meshes one at a time on demand, cache hits are returned
+	right away and misses are parsed in a process pool that is started on first use
+	"""
+
+	def __init__ (self, cache = None, workers = None):
+		"""
+		:param cache: optional MeshCache
+		:param workers: pool size, None for one per core, 1 to parse in this process
+		"""
+		self._cache = cache
+		self._workers = workers or os.cpu_count() or 1
+		self._pool = None
+
+	def request (self, file_name, offset = 0.0):
+		"""
+		:return: dict of arrays when they are available now, otherwise a Future resolving to it
+		"""
+		if self._workers <= 1:
+			return read_mesh_arrays(file_name, offset, self._cache)
+
+		if self._cache is not None:
+			arrays = self._cache.load(_cache_key(self._cache, file_name, offset))
+			if arrays is not None:
+				return arrays
+
+		if self._pool is None:
+			self._pool = ProcessPoolExecutor(max_workers = self._workers,
+			                                 mp_context = multiprocessing.get_context('spawn'))
+		cache_directory = self._cache.directory if self._cache is not None else None
+		return self._pool.submit(_read_mesh_worker, file_name, offset, cache_directory)
+
+	def shutdown (self):
+		if self._pool is not None:
+			self._pool.shutdown(wait = False, cancel_futures = True)
+			self._pool = None
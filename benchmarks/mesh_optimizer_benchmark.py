@@ -0,0 +1,26 @@
+"""
+Report what the mesh optimization stage does to the meshes in mesh/.
+
+Usage: python benchmarks/mesh_optimizer_benchmark.py
+"""
+import glob
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from common import *
+from mesh_optimizer import format_stats, optimize_mesh
+from obj_loader import load_obj
+
+if __name__ == '__main__':
+	for file_name in sorted(glob.glob(os.path.join(ROOT, 'mesh', '*.obj'))):
+		vertices, colors, normals, indices, texturecoords = load_obj(file_name)
+		arrays = dict(vertices = vertices, colors = colors, normals = normals, indices = indices,
+		              texturecoords = texturecoords)
+		start = timeit.default_timer()
+		_, stats = optimize_mesh(arrays, MESH_WELD_TOLERANCE, VERTEX_CACHE_SIZE)
+		elapsed = timeit.default_timer() - start
+		print(format_stats(os.path.basename(file_name), stats) + ', {:.1f} ms'.format(elapsed * 1e3))
@@ -0,0 +1,46 @@
+"""
+Compare the built-in OBJ reader against pyassimp on the meshes in mesh/.
+
+Usage: python benchmarks/obj_loader_benchmark.py
+"""
+import glob
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from obj_loader import load_obj
+
+try:
+	import pyassimp as ai
+except ImportError:
+	ai = None
+
+
+def load_assimp ( file_name ):
+	scene = ai.load(file_name)
+	mesh = scene.meshes[0]
+	result = (mesh.vertices.astype(np.float32), mesh.normals.astype(np.float32), mesh.faces.flatten())
+	ai.release(scene)
+	return result
+
+
+def best_of ( func, repeat = 5 ):
+	return min(timeit.repeat(func, number = 1, repeat = repeat))
+
+
+if __name__ == '__main__':
+	if ai is None:
+		print('pyassimp is not installed, timing the built-in reader only')
+
+	for file_name in sorted(glob.glob(os.path.join(ROOT, 'mesh', '*.obj'))):
+		builtin = best_of(lambda: load_obj(file_name))
+		line = '{:>16s}: builtin {:8.2f} ms'.format(os.path.basename(file_name), builtin * 1e3)
+		if ai is not None:
+			assimp = best_of(lambda: load_assimp(file_name))
+			line += ', pyassimp {:8.2f} ms, speedup {:5.1f}x'.format(assimp * 1e3, assimp / builtin)
+		print(line)
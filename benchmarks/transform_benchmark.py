@@ -0,0 +1,39 @@
+"""
+Compare the per-entity transformation path against the batched one.
+
+Usage: python benchmarks/transform_benchmark.py [entity counts...]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from utils import create_transformation_matrix, create_transformation_matrices
+
+
+def run ( n, repeat = 5 ):
+	rng = np.random.default_rng(0)
+	positions = rng.uniform(-50.0, 50.0, (n, 3))
+	rotations = rng.uniform(0.0, 360.0, (n, 3))
+	scales = rng.uniform(1.0, 20.0, (n, 3))
+
+	def per_entity ():
+		return [create_transformation_matrix(positions[i], rotations[i], scales[i]) for i in range(n)]
+
+	def batched ():
+		return create_transformation_matrices(positions, rotations, scales)
+
+	number = max(1, 2000 // n)
+	t_single = min(timeit.repeat(per_entity, number = number, repeat = repeat)) / number
+	t_batch = min(timeit.repeat(batched, number = number, repeat = repeat)) / number
+	print('{:>6d} entities: per-entity {:9.3f} ms, batched {:7.3f} ms, speedup {:6.1f}x'.format(
+		n, t_single * 1e3, t_batch * 1e3, t_single / t_batch))
+
+
+if __name__ == '__main__':
+	counts = [int(a) for a in sys.argv[1:]] or [96, 1024, 10000]
+	for count in counts:
+		run(count)
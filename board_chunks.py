@@ -0,0 +1,118 @@
+"""
+The static board baked into chunk meshes. A chunk holds the tiles of a square
+block of the grid as one mesh with the tile color and the tile index per
+vertex, so buffers and draw calls grow with the number of chunks rather than
+the number of tiles. A chunk is baked again only when the color of one of its
+tiles changed. Tiles that move or animate are hidden in their chunk by index
+and drawn as separate entities on top.
+"""
+import numpy as np
+
+from utils import create_transformation_matrices
+
+
+class TileGrid(object):
+	def __init__ (self, rows, cols, length, colors, chunk_size, y = -0.25, scale = (1.0, 1.0, 1.0)):
+		"""
+		:param length: distance between tile centers, the grid is centered on the origin
+		:param colors: (rows * cols, 3) base colors, tile (row, col) at col + row * cols
+		:param chunk_size: tiles along each side of a chunk
+		:param scale: of the tile model
+		"""
+		self.rows = rows
+		self.cols = cols
+		self.chunk_size = chunk_size
+		self.scale = np.asarray(scale, dtype = np.float64)
+
+		row, col = np.divmod(np.arange(rows * cols), cols)
+		self.positions = np.zeros(shape = (rows * cols, 3))
+		self.positions[:, 0] = col * length - cols * length / 2.0 + length / 2.0
+		self.positions[:, 1] = y
+		self.positions[:, 2] = row * length - rows * length / 2.0 + length / 2.0
+
+		self.colors = np.array(colors, dtype = np.float32).reshape(rows * cols, 3)
+		self.original_colors = self.colors.copy()
+		self._baked_colors = np.full(self.colors.shape, np.nan, dtype = np.float32)  # nothing baked yet
+		self.hidden = np.zeros(rows * cols, dtype = bool)  # tiles drawn as overlays instead
+
+		self.chunk_rows = (rows + chunk_size - 1) // chunk_size
+		self.chunk_cols = (cols + chunk_size - 1) // chunk_size
+		self._chunk_of = (row // chunk_size) * self.chunk_cols + col // chunk_size
+		order = np.argsort(self._chunk_of, kind = 'stable')
+		counts = np.bincount(self._chunk_of, minlength = self.chunk_count)
+		self._chunk_tiles = np.split(order, np.cumsum(counts)[:-1])
+		self._dirty = set(range(self.chunk_count))  # chunks that may differ from their baked colors
+
+	@classmethod
+	def Checkerboard (cls, rows, cols, length, chunk_size, y = -0.25, scale = (1.0, 1.0, 1.0)):
+		row, col = np.divmod(np.arange(rows * cols), cols)
+		colors = np.where(((row + col) % 2 == 0)[:, np.newaxis], 0.0, 1.0) * np.ones(3)  # black and white
+		return cls(rows, cols, length, colors, chunk_size, y, scale)
+
+	def __len__ (self):
+		return self.rows * self.cols
+
+	def index (self, row, col):
+		return col + row * self.cols
+
+	@property
+	def chunk_count (self):
+		return self.chunk_rows * self.chunk_cols
+
+	def chunk_tiles (self, chunk):
+		"""
+		:return: sorted tile indices of a chunk
+		"""
+		return self._chunk_tiles[chunk]
+
+	def set_color (self, index, color):
+		"""
+		Colors are only written through here or reset_colors, so that unchanged chunks are never compared
+		"""
+		self.colors[index] = color
+		self._dirty.add(int(self._chunk_of[index]))
+
+	def reset_colors (self):
+		self.colors[:] = self.original_colors
+		self._dirty.update(range(self.chunk_count))
+
+	def dirty_chunks (self):
+		"""
+		:return: sorted indices of the chunks whose tile colors differ from the ones baked
+		"""
+		dirty = [c for c in sorted(self._dirty)
+		         if (self.colors[self._chunk_tiles[c]] != self._baked_colors[self._chunk_tiles[c]]).any()]
+		self._dirty = set(dirty)
+		return dirty
+
+	def bake (self, chunk, template):
+		"""
+		Build the mesh of one chunk from the tile model and remember the colors baked into it
+		:param template: dict with vertices, normals and indices of the tile model
+		:return: dict with world space vertices, normals, colors, tile_ids (float32, exact up to 2^24 tiles),
+		         uint32 indices and the world space bounds aabb_min and aabb_max, used for culling
+		"""
+		tiles = self.chunk_tiles(chunk)
+		vertices = np.asarray(template['vertices'], dtype = np.float64).reshape(-1, 3)
+		normals = np.asarray(template['normals'], dtype = np.float64).reshape(-1, 3)
+		indices = np.asarray(template['indices'], dtype = np.int64).reshape(-1)
+		count = len(vertices)
+
+		matrices = create_transformation_matrices(self.positions[tiles],
+		                                          np.zeros(shape = (len(tiles), 3)),
+		                                          np.broadcast_to(self.scale, (len(tiles), 3))).astype(np.float64)
+		world = np.einsum('nij,vj->nvi', matrices[:, :3, :3], vertices) + matrices[:, np.newaxis, :3, 3]
+		# same transformation of the normals as the shaders, the length is normalized away later
+		world_normals = np.einsum('nij,vj->nvi', matrices[:, :3, :3], normals)
+		world_normals /= np.maximum(np.linalg.norm(world_normals, axis = 2), 1e-12)[:, :, np.newaxis]
+
+		self._baked_colors[tiles] = self.colors[tiles]
+		self._dirty.discard(chunk)
+		return dict(aabb_min = world.min(axis = (0, 1)),
+		            aabb_max = world.max(axis = (0, 1)),
+		            vertices = world.reshape(-1, 3).astype(np.float32),
+		            normals = world_normals.reshape(-1, 3).astype(np.float32),
+		            colors = np.repeat(self.colors[tiles], count, axis = 0),
+		            tile_ids = np.repeat(tiles, count).astype(np.float32),
+		            indices = (indices[np.newaxis, :] + (np.arange(len(tiles)) * count)[:, np.newaxis])
+		            .reshape(-1).astype(np.uint32))
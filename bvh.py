@@ -0,0 +1,145 @@
+import numpy as np
+
+from utils import intersect_ray_aabbs, intersect_ray_triangles
+
+
+class BVH(object):
+	"""
+	Bounding volume hierarchy over the triangles of one mesh, in model space.
+	Nodes are stored in flat arrays and traversed breadth first so that every
+	level is a single vectorized box test.
+	"""
+
+	def __init__ (self, vertices, indices, leaf_size = 8):
+		vertices = np.asarray(vertices, dtype = np.float64).reshape(-1, 3)
+		faces = np.asarray(indices, dtype = np.int64).reshape(-1, 3)
+		triangles = vertices[faces]  # (T, 3, 3)
+
+		tri_min = triangles.min(axis = 1)
+		tri_max = triangles.max(axis = 1)
+		centroids = triangles.mean(axis = 1)
+
+		order = np.arange(len(faces))
+		bounds_min = []
+		bounds_max = []
+		left = []
+		right = []
+		start = []
+		count = []
+
+		# (node id, first, last) ranges into order, children are appended as they are split
+		stack = [(0, 0, len(order))]
+		bounds_min.append(None)
+		bounds_max.append(None)
+		left.append(-1)
+		right.append(-1)
+		start.append(0)
+		count.append(0)
+
+		while stack:
+			node, first, last = stack.pop()
+			items = order[first:last]
+			bounds_min[node] = tri_min[items].min(axis = 0)
+			bounds_max[node] = tri_max[items].max(axis = 0)
+
+			if last - first <= leaf_size:
+				start[node] = first
+				count[node] = last - first
+				continue
+
+			# median split along the longest axis of the centroid bounds
+			c = centroids[items]
+			axis = int(np.argmax(c.max(axis = 0) - c.min(axis = 0)))
+			mid = (last - first) // 2
+			order[first:last] = items[np.argpartition(c[:, axis], mid)]
+
+			for child_first, child_last in [(first, first + mid), (first + mid, last)]:
+				child = len(left)
+				bounds_min.append(None)
+				bounds_max.append(None)
+				left.append(-1)
+				right.append(-1)
+				start.append(0)
+				count.append(0)
+				if child_first == first:
+					left[node] = child
+				else:
+					right[node] = child
+				stack.append((child, child_first, child_last))
+
+		self.bounds_min = np.array(bounds_min)
+		self.bounds_max = np.array(bounds_max)
+		self.left = np.array(left, dtype = np.int64)
+		self.right = np.array(right, dtype = np.int64)
+		self.start = np.array(start, dtype = np.int64)
+		self.count = np.array(count, dtype = np.int64)
+
+		# triangles in leaf order, and their index in the original index buffer
+		self.triangle_ids = order
+		self.v0 = triangles[order, 0]
+		self.v1 = triangles[order, 1]
+		self.v2 = triangles[order, 2]
+
+	# names of the arrays that fully describe a built hierarchy
+	ARRAYS = ('bounds_min', 'bounds_max', 'left', 'right', 'start', 'count', 'triangle_ids', 'v0', 'v1', 'v2')
+
+	def to_arrays (self):
+		return dict((name, getattr(self, name)) for name in BVH.ARRAYS)
+
+	@classmethod
+	def FromArrays (cls, arrays):
+		"""
+		Restore a hierarchy built earlier without rebuilding it
+		:param arrays: dict returned by to_arrays
+		"""
+		bvh = cls.__new__(cls)
+		for name in BVH.ARRAYS:
+			setattr(bvh, name, arrays[name])
+		return bvh
+
+	def __len__ (self):
+		return len(self.left)
+
+	def bounds (self):
+		"""
+		:return: (min, max) corners of the whole mesh
+		"""
+		return self.bounds_min[0], self.bounds_max[0]
+
+	def intersect (self, origin, direction, t_max = np.inf):
+		"""
+		Closest hit of a ray with the mesh
+		:param origin: 3d ray origin in model space
+		:param direction: 3d ray direction in model space
+		:param t_max: ignore hits farther than this
+		:return: (t, triangle id), (inf, -1) if there is no hit
+		"""
+		origin = np.asarray(origin, dtype = np.float64)
+		direction = np.asarray(direction, dtype = np.float64)
+
+		frontier = np.zeros((1,), dtype = np.int64)
+		leaves = []
+		while len(frontier) > 0:
+			t_near, _, hit = intersect_ray_aabbs(origin, direction,
+			                                     self.bounds_min[frontier], self.bounds_max[frontier])
+			frontier = frontier[hit & (t_near <= t_max)]
+			is_leaf = self.left[frontier] < 0
+			leaves.append(frontier[is_leaf])
+			inner = frontier[~is_leaf]
+			frontier = np.concatenate([self.left[inner], self.right[inner]])
+
+		leaves = np.concatenate(leaves)
+		if len(leaves) == 0:
+			return np.inf, -1
+
+		# expand the leaf ranges into triangle positions
+		counts = self.count[leaves]
+		offsets = np.repeat(self.start[leaves] - np.cumsum(counts) + counts, counts)
+		candidates = offsets + np.arange(counts.sum())
+
+		t = intersect_ray_triangles(origin, direction,
+		                            self.v0[candidates], self.v1[candidates], self.v2[candidates])
+		i = int(np.argmin(t))
+		if t[i] > t_max or np.isinf(t[i]):
+			return np.inf, -1
+		return float(t[i]), int(self.triangle_ids[candidates[i]])
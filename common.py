@@ -5,6 +5,25 @@ FLOAT_SIZE = 4
 DOUBLE_SIZE = 8
 UNSIGNED_INT_SIZE = 4
 
+# Asset loading
+MESH_CACHE_DIRECTORY = '.cache/mesh'  # set to None to always parse the assets
+PROGRAM_CACHE_DIRECTORY = '.cache/program'  # linked shader binaries, set to None to always compile
+PROGRAM_CACHE_VERBOSE = False  # print the cache status and compile time of every shader program, a summary is always printed
+MESH_LOADER = 'builtin'  # 'builtin' NumPy OBJ reader or 'assimp', other formats always use pyassimp
+MESH_LOADER_WORKERS = None  # processes used to parse meshes, None for one per core, 1 to parse on the render thread
+MESH_OPTIMIZE = True  # weld, reorder for the vertex cache and narrow indices before upload
+MESH_WELD_TOLERANCE = 1e-5  # vertices closer than this in every attribute are merged
+MESH_OPTIMIZER_VERBOSE = False  # print before/after vertex, index and acmr statistics
+VERTEX_CACHE_SIZE = 16  # post-transform cache entries assumed when reordering triangles
+MESH_LOD_GRID_SIZES = (32, 16, 8)  # clustering grid per generated level of detail, coarsest last, () for none
+MESH_LOD_SCREEN_SIZES = (150.0, 60.0, 25.0)  # projected diameter in pixels below which level i + 1 is drawn
+MESH_LOD_HYSTERESIS = 0.15  # fraction a size has to move past a threshold before the level changes
+VERTEX_POSITION_FORMAT = 'unorm16'  # 'float32', 'float16' or 'unorm16' relative to the mesh bounds
+VERTEX_NORMAL_FORMAT = 'oct16'  # 'float32' or 'oct16', octahedral encoded snorm16
+VERTEX_COLOR_ATTRIBUTE = False  # upload per-vertex colors, unused since the shaders draw with uniform_color
+MODEL_MEMORY_BUDGET = 256 * 1024 * 1024  # bytes of vertex and index buffers kept on the gpu, None for no limit
+MODEL_PROXY_BOUNDS = (np.array([-0.18, 0.0, -0.18]), np.array([0.18, 0.9, 0.18]))  # drawn while a mesh loads
+
 # Model indices
 CUBE_MODEL_INDEX = 0
 CHESS_KING_MODEL_INDEX = 1
@@ -57,17 +76,40 @@ WHITE_PAWN_6 = 34
 WHITE_PAWN_7 = 35
 WHITE_PAWN_8 = 36
 
+# Board layout
+BOARD_ROWS = 8
+BOARD_COLS = 8
+BOARD_TILE_LENGTH = 10.0
+BOARD_TILE_GAP = 0.1  # margin inside each tile that is not pickable
+BOARD_CHUNK_SIZE = 32  # tiles along each side of a baked board chunk
+BOARD_OVERLAY_CAPACITY = 16  # tiles drawn over the baked board at once while they animate
+REGION_SELECTION_SAMPLE_STEP = 4  # pixels between rays cast for a region selection
+
 # Player indices
 PLAYER_BLACK = 0
 PLAYER_WHITE = 1
 
 # Rendering enumerations
+GL_ERROR_CHECKING = True  # PyOpenGL glGetError after every call, False for lower call overhead
+PROFILER_ENABLED = False  # record frame phase timings from the start, the overlay toggles it at runtime
+PROFILER_HISTORY = 120  # frames kept for the overlay and the trace export
+PROFILER_QUERY_RING = 8  # GL_TIME_ELAPSED queries in flight, passes are left untimed when all are busy
+PROFILER_TRACE_FILE = 'frame_trace.json'
+ADAPTIVE_RESOLUTION = True  # render the scene at a lower resolution while the gpu misses the target frame time
+RESOLUTION_TARGET_MS = 12.0  # gpu time of the scene passes, leaves room for Qt Quick within 60 Hz
+RESOLUTION_SCALE_MIN = 0.5  # of the native resolution in each direction
+RESOLUTION_SCALE_MAX = 1.0
+RENDER_ON_DEMAND = True  # draw frames only when the scene changed, False to redraw continuously
+FRAME_UNIFORM_BINDING = 0  # uniform buffer binding point of the FrameData block
+SHINE_DAMPER = 20.0
+REFLECTIVITY = 1.0
 CLEAR_COLOR = np.zeros((3,)) + 0.4
 
 TILE_STATIC_SCALE = np.array([9.6, 0.5, 9.5])
 TILE_HOVER_Y_POSITION = 1.0
 TILE_HOVER_COLOR = np.array([1.0, 0.843, 0.0])
 TILE_SELECTED_COLOR = np.array([0.53, 0.15, 0.34])  # 135 	38 	87
+TILE_REGION_COLOR = np.array([0.25, 0.55, 0.85])  # 64 	140 	217
 
 PIECE_STATIC_Y_OFFSET = 2.0
 PIECE_SELECTION_Y_VALUE = 10.0
@@ -18,42 +18,206 @@ class Camera(QObject):
 	def __init__ (self, parent = None):
 		super(Camera, self).__init__(parent)
 
-		self.eye = np.array([-35.88407358, 83.68050208, -69.64410608])
-		self.up = np.array([0.0, 1.0, 0.0])
-		self.target = np.array([0.2827449, -0.74757148, 0.49111322])
-		self.x = None
-		self.y = None
-		self.z = None
+		self._eye = np.array([-35.88407358, 83.68050208, -69.64410608])
+		self._up = np.array([0.0, 1.0, 0.0])
+		self._target = np.array([0.2827449, -0.74757148, 0.49111322])  # viewing direction
+
+		self.fovy = 45.0
+		self.near_z = 0.001
+		self.far_z = 500.0
+		self._width = 640.0
+		self._height = 480.0
 
 		self.mouse_x = 0.0
 		self.mouse_y = 0.0
+
+		# orthonormal basis: x is right, y is up and z points backwards
+		self._x = None
+		self._y = None
+		self._z = None
+		self._basis_updates = 0
+
+		self._basis_dirty = True
+		self._view_dirty = True
+		self._projection_dirty = True
+		self._view_projection_dirty = True
+
 		self._view_matrix = np.identity(4)
+		self._inverse_view_matrix = np.identity(4)
 		self._projection_matrix = np.identity(4)
-		self.update_view_matrix()
+		self._inverse_projection_matrix = np.identity(4)
+		self._view_projection_matrix = np.identity(4)
+
+	# Vectors are replaced, not written in place, so that assignment alone can invalidate the caches
+	@property
+	def eye (self):
+		return self._eye
+
+	@eye.setter
+	def eye (self, value):
+		self._eye = np.array(value, dtype = np.float64)
+		self._view_dirty = True
+
+	@property
+	def target (self):
+		return self._target
+
+	@target.setter
+	def target (self, value):
+		self._target = np.array(value, dtype = np.float64)
+		self._basis_dirty = True
+
+	@property
+	def up (self):
+		return self._up
+
+	@up.setter
+	def up (self, value):
+		self._up = np.array(value, dtype = np.float64)
+		self._basis_dirty = True
+
+	@property
+	def x (self):
+		self._update_basis()
+		return self._x
+
+	@property
+	def y (self):
+		self._update_basis()
+		return self._y
+
+	@property
+	def z (self):
+		self._update_basis()
+		return self._z
 
 	def get_view_matrix (self):
+		self._update_view()
 		return self._view_matrix
 
+	def get_inverse_view_matrix (self):
+		self._update_view()
+		return self._inverse_view_matrix
+
 	def get_projection_matrix (self):
+		self._update_projection()
 		return self._projection_matrix
 
+	def get_inverse_projection_matrix (self):
+		self._update_projection()
+		return self._inverse_projection_matrix
+
+	def get_view_projection_matrix (self):
+		if self._view_projection_dirty or self._view_dirty or self._basis_dirty or self._projection_dirty:
+			self._view_projection_matrix = self.get_projection_matrix() @ self.get_view_matrix()
+			self._view_projection_dirty = False
+		return self._view_projection_matrix
+
 	def update_view_matrix (self):
-		self._view_matrix = look_at(self.eye, self.eye + self.target, self.up)
+		self._basis_dirty = True
 
 	def update_projection_matrix (self, w, h):
-		self._projection_matrix = perspective_projection(45.0, w / h, 0.001, 500.0)
+		"""
+		Set the viewport size
+		:return: True if the projection changed
+		"""
+		if w == self._width and h == self._height:
+			return False
+		self._width = w
+		self._height = h
+		self._projection_dirty = True
+		return True
+
+	def _update_basis (self):
+		if not self._basis_dirty:
+			return
+		f = normalize_vector(self._target)
+		self._x = normalize_vector(np.cross(f, normalize_vector(self._up)))
+		self._y = np.cross(self._x, f)
+		self._z = -f
+		self._basis_updates = 0
+		self._basis_dirty = False
+		self._view_dirty = True
+
+	def _update_view (self):
+		self._update_basis()
+		if not self._view_dirty:
+			return
+		r = np.array([self._x, self._y, self._z])
+
+		# same result as look_at(eye, eye + target, up)
+		self._view_matrix = np.identity(4)
+		self._view_matrix[:3, :3] = r
+		self._view_matrix[:3, 3] = -r @ self._eye
+
+		# the view matrix is rigid, its inverse is the transposed rotation plus the eye
+		self._inverse_view_matrix = np.identity(4)
+		self._inverse_view_matrix[:3, :3] = r.T
+		self._inverse_view_matrix[:3, 3] = self._eye
+
+		self._view_dirty = False
+		self._view_projection_dirty = True
+
+	def _update_projection (self):
+		if not self._projection_dirty:
+			return
+		self._projection_matrix = perspective_projection(self.fovy, self._width / self._height, self.near_z, self.far_z)
+		self._inverse_projection_matrix = inverse_perspective_projection(self._projection_matrix)
+		self._projection_dirty = False
+		self._view_projection_dirty = True
+
+	def _rotate_basis (self, angle, axis):
+		self._target = rotate_vector(self._target, angle, axis)
+		if self._basis_dirty:
+			return
+		self._x = rotate_vector(self._x, angle, axis)
+		self._y = rotate_vector(self._y, angle, axis)
+		self._z = rotate_vector(self._z, angle, axis)
+		self._view_dirty = True
+
+		# rotations keep the basis orthonormal up to rounding, rebuild it once in a while
+		self._basis_updates += 1
+		if self._basis_updates > 256:
+			self._basis_dirty = True
+
+	def move (self, key):
+		"""
+		Move the eye along the camera basis
+		:param key: Camera.Translation
+		"""
+		self._update_basis()
+		if key == Camera.Translation.FORWARD:
+			self.eye = self._eye - self._z
+		elif key == Camera.Translation.BACKWARD:
+			self.eye = self._eye + self._z
+		elif key == Camera.Translation.LEFT:
+			self.eye = self._eye - self._x
+		elif key == Camera.Translation.RIGHT:
+			self.eye = self._eye + self._x
+		elif key == Camera.Translation.UP:
+			self.eye = self._eye + self._y
+		elif key == Camera.Translation.DOWN:
+			self.eye = self._eye - self._y
+
+	def turn (self, yaw, pitch):
+		"""
+		Turn the viewing direction, yaw around the world up and pitch around the camera x axis
+		:param yaw: degrees
+		:param pitch: degrees
+		"""
+		self._update_basis()
+		if yaw != 0.0:
+			self._rotate_basis(yaw, normalize_vector(self._up))
+		if pitch != 0.0:
+			self._rotate_basis(-pitch, self._x)
 
 	@pyqtSlot(float)
 	def translate (self, dist):
-		self.eye += dist * normalize_vector(self.x)
-		self.target += dist * normalize_vector(self.x)
-		self.update_view_matrix()
+		self.eye = self._eye + dist * self.x
 
 	@pyqtSlot(float)
 	def rotate (self, dist):
-		self.eye += dist * normalize_vector(self.y)
-		self.target += dist * normalize_vector(self.y)
-		self.update_view_matrix()
+		self.eye = self._eye + dist * self.y
 
 
 class Light(object):
@@ -72,11 +236,75 @@ class MousePicker(object):
 	def compute_mouse_ray (self, x, y, width, height):
 		ndc_point = convert_to_normalized_device_coords(x, y, width, height)
 		clip_coords_point = np.array([ndc_point[0], ndc_point[1], -1.0, 1.0])
-		view_coords_point = convert_to_eye_coords(clip_coords_point, self._camera.get_projection_matrix())
-		world_coords_point = convert_to_world_coords(view_coords_point, self._camera.get_view_matrix())
+		view_coords_point = self._camera.get_inverse_projection_matrix() @ clip_coords_point
+		view_coords_point[2] = -1.0
+		view_coords_point[3] = 0.0
+		world_coords_point = self._camera.get_inverse_view_matrix() @ view_coords_point
 		ray = np.array([world_coords_point[0], world_coords_point[1], world_coords_point[2]])
 		ray = normalize_vector(ray)
 		return ray
 
+	def compute_mouse_rays (self, points, width, height):
+		"""
+		Batched compute_mouse_ray
+		:param points: (N, 2) screen coords
+		:return: (N, 3) normalized world space ray directions
+		"""
+		points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+		clip_coords_points = np.empty(shape = (len(points), 4))
+		clip_coords_points[:, 0] = (2.0 * points[:, 0]) / float(width) - 1.0
+		clip_coords_points[:, 1] = 1.0 - (2.0 * points[:, 1]) / float(height)
+		clip_coords_points[:, 2] = -1.0
+		clip_coords_points[:, 3] = 1.0
+
+		view_coords_points = clip_coords_points @ self._camera.get_inverse_projection_matrix().T
+		view_coords_points[:, 2] = -1.0
+		view_coords_points[:, 3] = 0.0
+		rays = (view_coords_points @ self._camera.get_inverse_view_matrix().T)[:, :3]
+		return rays / la.norm(rays, axis = 1)[:, np.newaxis]
+
 	def update_ray (self, x, y, width, height):
 		self.ray = self.compute_mouse_ray(x, y, width, height)
+
+	@staticmethod
+	def pick_entity (entities, origin, direction):
+		"""
+		Find the closest entity hit by a ray. World space bounds of all entities are tested at once,
+		then the candidates are visited front to back and tested against their mesh BVH in model space.
+		:param entities: entities whose model has a bvh
+		:param origin: world space ray origin
+		:param direction: world space ray direction
+		:return: (entity, triangle id, t), (None, -1, inf) if nothing is hit
+		"""
+		entities = [e for e in entities if e.model is not None and e.model.bvh is not None]
+		if len(entities) == 0:
+			return None, -1, np.inf
+
+		matrices = np.array([e.model_matrix for e in entities], dtype = np.float64)
+		local_min = np.array([e.model.bvh.bounds_min[0] for e in entities])
+		local_max = np.array([e.model.bvh.bounds_max[0] for e in entities])
+
+		# transformed box of the local box, center and half extents
+		center = (local_min + local_max) / 2.0
+		extent = (local_max - local_min) / 2.0
+		world_center = np.einsum('nij,nj->ni', matrices[:, :3, :3], center) + matrices[:, :3, 3]
+		world_extent = np.einsum('nij,nj->ni', np.abs(matrices[:, :3, :3]), extent)
+
+		t_near, _, hit = intersect_ray_aabbs(origin, direction,
+		                                     world_center - world_extent, world_center + world_extent)
+
+		best = (None, -1, np.inf)
+		candidates = np.flatnonzero(hit)
+		for i in candidates[np.argsort(t_near[candidates])]:
+			if t_near[i] > best[2]:
+				break
+			e = entities[i]
+			inv = e.inverse_model_matrix
+
+			# the ray parameter is preserved by the affine map, so t stays comparable across entities
+			local_origin = inv[:3, :3] @ origin + inv[:3, 3]
+			local_direction = inv[:3, :3] @ direction
+			t, triangle = e.model.bvh.intersect(local_origin, local_direction, best[2])
+			if triangle >= 0 and t < best[2]:
+				best = (e, triangle, t)
+		return best
@@ -0,0 +1,160 @@
+"""
+Per-frame timings of the named phases of a frame. CPU phases are measured
+around the code, GPU passes arrive later from timer queries and are attached
+to the frame they were issued in. The last frames can be summarized for the
+overlay or exported as a Chrome trace (chrome://tracing, Perfetto). Frames are
+recorded on the render thread and read from the GUI thread, readers work on a
+copy taken under a lock.
+"""
+import collections
+import contextlib
+import json
+import threading
+import time
+
+
+class FrameRecord(object):
+	__slots__ = ('index', 'start', 'cpu', 'gpu')
+
+	def __init__ (self, index, start):
+		self.index = index
+		self.start = start  # perf_counter seconds
+		self.cpu = []  # (name, start seconds, duration seconds)
+		self.gpu = []  # (name, duration seconds)
+
+
+class FrameProfiler(object):
+	def __init__ (self, enabled = False, history = 120):
+		"""
+		:param history: number of finished frames kept
+		"""
+		self.enabled = enabled
+		self._lock = threading.Lock()  # guards _frames and _current
+		self._frames = collections.deque(maxlen = history)
+		self._current = None
+		self._index = 0
+
+	@property
+	def frame_index (self):
+		"""
+		Index of the frame being recorded, GPU results are reported against it
+		"""
+		return self._index
+
+	def begin_frame (self):
+		if self.enabled:
+			with self._lock:
+				self._current = FrameRecord(self._index, time.perf_counter())
+
+	def end_frame (self):
+		with self._lock:
+			if self._current is not None:
+				self._frames.append(self._current)
+				self._current = None
+		self._index += 1
+
+	@contextlib.contextmanager
+	def cpu (self, name):
+		"""
+		Time the body of the with statement as phase name of the current frame
+		"""
+		if self._current is None:
+			yield
+			return
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			duration = time.perf_counter() - start
+			with self._lock:
+				if self._current is not None:  # may have been cleared meanwhile
+					self._current.cpu.append((name, start, duration))
+
+	def add_gpu (self, frame_index, name, seconds):
+		"""
+		Attach a GPU pass duration to a frame that may have finished already, frames no longer kept are ignored
+		"""
+		with self._lock:
+			if self._current is not None and self._current.index == frame_index:
+				self._current.gpu.append((name, seconds))
+				return
+			for frame in reversed(self._frames):
+				if frame.index == frame_index:
+					frame.gpu.append((name, seconds))
+					return
+				if frame.index < frame_index:
+					return
+
+	def frames (self):
+		"""
+		:return: copies of the kept frames, safe to read while frames are recorded on another thread
+		"""
+		with self._lock:
+			frames = []
+			for frame in self._frames:
+				copy = FrameRecord(frame.index, frame.start)
+				copy.cpu = list(frame.cpu)
+				copy.gpu = list(frame.gpu)
+				frames.append(copy)
+			return frames
+
+	def clear (self):
+		with self._lock:
+			self._frames.clear()
+			self._current = None
+
+	def summary (self):
+		"""
+		:return: dict of 'cpu' and 'gpu' to OrderedDict of phase name to mean milliseconds over the kept frames,
+		         in the order the phases first appear, and of 'frames' to the number of frames
+		"""
+		frames = self.frames()
+		result = dict(frames = len(frames))
+		for kind in ('cpu', 'gpu'):
+			totals = collections.OrderedDict()
+			counts = dict()
+			for frame in frames:
+				for span in getattr(frame, kind):
+					totals[span[0]] = totals.get(span[0], 0.0) + span[-1]
+					counts[span[0]] = counts.get(span[0], 0) + 1
+			result[kind] = collections.OrderedDict((name, total * 1000.0 / counts[name])
+			                                       for name, total in totals.items())
+		return result
+
+	def format_summary (self):
+		summary = self.summary()
+		lines = ['frames {}'.format(summary['frames'])]
+		for kind in ('cpu', 'gpu'):
+			for name, ms in summary[kind].items():
+				lines.append('{} {:<18} {:7.3f} ms'.format(kind, name, ms))
+		return '\n'.join(lines)
+
+	def trace_events (self):
+		"""
+		:return: list of Chrome trace complete events, CPU phases on thread 1 and GPU passes on thread 2.
+		         Timer queries only measure durations, a GPU pass is placed at the start of the CPU phase
+		         of the same name, or at the frame start when there is none.
+		"""
+		frames = self.frames()
+		if len(frames) == 0:
+			return []
+		origin = frames[0].start
+		events = [dict(name = 'thread_name', ph = 'M', pid = 1, tid = 1, args = dict(name = 'cpu')),
+		          dict(name = 'thread_name', ph = 'M', pid = 1, tid = 2, args = dict(name = 'gpu'))]
+		for frame in frames:
+			starts = dict()
+			for name, start, duration in frame.cpu:
+				starts.setdefault(name, start)
+				events.append(dict(name = name, cat = 'cpu', ph = 'X', pid = 1, tid = 1,
+				                   ts = (start - origin) * 1e6, dur = duration * 1e6,
+				                   args = dict(frame = frame.index)))
+			for name, duration in frame.gpu:
+				start = starts.get(name, frame.start)
+				events.append(dict(name = name, cat = 'gpu', ph = 'X', pid = 1, tid = 2,
+				                   ts = (start - origin) * 1e6, dur = duration * 1e6,
+				                   args = dict(frame = frame.index)))
+		return events
+
+	def export_trace (self, file_name):
+		with open(file_name, 'w') as f:
+			json.dump(dict(traceEvents = self.trace_events(), displayTimeUnit = 'ms'), f)
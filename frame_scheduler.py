@@ -0,0 +1,71 @@
+"""
+Decides when the next frame is drawn. On demand, a frame is requested only
+after something dirtied the scene, and frames keep coming while animations
+or loads are in flight. In continuous mode every frame requests the next one.
+"""
+import time
+
+
+class FrameScheduler(object):
+	def __init__ (self, request_frame, on_demand = True):
+		"""
+		:param request_frame: callable scheduling one more frame, e.g. QQuickWindow.update
+		:param on_demand: False to redraw continuously
+		"""
+		self._request_frame = request_frame
+		self.on_demand = on_demand
+		self._dirty = True
+		self._frame_dirty = True
+		self._requested = False
+		self.reset_stats()
+
+	def invalidate (self):
+		"""
+		The scene changed (input, camera, board, resize), make sure another frame is drawn
+		"""
+		self._dirty = True
+		self._request()
+
+	def _request (self):
+		if not self._requested:
+			self._requested = True
+			self._request_frame()
+
+	def frame_started (self):
+		"""
+		Call when a frame begins, while the GUI thread is blocked (synchronization),
+		changes from here on need another frame
+		"""
+		self._requested = False
+		self._frame_dirty = self._dirty
+		self._dirty = False
+
+	def frame_rendered (self, animating = False):
+		"""
+		Call after every frame
+		:param animating: True while anything is still changing on its own, animations or pending loads
+		"""
+		self.frames += 1
+		if not self._frame_dirty and not animating:
+			self.idle_frames += 1  # nothing changed since the last frame, it could have been skipped
+
+		if animating or not self.on_demand:
+			self._request()
+
+	def reset_stats (self):
+		self.frames = 0
+		self.idle_frames = 0
+		self._wall_start = time.perf_counter()
+		self._cpu_start = time.process_time()
+
+	def stats (self):
+		"""
+		:return: dict of frames, idle frames (drawn without any change) and process cpu usage in percent
+		         of one core, all since the last reset_stats
+		"""
+		wall = max(time.perf_counter() - self._wall_start, 1e-9)
+		cpu = time.process_time() - self._cpu_start
+		return dict(frames = self.frames,
+		            idle_frames = self.idle_frames,
+		            seconds = wall,
+		            cpu_percent = 100.0 * cpu / wall)
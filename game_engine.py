@@ -127,9 +127,11 @@ class GameEngine(QObject):
 		self._board_table[7][7].piece = WHITE_TOWER_2
 
 		self._mouse_picker = MousePicker(self._camera)
+		self._entity_source = None
 
 		self._curr_row = -100
 		self._curr_col = -100
+		self._hover_tile = (None, None)
 
 		for i in range(8):
 			self._board_table[0][i].status = TILE_OCCUPIED
@@ -139,21 +141,78 @@ class GameEngine(QObject):
 
 		self._has_selected = False
 		self._selected_tile = [None, None]
-
-	def on_mouse_move (self, x, y):
+		self._region_table = np.zeros(shape = (BOARD_ROWS, BOARD_COLS), dtype = bool)
+
+	def set_entity_source (self, source):
+		"""
+		:param source: callable returning the entities that can be picked
+		"""
+		self._entity_source = source
+
+	def _pick_tile (self, x, y):
+		"""
+		Cast the mouse ray onto the pieces, then onto the board plane
+		:return: (row, col), or (None, None) if no tile is hit
+		"""
 		self._mouse_picker.update_ray(x, y, self._window.width(), self._window.height())
+
+		if self._entity_source is not None:
+			e, _, _ = MousePicker.pick_entity(self._entity_source(), self._camera.eye, self._mouse_picker.ray)
+			if e is not None and getattr(e, 'row', None) is not None:
+				return e.row, e.col
+
 		plane_point = find_plane_point(self._camera.eye, self._camera.eye + self._mouse_picker.ray * 500.0)
-		self._curr_row, self._curr_col = find_coords_on_plane(plane_point, 10.0, 8, 8)
-		self._hover_table = np.zeros(shape = (8, 8))
-		if self._curr_row is not None and self._curr_col is not None:
-			for r in range(8):
-				for c in range(8):
-					self._hover_table[self._curr_row][self._curr_col] = 1
+		return find_coords_on_plane(plane_point, BOARD_TILE_LENGTH, BOARD_ROWS, BOARD_COLS, BOARD_TILE_GAP)
+
+	def on_mouse_move (self, x, y):
+		row, col = self._pick_tile(x, y)
+		self._curr_row, self._curr_col = row, col
+		if (row, col) == self._hover_tile:
+			return
+
+		# only the previously and newly hovered cells change
+		if self._hover_tile[0] is not None:
+			self._hover_table[self._hover_tile[0]][self._hover_tile[1]] = 0
+		if row is not None:
+			self._hover_table[row][col] = 1
+		self._hover_tile = (row, col)
+
+	def select_region (self, x, y, width, height):
+		"""
+		Select every tile under a screen rectangle by casting a grid of rays through it
+		:return: list of (row, col)
+		"""
+		x0, x1 = sorted([x, x + width])
+		y0, y1 = sorted([y, y + height])
+		xs = np.append(np.arange(x0, x1, REGION_SELECTION_SAMPLE_STEP), x1)
+		ys = np.append(np.arange(y0, y1, REGION_SELECTION_SAMPLE_STEP), y1)
+		points = np.stack(np.meshgrid(xs, ys), axis = -1).reshape(-1, 2)
+
+		rays = self._mouse_picker.compute_mouse_rays(points, self._window.width(), self._window.height())
+		plane_points = find_plane_points(self._camera.eye, rays)
+		rows, cols = find_coords_on_plane_batch(plane_points, BOARD_TILE_LENGTH, BOARD_ROWS, BOARD_COLS,
+		                                        BOARD_TILE_GAP)
+
+		self._region_table = np.zeros(shape = (BOARD_ROWS, BOARD_COLS), dtype = bool)
+		hit = rows >= 0
+		self._region_table[rows[hit], cols[hit]] = True
+		return [(int(r), int(c)) for r, c in np.argwhere(self._region_table)]
+
+	def region_selection (self):
+		"""
+		:return: list of (row, col, piece) for the tiles in the current region selection, piece may be None
+		"""
+		return [(int(r), int(c), self._board_table[r][c].piece) for r, c in np.argwhere(self._region_table)]
+
+	def clear_region_selection (self):
+		self._region_table[:] = False
+
+	def region_table (self):
+		return self._region_table
 
 	def on_clicked (self, button, x, y):
-		self._mouse_picker.update_ray(x, y, self._window.width(), self._window.height())
-		plane_point = find_plane_point(self._camera.eye, self._camera.eye + self._mouse_picker.ray * 500.0)
-		self._curr_row, self._curr_col = find_coords_on_plane(plane_point, 10.0, 8, 8)
+		self.clear_region_selection()
+		self._curr_row, self._curr_col = self._pick_tile(x, y)
 		if self._curr_row is None or self._curr_col is None:
 			return
 		if button == 0 and self._board_table[self._curr_row][self._curr_col].status == TILE_OCCUPIED:
@@ -231,6 +290,7 @@ class GameEngine(QObject):
 
 		self._curr_row = -100
 		self._curr_col = -100
+		self._hover_tile = (None, None)
 
 		for i in range(8):
 			self._board_table[0][i].status = TILE_OCCUPIED
@@ -240,6 +300,7 @@ class GameEngine(QObject):
 
 		self._has_selected = False
 		self._selected_tile = [None, None]
+		self._region_table = np.zeros(shape = (BOARD_ROWS, BOARD_COLS), dtype = bool)
 
 	def delete_current_selection (self):
 		if self._has_selected:
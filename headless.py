@@ -0,0 +1,232 @@
+"""
+Render the scene without a window, into a framebuffer object of an offscreen
+surface, so that frame times can be measured on machines without a display or
+a GPU (Mesa llvmpipe). Every frame goes through the same sync, prepare and
+render calls window.View makes, while the camera follows a scripted path.
+
+Usage: python headless.py [--frames N] [--size WIDTHxHEIGHT] [--path static|pan|dolly] [--scale S] [--checksum]
+                          [--output file.csv]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import OpenGL
+
+from common import GL_ERROR_CHECKING
+
+OpenGL.ERROR_CHECKING = GL_ERROR_CHECKING  # only read when OpenGL.GL is first imported
+import OpenGL.GL as GL
+from PyQt5.QtCore import QObject, QSize
+from PyQt5.QtGui import (QGuiApplication,
+                         QOffscreenSurface,
+                         QOpenGLContext,
+                         QOpenGLFramebufferObject,
+                         QSurfaceFormat)
+
+from entity import Camera
+from game_engine import GameEngine
+from render_engine import GpuTimerRing, SceneRenderer
+
+# SceneRenderer.draw_counters written per frame to the csv
+COUNTER_COLUMNS = ('shader_binds', 'model_binds', 'draws', 'state_calls_issued', 'state_calls_skipped')
+
+
+def _pan ( renderer, frame ):
+	renderer.rotate_camera(40, 0)
+
+
+def _dolly ( renderer, frame ):
+	key = Camera.Translation.FORWARD if (frame // 60) % 2 == 0 else Camera.Translation.BACKWARD
+	renderer.move_camera(key)
+
+
+# camera path name -> callable(renderer, frame index) applied before every frame
+CAMERA_PATHS = {
+	'static': lambda renderer, frame: None,
+	'pan': _pan,
+	'dolly': _dolly,
+}
+
+
+class HeadlessWindow(QObject):
+	"""
+	Stands in for window.View, the renderer only asks it for its size and reports selection changes to it
+	"""
+
+	def __init__ (self, width, height, parent = None):
+		super(HeadlessWindow, self).__init__(parent)
+		self._size = QSize(width, height)
+
+	def width (self):
+		return self._size.width()
+
+	def height (self):
+		return self._size.height()
+
+	def size (self):
+		return self._size
+
+	def devicePixelRatio (self):
+		return 1.0
+
+	def on_selection_color_changed (self, r, g, b):
+		pass
+
+	def on_selection_position_changed (self, x, y, z):
+		pass
+
+	def on_selection_rotation_changed (self, rx, ry, rz):
+		pass
+
+	def on_selection_scale_changed (self, x, y, z):
+		pass
+
+
+class HeadlessRenderer(object):
+	def __init__ (self, width = 640, height = 480, scale = None):
+		"""
+		Needs a QGuiApplication, QT_QPA_PLATFORM=offscreen works without a display
+		:param scale: fixed resolution scale, None to let it adapt to the frame time as configured
+		"""
+		surface_format = QSurfaceFormat()
+		surface_format.setVersion(4, 1)
+		surface_format.setProfile(QSurfaceFormat.CoreProfile)
+
+		self._context = QOpenGLContext()
+		self._context.setFormat(surface_format)
+		if not self._context.create():
+			raise RuntimeError('cannot create an OpenGL 4.1 core context')
+		self._surface = QOffscreenSurface()
+		self._surface.setFormat(self._context.format())
+		self._surface.create()
+		if not self._context.makeCurrent(self._surface):
+			raise RuntimeError('cannot make the OpenGL context current')
+
+		self._fbo = QOpenGLFramebufferObject(QSize(width, height), QOpenGLFramebufferObject.CombinedDepthStencil)
+
+		self._window = HeadlessWindow(width, height)
+		self._camera = Camera()
+		self._renderer = SceneRenderer(self._window, self._camera)
+		if scale is not None:
+			scaler = self._renderer.resolution_scaler()
+			scaler.min_scale = scaler.max_scale = scaler.scale = scale
+		self._game = GameEngine(self._window, self._camera)
+		self._game.delete_entity.connect(self._renderer.on_delete_entity)
+		self._game.set_entity_source(self._renderer.pickable_entities)
+
+		self._fbo.bind()
+		self._renderer.initialize()
+		# timestamps rather than GL_TIME_ELAPSED, which cannot nest around the renderer's own pass queries
+		self._queries = GL.glGenQueries(2)
+
+	def render_frame (self, checksum = False):
+		"""
+		:param checksum: also hash the pixels, the read back stalls the pipeline and is not part of the timings
+		:return: dict of cpu_ms (sync, prepare and render calls), gpu_ms (between GL_TIMESTAMP queries),
+		         resolution scale, checksum or None and the renderer's draw counters
+		"""
+		QGuiApplication.processEvents()  # animations advance from the event loop
+		self._fbo.bind()
+
+		start = time.perf_counter()
+		GL.glQueryCounter(self._queries[0], GL.GL_TIMESTAMP)
+		self._renderer.sync()
+		self._renderer.prepare_titles(self._game.hover_table(), self._game.region_table())
+		self._renderer.prepare_pieces(self._game.board_table())
+		self._renderer.render()
+		GL.glQueryCounter(self._queries[1], GL.GL_TIMESTAMP)
+		cpu = time.perf_counter() - start
+		# waits for the frame
+		gpu = (GpuTimerRing.Result(GL, self._queries[1], GL.GL_QUERY_RESULT) -
+		       GpuTimerRing.Result(GL, self._queries[0], GL.GL_QUERY_RESULT)) * 1e-6
+
+		digest = None
+		if checksum:
+			GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, self._fbo.handle())
+			pixels = GL.glReadPixels(0, 0, self._fbo.width(), self._fbo.height(), GL.GL_RGBA, GL.GL_UNSIGNED_BYTE)
+			digest = hashlib.sha1(np.asarray(pixels, dtype = np.uint8).tobytes()).hexdigest()
+
+		sample = self._renderer.draw_counters()
+		sample.update(cpu_ms = cpu * 1000.0, gpu_ms = gpu, scale = self._renderer.resolution_scaler().scale,
+		              checksum = digest)
+		return sample
+
+	def settle (self, max_frames = 1000):
+		"""
+		Render until every model is loaded and no animation runs, so that timed frames are comparable
+		:return: number of frames rendered
+		"""
+		frames = 0
+		while self._renderer.is_animating() and frames < max_frames:
+			self.render_frame()
+			frames += 1
+		return frames
+
+	def run (self, frames, path = 'static', checksum = False):
+		"""
+		:param path: key of CAMERA_PATHS
+		:return: list of render_frame results
+		"""
+		move = CAMERA_PATHS[path]
+		samples = []
+		for frame in range(frames):
+			move(self._renderer, frame)
+			samples.append(self.render_frame(checksum))
+		return samples
+
+	def release (self):
+		GL.glDeleteQueries(2, self._queries)
+		self._fbo.release()
+		self._context.doneCurrent()
+
+
+def summarize ( samples, key ):
+	"""
+	:return: dict of mean, median, 95th percentile and max of one timing over all samples
+	"""
+	values = np.array([s[key] for s in samples], dtype = np.float64)
+	return dict(mean = values.mean(), median = np.median(values), p95 = np.percentile(values, 95), max = values.max())
+
+
+def main ( argv ):
+	parser = argparse.ArgumentParser(description = 'Render frames offscreen and report their timings')
+	parser.add_argument('--frames', type = int, default = 300)
+	parser.add_argument('--size', default = '640x480')
+	parser.add_argument('--scale', type = float, help = 'fixed resolution scale, pin it when comparing checksums')
+	parser.add_argument('--path', default = 'static', choices = sorted(CAMERA_PATHS.keys()))
+	parser.add_argument('--checksum', action = 'store_true', help = 'hash every frame')
+	parser.add_argument('--output', help = 'csv file of per-frame timings')
+	args = parser.parse_args(argv)
+	width, height = (int(v) for v in args.size.split('x'))
+
+	os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+	app = QGuiApplication(sys.argv[:1])
+
+	headless = HeadlessRenderer(width, height, args.scale)
+	print('settled after {} frames'.format(headless.settle()))
+	samples = headless.run(args.frames, args.path, args.checksum)
+	headless.release()
+
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			f.write(','.join(('frame', 'cpu_ms', 'gpu_ms', 'scale', 'checksum') + COUNTER_COLUMNS) + '\n')
+			for i, s in enumerate(samples):
+				f.write('{},{:.4f},{:.4f},{:.2f},{}'.format(i, s['cpu_ms'], s['gpu_ms'], s['scale'], s['checksum'] or ''))
+				f.write(''.join(',{}'.format(s[name]) for name in COUNTER_COLUMNS) + '\n')
+
+	for key in ('cpu_ms', 'gpu_ms'):
+		print('{}: mean {mean:.3f}, median {median:.3f}, p95 {p95:.3f}, max {max:.3f}'.format(
+			key, **summarize(samples, key)))
+	for key in COUNTER_COLUMNS:
+		print('{}: mean {:.1f}'.format(key, summarize(samples, key)['mean']))
+	if args.checksum:
+		print('last frame checksum {}'.format(samples[-1]['checksum']))
+	del app
+
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -1,5 +1,10 @@
 import sys
 
+import OpenGL
+
+from common import GL_ERROR_CHECKING
+
+OpenGL.ERROR_CHECKING = GL_ERROR_CHECKING  # only read when OpenGL.GL is first imported
 from PyQt5.QtCore import QUrl
 from PyQt5.QtGui import QGuiApplication, QSurfaceFormat
 from PyQt5.QtQuick import QQuickView
@@ -18,7 +23,6 @@ if __name__ == '__main__':
 	app = QGuiApplication(sys.argv)
 
 	# qmlRegisterType(ModelEntity, 'MyEntity', 1, 0, 'Entity')
-	# qmlRegisterType(ModelEntityList, 'MyEntity', 1, 0, 'EntityList')
 
 	view = View()
 	view.setResizeMode(QQuickView.SizeRootObjectToView)  # Set for the object to resize correctly
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class MeshCache(object):
+	"""
+	On-disk cache of post-processed mesh arrays. Every entry is a directory of
+	.npy files keyed by a hash of the source file content and the load
+	parameters, so warm starts can memory-map the arrays instead of parsing.
+	"""
+
+	# bump when the post-processing changes so that stale entries are not reused
+	VERSION = 2
+
+	def __init__ (self, directory):
+		self._directory = directory
+		self.hits = 0
+		self.misses = 0
+
+	@property
+	def directory (self):
+		return self._directory
+
+	def key (self, file_name, *params):
+		"""
+		:param file_name: source asset
+		:param params: anything else that changes the cached result
+		:return: hex digest
+		"""
+		h = hashlib.sha1()
+		with open(file_name, 'rb') as f:
+			for chunk in iter(lambda: f.read(1 << 20), b''):
+				h.update(chunk)
+		h.update(repr((MeshCache.VERSION,) + params).encode())
+		return h.hexdigest()
+
+	def load (self, key):
+		"""
+		:return: dict of read-only numpy.memmap arrays, or None on a miss
+		"""
+		path = os.path.join(self._directory, key)
+		if not os.path.isdir(path):
+			self.misses += 1
+			return None
+
+		arrays = dict()
+		try:
+			for file_name in os.listdir(path):
+				if file_name.endswith('.npy'):
+					arrays[file_name[:-4]] = np.load(os.path.join(path, file_name), mmap_mode = 'r')
+		except (OSError, ValueError):
+			# a truncated or corrupted entry is treated as missing and rebuilt
+			shutil.rmtree(path, ignore_errors = True)
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return arrays
+
+	def store (self, key, arrays):
+		"""
+		Write the entry to a temporary directory first so that readers never see a partial entry
+		:param arrays: dict of name to numpy array
+		"""
+		os.makedirs(self._directory, exist_ok = True)
+		tmp = tempfile.mkdtemp(dir = self._directory)
+		try:
+			for name, array in arrays.items():
+				np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(array))
+			os.rename(tmp, os.path.join(self._directory, key))
+		except OSError:
+			# another process stored the same entry first
+			shutil.rmtree(tmp, ignore_errors = True)
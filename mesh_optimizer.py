@@ -0,0 +1,168 @@
+"""
+Mesh optimization run between decoding and upload: near-duplicate vertices are
+welded, triangles are reordered for the post-transform vertex cache (Tipsify,
+Sander et al. 2007) and vertices for fetch locality, and indices are narrowed
+to uint16 when the vertex count allows it.
+"""
+import numpy as np
+
+
+def _vertex_attributes ( arrays ):
+	"""
+	:return: names of the per-vertex arrays, texturecoords is (channels, vertices, 3) and handled separately
+	"""
+	count = len(arrays['vertices'])
+	return [k for k in ('vertices', 'colors', 'normals') if len(arrays[k]) == count and count > 0]
+
+
+def weld_vertices ( arrays, tolerance = 1e-5 ):
+	"""
+	Merge vertices whose position, normal, color and texture coordinates all agree within tolerance,
+	triangles that collapse are dropped
+	:param arrays: dict with vertices, colors, normals, indices and texturecoords
+	:param tolerance: 0 for exact matches only
+	:return: new dict of arrays
+	"""
+	names = _vertex_attributes(arrays)
+	texturecoords = np.asarray(arrays['texturecoords'])
+	columns = [np.asarray(arrays[k], dtype = np.float64) for k in names]
+	if texturecoords.size > 0:
+		columns.append(texturecoords.transpose(1, 0, 2).reshape(len(arrays['vertices']), -1))
+	key = np.concatenate(columns, axis = 1)
+	if tolerance > 0.0:
+		key = np.round(key / tolerance).astype(np.int64)
+
+	_, first, remap = np.unique(key, axis = 0, return_index = True, return_inverse = True)
+	triangles = remap.reshape(-1)[np.asarray(arrays['indices'], dtype = np.int64)].reshape(-1, 3)
+	degenerate = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | \
+	             (triangles[:, 0] == triangles[:, 2])
+
+	out = dict(arrays)
+	for k in names:
+		out[k] = np.asarray(arrays[k])[first]
+	out['texturecoords'] = texturecoords[:, first] if texturecoords.size > 0 else texturecoords
+	out['indices'] = triangles[~degenerate].reshape(-1)
+	return out
+
+
+def tipsify ( indices, vertex_count, cache_size = 16 ):
+	"""
+	Reorder triangles so that consecutive ones share vertices still in a FIFO cache of cache_size
+	:return: reordered flat index array
+	"""
+	triangles = np.asarray(indices, dtype = np.int64).reshape(-1, 3)
+	flat = triangles.reshape(-1)
+	counts = np.bincount(flat, minlength = vertex_count)
+	offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+	adjacency = (np.argsort(flat, kind = 'stable') // 3).tolist()  # triangles around each vertex
+	triangles = triangles.tolist()
+
+	live = counts.tolist()
+	cache_time = [-cache_size - 1] * vertex_count
+	emitted = [False] * len(triangles)
+	dead_end = []
+	out = []
+	time = 0
+	cursor = 0
+	fan = 0
+
+	while fan >= 0:
+		candidates = []
+		for t in adjacency[offsets[fan]:offsets[fan + 1]]:
+			if emitted[t]:
+				continue
+			emitted[t] = True
+			for v in triangles[t]:
+				out.append(v)
+				dead_end.append(v)
+				candidates.append(v)
+				live[v] -= 1
+				if time - cache_time[v] > cache_size:
+					cache_time[v] = time
+					time += 1
+
+		# next fanning vertex: the one that stays in the cache longest after emitting its triangles
+		fan = -1
+		best = -1
+		for v in candidates:
+			if live[v] > 0:
+				priority = 0
+				if time - cache_time[v] + 2 * live[v] <= cache_size:
+					priority = time - cache_time[v]
+				if priority > best:
+					best = priority
+					fan = v
+		while fan < 0 and dead_end:
+			v = dead_end.pop()
+			if live[v] > 0:
+				fan = v
+		while fan < 0 and cursor < vertex_count:
+			if live[cursor] > 0:
+				fan = cursor
+			cursor += 1
+
+	return np.array(out, dtype = np.int64)
+
+
+def optimize_vertex_fetch ( arrays ):
+	"""
+	Renumber vertices in the order the index stream first uses them, unused vertices are dropped
+	:return: new dict of arrays
+	"""
+	indices = np.asarray(arrays['indices'], dtype = np.int64)
+	used, first = np.unique(indices, return_index = True)
+	order = used[np.argsort(first)]
+	remap = np.full(len(arrays['vertices']), -1, dtype = np.int64)
+	remap[order] = np.arange(len(order))
+
+	out = dict(arrays)
+	for k in _vertex_attributes(arrays):
+		out[k] = np.asarray(arrays[k])[order]
+	texturecoords = np.asarray(arrays['texturecoords'])
+	out['texturecoords'] = texturecoords[:, order] if texturecoords.size > 0 else texturecoords
+	out['indices'] = remap[indices]
+	return out
+
+
+def compute_acmr ( indices, cache_size = 16 ):
+	"""
+	Average cache miss ratio, transformed vertices per triangle with a FIFO cache of cache_size,
+	0.5 is the best possible for large regular meshes and 3.0 the worst
+	"""
+	indices = np.asarray(indices).tolist()
+	if len(indices) == 0:
+		return 0.0
+	stamp = dict()
+	misses = 0
+	for v in indices:
+		if misses - stamp.get(v, -cache_size) >= cache_size:
+			misses += 1
+			stamp[v] = misses
+	return misses * 3.0 / len(indices)
+
+
+def optimize_mesh ( arrays, tolerance = 1e-5, cache_size = 16 ):
+	"""
+	Weld, reorder for the vertex cache and for vertex fetch, then narrow the indices
+	:return: (dict of arrays, dict of before/after statistics)
+	"""
+	stats = dict(vertices_before = len(arrays['vertices']),
+	             indices_before = len(arrays['indices']),
+	             acmr_before = compute_acmr(arrays['indices'], cache_size))
+
+	out = weld_vertices(arrays, tolerance)
+	out['indices'] = tipsify(out['indices'], len(out['vertices']), cache_size)
+	out = optimize_vertex_fetch(out)
+	out['indices'] = out['indices'].astype(np.uint16 if len(out['vertices']) <= 65536 else np.uint32)
+
+	stats.update(vertices_after = len(out['vertices']),
+	             indices_after = len(out['indices']),
+	             acmr_after = compute_acmr(out['indices'], cache_size),
+	             index_type = out['indices'].dtype.name)
+	return out, stats
+
+
+def format_stats ( name, stats ):
+	return '{}: vertices {} -> {}, indices {} -> {} ({}), acmr {:.3f} -> {:.3f}'.format(
+		name, stats['vertices_before'], stats['vertices_after'], stats['indices_before'], stats['indices_after'],
+		stats['index_type'], stats['acmr_before'], stats['acmr_after'])
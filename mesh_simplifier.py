@@ -0,0 +1,116 @@
+"""
+Level of detail generation by quadric-error vertex clustering (Lindstrom 2000):
+vertices are grouped by a uniform grid, each cell collapses to the point that
+minimizes the squared distance to the planes of the triangles around it, and
+triangles whose corners fall into fewer than three cells disappear.
+"""
+import numpy as np
+
+
+def _face_normals ( vertices, triangles ):
+	"""
+	:return: (T, 3) normals scaled by twice the triangle area
+	"""
+	return np.cross(vertices[triangles[:, 1]] - vertices[triangles[:, 0]],
+	                vertices[triangles[:, 2]] - vertices[triangles[:, 0]])
+
+
+def _vertex_normals ( vertices, triangles ):
+	face_normals = _face_normals(vertices, triangles)
+	normals = np.zeros(shape = vertices.shape)
+	for k in range(3):
+		np.add.at(normals, triangles[:, k], face_normals)
+	length = np.linalg.norm(normals, axis = 1)
+	length[length == 0.0] = 1.0
+	return normals / length[:, np.newaxis]
+
+
+def simplify ( arrays, grid_size ):
+	"""
+	:param arrays: dict with vertices, colors, normals, indices and texturecoords
+	:param grid_size: number of cells along the longest side of the bounding box
+	:return: new dict of arrays with smooth normals, averaged colors and no texture coordinates
+	"""
+	vertices = np.asarray(arrays['vertices'], dtype = np.float64)
+	triangles = np.asarray(arrays['indices'], dtype = np.int64).reshape(-1, 3)
+
+	low = vertices.min(axis = 0)
+	cell_size = max((vertices.max(axis = 0) - low).max() / grid_size, 1e-12)
+	coords = np.floor((vertices - low) / cell_size).astype(np.int64)
+	_, cells = np.unique(coords, axis = 0, return_inverse = True)
+	cells = cells.reshape(-1)
+	cell_count = cells.max() + 1
+
+	# per cell quadric sum(area * (n.x + d)^2) as the normal equations A x = b
+	face_normals = _face_normals(vertices, triangles)
+	area = np.linalg.norm(face_normals, axis = 1)
+	valid = area > 0.0
+	n = face_normals[valid] / area[valid, np.newaxis]
+	d = -np.einsum('ij,ij->i', n, vertices[triangles[valid, 0]])
+	w = area[valid]
+	face_a = w[:, np.newaxis, np.newaxis] * n[:, :, np.newaxis] * n[:, np.newaxis, :]
+	face_b = -(w * d)[:, np.newaxis] * n
+
+	a = np.zeros(shape = (cell_count, 3, 3))
+	b = np.zeros(shape = (cell_count, 3))
+	for k in range(3):
+		np.add.at(a, cells[triangles[valid, k]], face_a)
+		np.add.at(b, cells[triangles[valid, k]], face_b)
+
+	# regularize towards the cell's vertex mean so flat and edge-only cells stay well defined
+	counts = np.bincount(cells, minlength = cell_count)[:, np.newaxis]
+	mean = np.zeros(shape = (cell_count, 3))
+	np.add.at(mean, cells, vertices)
+	mean /= counts
+	reg = 1e-3 * np.trace(a, axis1 = 1, axis2 = 2) / 3.0 + 1e-12
+	a += reg[:, np.newaxis, np.newaxis] * np.identity(3)
+	b += reg[:, np.newaxis] * mean
+	points = np.linalg.solve(a, b[:, :, np.newaxis])[:, :, 0]
+
+	# keep every representative inside its cell, a nearly singular quadric can throw it far away
+	cell_low = low + np.floor((mean - low) / cell_size) * cell_size
+	points = np.clip(points, cell_low, cell_low + cell_size)
+
+	# collapse, drop degenerate and duplicated triangles
+	new_triangles = cells[triangles]
+	keep = (new_triangles[:, 0] != new_triangles[:, 1]) & (new_triangles[:, 1] != new_triangles[:, 2]) & \
+	       (new_triangles[:, 0] != new_triangles[:, 2])
+	new_triangles = new_triangles[keep]
+	_, first = np.unique(np.sort(new_triangles, axis = 1), axis = 0, return_index = True)
+	new_triangles = new_triangles[np.sort(first)]
+
+	# only cells still referenced by a triangle become vertices
+	used, new_triangles = np.unique(new_triangles, return_inverse = True)
+	new_triangles = new_triangles.reshape(-1, 3)
+	points = points[used]
+
+	colors = np.asarray(arrays['colors'])
+	if len(colors) == len(vertices) and len(colors) > 0:
+		cell_colors = np.zeros(shape = (cell_count, colors.shape[1]))
+		np.add.at(cell_colors, cells, colors)
+		colors = (cell_colors / counts)[used].astype(np.float32)
+	else:
+		colors = np.zeros(shape = (0, 3), dtype = np.float32)
+
+	return dict(vertices = points.astype(np.float32),
+	            colors = colors,
+	            normals = _vertex_normals(points, new_triangles).astype(np.float32),
+	            indices = new_triangles.reshape(-1).astype(np.uint32),
+	            texturecoords = np.zeros(shape = (0, len(points), 3), dtype = np.float32))
+
+
+def generate_lods ( arrays, grid_sizes ):
+	"""
+	:param grid_sizes: one grid resolution per level after the full resolution one, coarsest last
+	:return: list of dicts of arrays, levels that would not reduce the triangle count are left out
+	"""
+	lods = []
+	triangle_count = len(arrays['indices']) // 3
+	for grid_size in grid_sizes:
+		lod = simplify(arrays, grid_size)
+		count = len(lod['indices']) // 3
+		if count == 0 or count >= triangle_count:
+			continue
+		lods.append(lod)
+		triangle_count = count
+	return lods
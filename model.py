@@ -1,10 +1,11 @@
 import numpy as np
-import pyassimp as ai
-from PyQt5.Qt import QQmlListProperty
 from PyQt5.QtCore import pyqtProperty, pyqtSignal, QObject
-from PyQt5.QtGui import QVector3D
-from PyQt5.QtQml import QQmlListProperty
+from PyQt5.QtGui import QMatrix4x4, QVector3D
+import numpy.linalg as la
+from asset_loader import read_mesh_arrays
+from bvh import BVH
 from common import *
+from utils import compute_bounds, create_transformation_matrices
 
 
 class MeshData(object):
@@ -25,6 +26,19 @@ class MeshData(object):
 		self.normals = normals
 		self.indices = indices
 		self.texturecoords = texturecoords
+		self.bvh = None
+		self.lods = []  # coarser MeshData, level 1 first
+		self.vertex_data = None  # interleaved vertices packed by the loader, uploaded as they are
+		self.position_scale = np.ones(3)  # dequantization of vertex_data positions, offset + stored * scale
+		self.position_offset = np.zeros(3)
+		self.compute_bounds()
+
+	def compute_bounds (self):
+		"""
+		Model space bounding box and sphere, used for culling
+		"""
+		vertices = self.vertices if self.vertices is not None else np.zeros(shape = (0, 3))
+		self.aabb_min, self.aabb_max, self.sphere_center, self.sphere_radius = compute_bounds(vertices)
 
 	@classmethod
 	def CheckData (cls, mesh):
@@ -41,22 +55,106 @@ class MeshData(object):
 			print(' texturecoords is empty')
 
 	@classmethod
-	def ReadFromFile (cls, file_name, name = 'None', offset = 0.0):
-		scene = ai.load(file_name)
-		mesh = scene.meshes[0]
-		vertices = mesh.vertices - offset
-		indices = mesh.faces.flatten()  # make 1d for passing
-		colors = mesh.colors
-		normals = mesh.normals
-		texturecoords = mesh.texturecoords
-		return MeshData(name, vertices, colors, normals, indices, texturecoords)
+	def FromArrays (cls, name, arrays):
+		mesh_data = MeshData(name,
+		                     arrays['vertices'],
+		                     arrays['colors'],
+		                     arrays['normals'],
+		                     arrays['indices'],
+		                     arrays['texturecoords'])
+		bvh_arrays = dict((k[4:], v) for k, v in arrays.items() if k.startswith('bvh_'))
+		if len(bvh_arrays) > 0:
+			mesh_data.bvh = BVH.FromArrays(bvh_arrays)
+		if 'vertex_data' in arrays:
+			mesh_data.vertex_data = arrays['vertex_data']
+			mesh_data.position_scale = np.array(arrays['position_scale'])
+			mesh_data.position_offset = np.array(arrays['position_offset'])
+
+		level = 1
+		while 'lod{}_vertices'.format(level) in arrays:
+			prefix = 'lod{}_'.format(level)
+			lod_arrays = dict((k[len(prefix):], v) for k, v in arrays.items() if k.startswith(prefix))
+			mesh_data.lods.append(MeshData.FromArrays('{}_lod{}'.format(name, level), lod_arrays))
+			level += 1
+		return mesh_data
+
+	@classmethod
+	def ReadFromFile (cls, file_name, name = 'None', offset = 0.0, cache = None):
+		"""
+		Load a mesh, vertex attributes are float32 and indices uint32 so they can be uploaded as they are
+		:param cache: optional MeshCache, on a hit the arrays are memory-mapped instead of parsed
+		"""
+		return MeshData.FromArrays(name, read_mesh_arrays(file_name, offset, cache))
 
 
 class RawModel(object):
-	def __init__ (self, vao, indices_vbo, num_indices):
+	def __init__ (self, vao, indices_vbo, num_indices, bvh = None):
 		self.vao = vao
 		self.indices_vbo = indices_vbo
 		self.num_indices = num_indices  # For glDrawElements()
+		self.bvh = bvh  # for picking, in model space
+		self.vbos = []  # every buffer owned by the vao, released together with it
+		self.index_type = None  # GL_UNSIGNED_SHORT or GL_UNSIGNED_INT, for glDrawElements()
+		self.gpu_bytes = 0
+		self.lods = []  # coarser RawModel, level 1 first
+		self.position_scale = np.ones(3)  # dequantization of the stored positions, offset + stored * scale
+		self.aabb_min = None  # model space bounds, None until loaded
+		self.aabb_max = None
+		self.position_offset = np.zeros(3)
+
+	def lod (self, level):
+		"""
+		:return: the model to draw for a level of detail, the coarsest one available past the last level
+		"""
+		if level <= 0 or len(self.lods) == 0:
+			return self
+		return self.lods[min(level, len(self.lods)) - 1]
+
+	def is_resident (self):
+		return self.vao is not None
+
+
+class TrackedArray(np.ndarray):
+	"""
+	Float array that notifies its owner whenever it is written in place,
+	arrays derived from it (copies, slices, arithmetic results) are not tracked
+	"""
+
+	def __new__ (cls, data, on_change):
+		obj = np.array(data, dtype = np.float64).view(cls)
+		obj._on_change = on_change
+		return obj
+
+	def __array_finalize__ (self, obj):
+		self._on_change = None
+
+	def _changed (self):
+		if self._on_change is not None:
+			self._on_change()
+
+	def __setitem__ (self, key, value):
+		super(TrackedArray, self).__setitem__(key, value)
+		self._changed()
+
+	def __iadd__ (self, other):
+		super(TrackedArray, self).__iadd__(other)
+		self._changed()
+		return self
+
+	def __isub__ (self, other):
+		super(TrackedArray, self).__isub__(other)
+		self._changed()
+		return self
+
+	def __imul__ (self, other):
+		super(TrackedArray, self).__imul__(other)
+		self._changed()
+		return self
+
+	def __itruediv__ (self, other):
+		super(TrackedArray, self).__itruediv__(other)
+		self._changed()
+		return self
 
 
 class ModelEntity(QObject):
@@ -66,13 +164,120 @@ class ModelEntity(QObject):
 		super(ModelEntity, self).__init__(parent)
 		self._name = 'ModelEntity'
 		self.model = None
-		self.position = None
-		self.rotation = None
-		self.scale = None
-		self.color = None
+		self.lod = 0  # level of detail drawn last frame
+
+		# cached world transform and uploaded values, rebuilt only when dirty
+		self._transform_dirty = True
+		self._color_dirty = True
+		self._model_matrix = None
+		self._model_matrix_qt = None
+		self._inverse_model_matrix = None
+		self._color_qt = None
+
+		self._position_array = None
+		self._rotation_array = None
+		self._scale_array = None
+		self._color_array = None
+
 		self.original_color = None
 		self.select_color = None
 		self.alpha = None
+		self.revision = 0  # bumped on every transform or color change, for copies kept in gpu buffers
+
+	def _invalidate_transform (self):
+		self._transform_dirty = True
+		self.revision += 1
+
+	def _invalidate_color (self):
+		self._color_dirty = True
+		self.revision += 1
+
+	@property
+	def position (self):
+		return self._position_array
+
+	@position.setter
+	def position (self, value):
+		self._position_array = None if value is None else TrackedArray(value, self._invalidate_transform)
+		self._invalidate_transform()
+
+	@property
+	def rotation (self):
+		return self._rotation_array
+
+	@rotation.setter
+	def rotation (self, value):
+		self._rotation_array = None if value is None else TrackedArray(value, self._invalidate_transform)
+		self._invalidate_transform()
+
+	@property
+	def scale (self):
+		return self._scale_array
+
+	@scale.setter
+	def scale (self, value):
+		self._scale_array = None if value is None else TrackedArray(value, self._invalidate_transform)
+		self._invalidate_transform()
+
+	@property
+	def color (self):
+		return self._color_array
+
+	@color.setter
+	def color (self, value):
+		self._color_array = None if value is None else TrackedArray(value, self._invalidate_color)
+		self._invalidate_color()
+
+	def set_model_matrix (self, m):
+		self._model_matrix = m
+		self._model_matrix_qt = None
+		self._inverse_model_matrix = None
+		self._transform_dirty = False
+
+	@property
+	def model_matrix (self):
+		if self._transform_dirty:
+			self.set_model_matrix(create_transformation_matrices(self.position, self.rotation, self.scale)[0])
+		return self._model_matrix
+
+	@property
+	def model_matrix_qt (self):
+		m = self.model_matrix
+		if self._model_matrix_qt is None:
+			self._model_matrix_qt = QMatrix4x4(m.flatten().tolist())
+		return self._model_matrix_qt
+
+	@property
+	def inverse_model_matrix (self):
+		m = self.model_matrix
+		if self._inverse_model_matrix is None:
+			self._inverse_model_matrix = la.inv(m.astype(np.float64))
+		return self._inverse_model_matrix
+
+	@property
+	def color_qt (self):
+		if self._color_dirty:
+			self._color_qt = QVector3D(self.color[0], self.color[1], self.color[2])
+			self._color_dirty = False
+		return self._color_qt
+
+	@classmethod
+	def UpdateModelMatrices (cls, entities):
+		"""
+		Rebuild the cached model matrices of all dirty entities in one batch
+		:param entities: iterable of ModelEntity
+		:return: number of entities updated
+		"""
+		dirty = [e for e in entities if e._transform_dirty]
+		if len(dirty) == 0:
+			return 0
+
+		matrices = create_transformation_matrices([e.position for e in dirty],
+		                                          [e.rotation for e in dirty],
+		                                          [e.scale for e in dirty])
+		for e, m in zip(dirty, matrices):
+			e.set_model_matrix(m)
+		return len(dirty)
 
 	@pyqtProperty('QString', notify = name_changed)
 	def name (self):
@@ -131,48 +336,6 @@ class ModelEntity(QObject):
 		self.alpha = alpha
 
 
-class ModelEntityList(QObject):
-	def __init__ (self, parent = None):
-		super(ModelEntityList, self).__init__(parent)
-		self._entities = []
-
-	@pyqtProperty(QQmlListProperty)
-	def entities (self):
-		"""
-		This method is for Qml to access the list
-		:return:
-		"""
-		return QQmlListProperty(ModelEntity, self, self._entities)
-
-	@pyqtProperty(int)
-	def length (self):
-		return len(self._entities)
-
-	def get_entities (self):
-		"""
-		This method is for Python to access the list
-		:return:
-		"""
-		return self._entities
-
-	def __getitem__ (self, key):
-		if key >= len(self._entities):
-			raise IndexError()
-		return self._entities[key]
-
-	def __setitem__ (self, key, value):
-		self._entities[key] = value
-
-	def __len__ (self):
-		return len(self._entities)
-
-	def append (self, item):
-		self._entities.append(item)
-
-	def extend (self, lst):
-		self._entities.extend(lst)
-
-
 class TexturedModel(object):
 	def __init__ (self, raw_model = None, texture = None):
 		self.raw_model = raw_model
@@ -226,37 +389,24 @@ class EntityCreator(object):
 		e.color = color
 		return e
 
-	def create_checker_board (self, title_entities, length = 10.0, rows = 8, cols = 8):
-		y = -0.25
-		color_black = np.array([0.0, 0.0, 0.0])
-		color_white = np.array([1.0, 1.0, 1.0])
-
-		for row in range(rows):
-			for col in range(cols):
-				position = np.array([col * length - cols * length / 2.0 + length / 2.0,
-				                     y,
-				                     row * length - rows * length / 2.0 + length / 2.0])
-				rotation = np.array([0.0, 0.0, 0.0])
-				scale = TILE_STATIC_SCALE
-				if (col + row) % 2 == 0:
-					color = color_black.copy()
-				else:
-					color = color_white.copy()
-
-				e = ModelEntity()
-				e.model = self._models[CUBE_MODEL_INDEX]
-				e.position = position
-				e.rotation = rotation
-				e.scale = scale
-				e.color = color
-				e.original_color = color.copy()
-				title_entities.append(e)
-
-	def create_chess_pieces (self, piece_entities, tile_entities):
+	def create_tile (self, board, index):
+		"""
+		Entity of one tile of a TileGrid, drawn over the baked board while it moves
+		"""
+		e = ModelEntity()
+		e.model = self._models[CUBE_MODEL_INDEX]
+		e.position = board.positions[index].copy()
+		e.rotation = np.array([0.0, 0.0, 0.0])
+		e.scale = board.scale.copy()
+		e.color = board.colors[index].astype(np.float64)
+		e.original_color = board.original_colors[index].astype(np.float64)
+		return e
+
+	def create_chess_pieces (self, piece_entities, tile_positions):
 		"""
 
 		:param piece_entities: in charge of all the entities
-		:param tile_entities: for position reference
+		:param tile_positions: (rows * cols, 3) tile centers, for position reference
 		:return:
 		"""
 
@@ -267,51 +417,53 @@ class EntityCreator(object):
 
 		# black and white pawns
 		for i in range(8):
-			piece_entities[1][i] = self.create_piece(1, i, CHESS_PAWN_MODEL_INDEX, color_black, tile_entities,
+			piece_entities[1][i] = self.create_piece(1, i, CHESS_PAWN_MODEL_INDEX, color_black, tile_positions,
 			                                         select_color1, PLAYER_BLACK)
-			piece_entities[6][i] = self.create_piece(6, i, CHESS_PAWN_MODEL_INDEX, color_white, tile_entities,
+			piece_entities[6][i] = self.create_piece(6, i, CHESS_PAWN_MODEL_INDEX, color_white, tile_positions,
 			                                         select_color2, PLAYER_WHITE)
 
-		piece_entities[0][0] = self.create_piece(0, 0, CHESS_TOWER_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][0] = self.create_piece(0, 0, CHESS_TOWER_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][1] = self.create_piece(0, 1, CHESS_KNIGHT_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][1] = self.create_piece(0, 1, CHESS_KNIGHT_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][2] = self.create_piece(0, 2, CHESS_BISHOP_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][2] = self.create_piece(0, 2, CHESS_BISHOP_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][3] = self.create_piece(0, 3, CHESS_KING_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][3] = self.create_piece(0, 3, CHESS_KING_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][4] = self.create_piece(0, 4, CHESS_QUEEN_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][4] = self.create_piece(0, 4, CHESS_QUEEN_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][5] = self.create_piece(0, 5, CHESS_BISHOP_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][5] = self.create_piece(0, 5, CHESS_BISHOP_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][6] = self.create_piece(0, 6, CHESS_KNIGHT_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][6] = self.create_piece(0, 6, CHESS_KNIGHT_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
-		piece_entities[0][7] = self.create_piece(0, 7, CHESS_TOWER_MODEL_INDEX, color_black, tile_entities,
+		piece_entities[0][7] = self.create_piece(0, 7, CHESS_TOWER_MODEL_INDEX, color_black, tile_positions,
 		                                         select_color1, PLAYER_BLACK)
 
-		piece_entities[7][0] = self.create_piece(7, 0, CHESS_TOWER_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][0] = self.create_piece(7, 0, CHESS_TOWER_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][1] = self.create_piece(7, 1, CHESS_KNIGHT_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][1] = self.create_piece(7, 1, CHESS_KNIGHT_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][2] = self.create_piece(7, 2, CHESS_BISHOP_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][2] = self.create_piece(7, 2, CHESS_BISHOP_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][3] = self.create_piece(7, 3, CHESS_KING_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][3] = self.create_piece(7, 3, CHESS_KING_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][4] = self.create_piece(7, 4, CHESS_QUEEN_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][4] = self.create_piece(7, 4, CHESS_QUEEN_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][5] = self.create_piece(7, 5, CHESS_BISHOP_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][5] = self.create_piece(7, 5, CHESS_BISHOP_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][6] = self.create_piece(7, 6, CHESS_KNIGHT_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][6] = self.create_piece(7, 6, CHESS_KNIGHT_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
-		piece_entities[7][7] = self.create_piece(7, 7, CHESS_TOWER_MODEL_INDEX, color_white, tile_entities,
+		piece_entities[7][7] = self.create_piece(7, 7, CHESS_TOWER_MODEL_INDEX, color_white, tile_positions,
 		                                         select_color2, PLAYER_WHITE)
 
-	def create_piece (self, row, col, role, color, tile_entities, select_color, player):
+	def create_piece (self, row, col, role, color, tile_positions, select_color, player):
 		e = PieceModelEntity()
 		e.model = self._models[role]
+		e.row = row
+		e.col = col
 
 		e.color = color.copy()
-		e.position = tile_entities[col + row * 8].position.copy()
+		e.position = tile_positions[col + row * 8].copy()
 		e.position[1] += PIECE_STATIC_Y_OFFSET
 		e.rotation = np.zeros(shape = (3,))
 		e.scale = PIECE_STATIC_SCALE.copy()
@@ -0,0 +1,163 @@
+"""
+On-demand model loading. Entities hold RawModel handles that start out empty,
+a handle is filled the first time it is drawn and emptied again when the gpu
+memory budget runs out and it has not been drawn for a while.
+"""
+from concurrent.futures import Future, wait
+
+from common import *
+from model import MeshData, RawModel
+from utils import *
+
+
+class ModelRegistry(object):
+	def __init__ (self, gpu_manager, reader, proxy_index = CUBE_MODEL_INDEX, memory_budget = MODEL_MEMORY_BUDGET):
+		"""
+		:param gpu_manager: uploads MeshData with load_to_vao and frees it with release_model
+		:param reader: asset_loader.MeshReader
+		:param proxy_index: model drawn in place of meshes that are still loading, scaled to MODEL_PROXY_BOUNDS
+		:param memory_budget: bytes, None for no limit
+		"""
+		self._gpu_manager = gpu_manager
+		self._reader = reader
+		self._proxy_index = proxy_index
+		self._memory_budget = memory_budget
+
+		self._files = dict()  # index -> (file_name, name, offset)
+		self._handles = dict()  # index -> RawModel, filled while resident
+		self._mesh_data = dict()  # index -> MeshData kept for re-uploading after eviction
+		self._pending = dict()  # index -> Future of the mesh arrays
+		self._prefetched = dict()  # index -> mesh arrays or Future requested ahead of the first draw
+		self._failed = set()  # indices whose mesh could not be read, drawn as the proxy
+		self._last_used = dict()  # index -> frame
+		self._frame = 0
+
+		size = MODEL_PROXY_BOUNDS[1] - MODEL_PROXY_BOUNDS[0]
+		center = (MODEL_PROXY_BOUNDS[0] + MODEL_PROXY_BOUNDS[1]) / 2.0
+		self.proxy_matrix = create_transformation_matrix(center, np.zeros(3), size)  # unit cube to proxy bounds
+
+	def register (self, index, file_name, name, offset = 0.0):
+		self._files[index] = (file_name, name, offset)
+		self._handles[index] = RawModel(None, None, 0)
+		self._handles[index].index = index
+
+	def __getitem__ (self, index):
+		return self._handles[index]
+
+	def __contains__ (self, index):
+		return index in self._handles
+
+	def acquire (self, model):
+		"""
+		Resolve a handle for drawing, starting its load on first use
+		:return: the handle if it is resident, otherwise the proxy model, or None if that is not ready either
+		"""
+		index = model.index
+		self._last_used[index] = self._frame
+		if model.is_resident():
+			return model
+
+		if index in self._failed:
+			return self._acquire_proxy(index)
+
+		if index not in self._mesh_data:
+			file_name, _, offset = self._files[index]
+			try:
+				if index in self._prefetched:
+					self._pending[index] = self._prefetched.pop(index)
+				elif index not in self._pending:
+					self._pending[index] = self._reader.request(file_name, offset)
+				request = self._pending[index]
+				if isinstance(request, Future):
+					if not request.done():
+						return self._acquire_proxy(index)
+					request = request.result()
+			except Exception as e:
+				# reported once, the entity keeps the proxy instead of failing every frame
+				self._pending.pop(index, None)
+				self._failed.add(index)
+				print('cannot load {}: {}'.format(file_name, e))
+				return self._acquire_proxy(index)
+			del self._pending[index]
+			self._mesh_data[index] = MeshData.FromArrays(self._files[index][1], request)
+			model.bvh = self._mesh_data[index].bvh
+
+		self._gpu_manager.load_to_vao(self._mesh_data[index], model)
+		return model
+
+	def _acquire_proxy (self, index):
+		if index == self._proxy_index:
+			return None
+		return self.acquire(self._handles[self._proxy_index])
+
+	def load (self, indices):
+		"""
+		Load models right away instead of on first draw, blocking until they are resident
+		"""
+		for index in indices:
+			model = self._handles[index]
+			while self.acquire(model) is not model:
+				if index in self._failed:
+					raise RuntimeError('cannot load {}'.format(self._files[index][0]))
+				wait([self._pending[index]])
+
+	def prefetch (self, indices):
+		"""
+		Start reading meshes without waiting for them or uploading them, so that they are decoded
+		in parallel by the reader's pool and ready by the time their entities are first drawn
+		"""
+		for index in indices:
+			if index in self._mesh_data or index in self._pending or index in self._prefetched:
+				continue
+			file_name, _, offset = self._files[index]
+			try:
+				self._prefetched[index] = self._reader.request(file_name, offset)
+			except Exception as e:
+				self._failed.add(index)
+				print('cannot load {}: {}'.format(file_name, e))
+
+	def begin_frame (self):
+		self._frame += 1
+
+	def end_frame (self):
+		"""
+		Release the least recently drawn models until the resident ones fit into the budget,
+		models drawn this frame and the proxy are kept
+		"""
+		if self._memory_budget is None:
+			return 0
+		resident = [m for m in self._handles.values() if m.is_resident()]
+		total = sum(m.gpu_bytes for m in resident)
+		if total <= self._memory_budget:
+			return 0
+
+		evicted = 0
+		for m in sorted(resident, key = lambda m: self._last_used.get(m.index, -1)):
+			if total <= self._memory_budget:
+				break
+			if self._last_used.get(m.index, -1) >= self._frame or m.index == self._proxy_index:
+				continue
+			total -= m.gpu_bytes
+			self._gpu_manager.release_model(m)
+			evicted += 1
+		return evicted
+
+	def has_pending (self):
+		"""
+		:return: True while a model that was drawn is still loading, prefetched models are not waited for
+		"""
+		return len(self._pending) > 0
+
+	def gpu_bytes (self):
+		return sum(m.gpu_bytes for m in self._handles.values() if m.is_resident())
+
+	def release_all (self):
+		"""
+		Free every resident model and stop the reader, the handles can be loaded again afterwards
+		"""
+		for m in self._handles.values():
+			if m.is_resident():
+				self._gpu_manager.release_model(m)
+		self._pending.clear()
+		self._prefetched.clear()
+		self._reader.shutdown()
@@ -0,0 +1,136 @@
+"""
+Wavefront OBJ reader written with NumPy only. Each keyword is collected with
+one regular expression pass and parsed in bulk, faces are fan-triangulated and
+the v/vt/vn tuples are de-indexed into a single index stream.
+"""
+import re
+
+import numpy as np
+
+
+def _find_lines ( text, keyword ):
+	return re.findall(r'^' + keyword + r'[ \t]+(.*?)\s*$', text, re.MULTILINE)
+
+
+def _parse_floats ( lines, width ):
+	"""
+	:param lines: the values of all lines sharing one keyword, e.g. every 'v' line
+	:param width: number of leading values to keep per line
+	:return: (len(lines), width) float32 array
+	"""
+	if len(lines) == 0:
+		return np.zeros(shape = (0, width), dtype = np.float32)
+
+	count = len(lines[0].split())
+	values = np.fromstring(' '.join(lines), dtype = np.float32, sep = ' ')
+	if count >= width and len(values) == len(lines) * count:
+		return values.reshape(len(lines), count)[:, :width]
+
+	# lines of mixed width (optional w, vertex colors or 2d/3d texture coords), pad per line
+	out = np.zeros(shape = (len(lines), width), dtype = np.float32)
+	for i, line in enumerate(lines):
+		v = line.split()[:width]
+		out[i, :len(v)] = np.array(v, dtype = np.float32)
+	return out
+
+
+def _parse_corners ( tokens ):
+	"""
+	:param tokens: face corners such as '1', '1/2', '1//3' or '1/2/3'
+	:return: (len(tokens), 3) int64 array of raw v, vt, vn indices, 0 where missing
+	"""
+	first = tokens[0]
+	fields = first.count('/') + 1
+	joined = ' '.join(tokens)
+	if '//' in joined:
+		joined = joined.replace('//', '/0/')
+		fields = 3
+	values = np.fromstring(joined.replace('/', ' '), dtype = np.int64, sep = ' ')
+
+	corners = np.zeros(shape = (len(tokens), 3), dtype = np.int64)
+	if len(values) == len(tokens) * fields:
+		corners[:, :fields] = values.reshape(len(tokens), fields)
+		return corners
+
+	# corners of mixed formats
+	for i, token in enumerate(tokens):
+		for j, v in enumerate(token.split('/')[:3]):
+			if v != '':
+				corners[i, j] = int(v)
+	return corners
+
+
+def _resolve ( raw, count ):
+	"""
+	Convert 1-based and negative (relative) OBJ indices to 0-based, -1 where missing
+	"""
+	return np.where(raw > 0, raw - 1, np.where(raw < 0, raw + count, -1))
+
+
+def _smooth_normals ( positions, triangles ):
+	"""
+	Area weighted vertex normals, used when the file has no vn lines
+	"""
+	p = positions.astype(np.float64)
+	face_normals = np.cross(p[triangles[:, 1]] - p[triangles[:, 0]], p[triangles[:, 2]] - p[triangles[:, 0]])
+	normals = np.zeros(shape = p.shape)
+	for k in range(3):
+		np.add.at(normals, triangles[:, k], face_normals)
+	length = np.linalg.norm(normals, axis = 1)
+	length[length == 0.0] = 1.0
+	return (normals / length[:, np.newaxis]).astype(np.float32)
+
+
+def load_obj ( file_name ):
+	"""
+	Read every face of an OBJ file into one triangle mesh
+	:param file_name: path to the .obj file
+	:return: (vertices, colors, normals, indices, texturecoords), vertex attributes are float32
+	         (colors is always empty), indices is a flat uint32 array and texturecoords has the
+	         shape (channels, vertices, 3) like pyassimp
+	"""
+	with open(file_name, 'r') as f:
+		text = f.read()
+
+	positions = _parse_floats(_find_lines(text, 'v'), 3)
+	normal_data = _parse_floats(_find_lines(text, 'vn'), 3)
+	uv_data = _parse_floats(_find_lines(text, 'vt'), 3)
+
+	face_lines = _find_lines(text, 'f')
+	face_tokens = [line.split() for line in face_lines]
+	counts = np.array([len(t) for t in face_tokens], dtype = np.int64)
+	corners = _parse_corners([c for t in face_tokens for c in t])
+	corners[:, 0] = _resolve(corners[:, 0], len(positions))
+	corners[:, 1] = _resolve(corners[:, 1], len(uv_data))
+	corners[:, 2] = _resolve(corners[:, 2], len(normal_data))
+
+	# fan triangulation, face i with n corners becomes (0, k + 1, k + 2) for k < n - 2
+	starts = np.cumsum(counts) - counts
+	fan = counts - 2
+	faces = np.repeat(np.arange(len(counts)), fan)
+	k = np.arange(fan.sum()) - np.repeat(np.cumsum(fan) - fan, fan)
+	triangle_corners = np.stack([starts[faces], starts[faces] + k + 1, starts[faces] + k + 2], axis = 1)
+
+	# de-index: every distinct (v, vt, vn) tuple becomes one output vertex
+	tuples = corners[triangle_corners.reshape(-1)] + 1  # missing becomes 0
+	key = (tuples[:, 0] * (len(uv_data) + 1) + tuples[:, 1]) * (len(normal_data) + 1) + tuples[:, 2]
+	unique_keys, first, indices = np.unique(key, return_index = True, return_inverse = True)
+	unique_tuples = tuples[first] - 1
+
+	vertices = positions[unique_tuples[:, 0]]
+
+	if len(normal_data) > 0 and (unique_tuples[:, 2] >= 0).all():
+		normals = normal_data[unique_tuples[:, 2]]
+	else:
+		position_normals = _smooth_normals(positions, corners[triangle_corners, 0])
+		normals = position_normals[unique_tuples[:, 0]]
+
+	if len(uv_data) > 0 and (unique_tuples[:, 1] >= 0).all():
+		texturecoords = uv_data[unique_tuples[:, 1]][np.newaxis]
+	else:
+		texturecoords = np.zeros(shape = (0, len(vertices), 3), dtype = np.float32)
+
+	colors = np.zeros(shape = (0, 3), dtype = np.float32)
+	indices = indices.reshape(-1).astype(np.uint32)
+
+	return vertices, colors, normals, indices, texturecoords
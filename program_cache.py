@@ -0,0 +1,97 @@
+import hashlib
+import os
+import struct
+import tempfile
+
+
+class ProgramCache(object):
+	"""
+	On-disk cache of linked shader program binaries as returned by glGetProgramBinary.
+	Entries are keyed by a hash of the shader sources, the defines and the GL
+	vendor, renderer and version strings, since a binary is only valid for the
+	driver that produced it.
+	"""
+
+	# bump when the entry layout changes so that stale entries are not reused
+	VERSION = 1
+
+	_HEADER = struct.Struct('<II')  # version, binary format
+
+	def __init__ (self, directory):
+		self._directory = directory
+		self.hits = 0
+		self.misses = 0
+		self.rejected = 0
+
+	@property
+	def directory (self):
+		return self._directory
+
+	def key (self, sources, device, defines = ()):
+		"""
+		:param sources: shader source strings, in a fixed order
+		:param device: (vendor, renderer, version) strings of the GL context
+		:param defines: preprocessor symbols injected into the sources
+		:return: hex digest
+		"""
+		h = hashlib.sha1()
+		for source in sources:
+			h.update(source.encode())
+			h.update(b'\0')
+		h.update(repr((ProgramCache.VERSION, tuple(device), tuple(defines))).encode())
+		return h.hexdigest()
+
+	def _path (self, key):
+		return os.path.join(self._directory, key + '.bin')
+
+	def load (self, key):
+		"""
+		:return: (binary format, bytes), or None on a miss
+		"""
+		try:
+			with open(self._path(key), 'rb') as f:
+				data = f.read()
+		except OSError:
+			self.misses += 1
+			return None
+
+		if len(data) <= ProgramCache._HEADER.size:
+			self._remove(key)
+			self.misses += 1
+			return None
+		version, binary_format = ProgramCache._HEADER.unpack_from(data)
+		if version != ProgramCache.VERSION:
+			self._remove(key)
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return binary_format, data[ProgramCache._HEADER.size:]
+
+	def store (self, key, binary_format, binary):
+		"""
+		Write to a temporary file first so that readers never see a partial entry
+		"""
+		os.makedirs(self._directory, exist_ok = True)
+		fd, tmp = tempfile.mkstemp(dir = self._directory)
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(ProgramCache._HEADER.pack(ProgramCache.VERSION, binary_format))
+				f.write(bytes(binary))
+			os.replace(tmp, self._path(key))
+		except OSError:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+
+	def discard (self, key):
+		"""
+		Drop an entry the driver rejected, e.g. after a driver update that kept the version string
+		"""
+		self.rejected += 1
+		self._remove(key)
+
+	def _remove (self, key):
+		try:
+			os.remove(self._path(key))
+		except OSError:
+			pass
@@ -32,6 +32,12 @@ Item {
             case Qt.Key_P:
                 _window.move_camera(3);
                 break;
+            case Qt.Key_F3:
+                profiler_overlay.visible = _window.toggle_profiler();
+                break;
+            case Qt.Key_F4:
+                profiler_text.text = "trace written to " + _window.export_trace();
+                break;
         }
     }
 
@@ -42,9 +48,36 @@ Item {
 
         hoverEnabled: true
 
-        onPressed: { click_pos = Qt.point(mouse.x,mouse.y); }
+        // Shift + drag selects every tile under the rubber band
+        property bool selecting_region: false
+        property bool region_selected: false
+
+        onPressed: {
+            click_pos = Qt.point(mouse.x,mouse.y);
+            if (mouse.button == Qt.LeftButton && (mouse.modifiers & Qt.ShiftModifier)) {
+                selecting_region = true;
+                rubber_band.x = mouse.x;
+                rubber_band.y = mouse.y;
+                rubber_band.width = 0;
+                rubber_band.height = 0;
+                rubber_band.visible = true;
+            }
+        }
+
+        onReleased: {
+            if (selecting_region) {
+                _window.select_region(click_pos.x, click_pos.y, mouse.x - click_pos.x, mouse.y - click_pos.y);
+                rubber_band.visible = false;
+                selecting_region = false;
+                region_selected = true;
+            }
+        }
 
         onClicked: {
+            if (region_selected) {
+                region_selected = false;
+                return;
+            }
             if (mouse.button == Qt.LeftButton) {
                 _window.on_clicked(0, mouse.x, mouse.y);
             } else if (mouse.button == Qt.RightButton) {
@@ -54,7 +87,12 @@ Item {
         }
 
         onPositionChanged: {
-            if (pressed) {
+            if (selecting_region) {
+                rubber_band.x = Math.min(mouse.x, click_pos.x);
+                rubber_band.y = Math.min(mouse.y, click_pos.y);
+                rubber_band.width = Math.abs(mouse.x - click_pos.x);
+                rubber_band.height = Math.abs(mouse.y - click_pos.y);
+            } else if (pressed) {
                 var delta = Qt.point(mouse.x - click_pos.x, mouse.y - click_pos.y);
                 _window.rotate_camera(delta.x, delta.y);
                 // Disable mouse picking for
@@ -67,6 +105,44 @@ Item {
         }
     }
 
+    Rectangle {
+        id: rubber_band
+        visible: false
+        color: Qt.rgba(0.25, 0.55, 0.85, 0.2)
+        border.color: Qt.rgba(0.25, 0.55, 0.85, 0.8)
+        border.width: 1
+    }
+
+    // F3 toggles frame phase timings, F4 exports them as a Chrome trace
+    Rectangle {
+        id: profiler_overlay
+        visible: false
+        z: 10
+        width: profiler_text.width + 16
+        height: profiler_text.height + 16
+        color: Qt.rgba(0.1, 0.1, 0.1, 0.7)
+        anchors {
+            top: parent.top
+            right: parent.right
+        }
+
+        Text {
+            id: profiler_text
+            x: 8
+            y: 8
+            color: "white"
+            font.family: "monospace"
+            font.pixelSize: 11
+        }
+
+        Timer {
+            interval: 500
+            repeat: true
+            running: profiler_overlay.visible
+            onTriggered: profiler_text.text = _window.profiler_summary()
+        }
+    }
+
     Rectangle {
         id : control_panel
         width: 100.0
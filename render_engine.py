@@ -1,34 +1,84 @@
+import sys
+
+import OpenGL
+
+from common import GL_ERROR_CHECKING
+
+# only read when OpenGL.GL is first imported, entry points set it before importing anything that uses GL
+if 'OpenGL.GL' not in sys.modules:
+	OpenGL.ERROR_CHECKING = GL_ERROR_CHECKING
+elif OpenGL.ERROR_CHECKING != GL_ERROR_CHECKING:
+	print('GL_ERROR_CHECKING = {} has no effect, OpenGL.GL was imported before render_engine'.format(
+		GL_ERROR_CHECKING), file = sys.stderr)
 import OpenGL.GL as GL
-from PyQt5.QtCore import (QPropertyAnimation,
+from PyQt5.QtCore import (QAbstractAnimation,
+                          QPropertyAnimation,
                           QParallelAnimationGroup)
 from PyQt5.QtGui import (QMatrix4x4,
+                         QOpenGLFramebufferObject,
                          QOpenGLShader,
-                         QOpenGLShaderProgram)
-import cProfile
-
+                         QOpenGLShaderProgram,
+                         QVector3D)
+from OpenGL.error import GLError
+import collections
+import contextlib
+import ctypes
+import time
+
+from asset_loader import MeshReader, read_mesh_arrays
+from board_chunks import TileGrid
 from entity import *
+from frame_profiler import FrameProfiler
+from mesh_cache import MeshCache
 from model import *
+from model_registry import ModelRegistry
+from program_cache import ProgramCache
+from render_queue import RenderQueue
+from resolution_scaler import ResolutionScaler
 from utils import *
+from vertex_format import VertexLayout
 
 
 class SceneRenderer(QObject):
-	def __init__ (self, window = None, camera = None, parent = None):
+	def __init__ (self, window = None, camera = None, parent = None, profiler = None):
 		super(SceneRenderer, self).__init__(parent)
 		self._window = window
+		self._profiler = profiler if profiler is not None else FrameProfiler(PROFILER_ENABLED, PROFILER_HISTORY)
+		self._gpu_timers = None
+		self._gpu_frame = None  # (frame, seconds) summed over the passes collected so far
+		self._frames_rendered = 0
+		if ADAPTIVE_RESOLUTION:
+			self._resolution = ResolutionScaler(RESOLUTION_TARGET_MS, RESOLUTION_SCALE_MIN, RESOLUTION_SCALE_MAX)
+		else:
+			self._resolution = ResolutionScaler(RESOLUTION_TARGET_MS, 1.0, 1.0)
+		self._scene_target = None  # QOpenGLFramebufferObject the scene is drawn into when scaled
 		self._camera = camera
 		self._shader = None
+		self._tile_shader = None  # instanced variant of _shader
+		self._board_shader = None  # variant of _shader for the baked board chunks
+		self._tile_instances = None
+		self._render_queue = RenderQueue()  # pieces, sorted by shader, model and depth
+		self._frame_uniforms = None
+		self._gl = GLStateCache()  # skips redundant state changes within a frame
 		self._entity_creator = None
 
 		self._camera.update_projection_matrix(640.0, 480.0)
 
 		self._model_matrix = np.identity(4)
 
-		self._cpu_manager = GpuManager()  # load data onto gpu
-		self._mesh_data = dict()  # store all the raw mesh data
-		self._models = dict()  # for model-entity look up
+		self._vertex_layout = VertexLayout(VERTEX_POSITION_FORMAT, VERTEX_NORMAL_FORMAT, VERTEX_COLOR_ATTRIBUTE)
+		self._cpu_manager = GpuManager(self._vertex_layout)  # load data onto gpu
+		self._mesh_cache = MeshCache(MESH_CACHE_DIRECTORY) if MESH_CACHE_DIRECTORY is not None else None
+		self._program_cache = ProgramCache(PROGRAM_CACHE_DIRECTORY) if PROGRAM_CACHE_DIRECTORY is not None else None
+		self._program_seconds = 0.0  # spent compiling and linking or loading program binaries
+		self._models = ModelRegistry(self._cpu_manager,
+		                             MeshReader(self._mesh_cache, MESH_LOADER_WORKERS))  # for model-entity look up
 		self._light_sources = []  # lighting
 
-		self._title_entities = ModelEntityList()
+		self._board = None  # TileGrid, drawn as baked chunks
+		self._board_chunks = None
+		self._tile_overlays = dict()  # tile index -> ModelEntity drawn over the baked board while it animates
+		self._tile_hover_animations = dict()  # tile index -> hover animation group of its overlay
 		self._piece_entities = [[None for i in range(8)] for j in range(8)]
 
 		self._light_sources.append(Light('sun1',
@@ -40,11 +90,6 @@ class SceneRenderer(QObject):
 
 		self._mouse_position = np.array([0.0, 0.0])
 
-		# animation for tile
-		self._tile_hover_animation_group = QParallelAnimationGroup()
-		self._tile_hover_1 = QPropertyAnimation()
-		self._tile_hover_2 = QPropertyAnimation()
-
 		self._piece_select_animation_group = QParallelAnimationGroup()
 		self._piece_select_animation = []
 
@@ -80,79 +125,99 @@ class SceneRenderer(QObject):
 
 	def initialize (self):
 
-		self.set_viewport_size(self._window.size() * self._window.devicePixelRatio())
-		self._mesh_data[CUBE_MODEL_INDEX] = MeshData.ReadFromFile('mesh/cube_tile.obj', 'cube', offset = 0.5)
+		mesh_files = {CUBE_MODEL_INDEX: ('mesh/cube_tile.obj', 'cube', 0.5)}
 		if RENDER_CUBE_AS_PIECE:
-			self._mesh_data[CHESS_KING_MODEL_INDEX] = MeshData.ReadFromFile('mesh/ico_sphere.obj', 'king')
-			self._mesh_data[CHESS_QUEEN_MODEL_INDEX] = MeshData.ReadFromFile('mesh/cube.obj', 'queen')
-			self._mesh_data[CHESS_BISHOP_MODEL_INDEX] = MeshData.ReadFromFile('mesh/cone.obj', 'bishop')
-			self._mesh_data[CHESS_KNIGHT_MODEL_INDEX] = MeshData.ReadFromFile('mesh/torus.obj', 'knight')
-			self._mesh_data[CHESS_TOWER_MODEL_INDEX] = MeshData.ReadFromFile('mesh/cylinder.obj', 'tower')
-			self._mesh_data[CHESS_PAWN_MODEL_INDEX] = MeshData.ReadFromFile('mesh/sphere.obj', 'pawn')
+			mesh_files[CHESS_KING_MODEL_INDEX] = ('mesh/ico_sphere.obj', 'king', 0.0)
+			mesh_files[CHESS_QUEEN_MODEL_INDEX] = ('mesh/cube.obj', 'queen', 0.0)
+			mesh_files[CHESS_BISHOP_MODEL_INDEX] = ('mesh/cone.obj', 'bishop', 0.0)
+			mesh_files[CHESS_KNIGHT_MODEL_INDEX] = ('mesh/torus.obj', 'knight', 0.0)
+			mesh_files[CHESS_TOWER_MODEL_INDEX] = ('mesh/cylinder.obj', 'tower', 0.0)
+			mesh_files[CHESS_PAWN_MODEL_INDEX] = ('mesh/sphere.obj', 'pawn', 0.0)
 		else:
-			self._mesh_data[CHESS_KING_MODEL_INDEX] = MeshData.ReadFromFile('mesh/king.obj', 'king')
-			self._mesh_data[CHESS_QUEEN_MODEL_INDEX] = MeshData.ReadFromFile('mesh/queen.obj', 'queen')
-			self._mesh_data[CHESS_BISHOP_MODEL_INDEX] = MeshData.ReadFromFile('mesh/bishop.obj', 'bishop')
-			self._mesh_data[CHESS_KNIGHT_MODEL_INDEX] = MeshData.ReadFromFile('mesh/knight.obj', 'knight')
-			self._mesh_data[CHESS_TOWER_MODEL_INDEX] = MeshData.ReadFromFile('mesh/tower.obj', 'tower')
-			self._mesh_data[CHESS_PAWN_MODEL_INDEX] = MeshData.ReadFromFile('mesh/pawn.obj', 'pawn')
-
-			# MeshData.CheckData(self._mesh_data[CUBE_MODEL_INDEX])
-			# MeshData.CheckData(self._mesh_data[CHESS_KING_MODEL_INDEX])
-			# MeshData.CheckData(self._mesh_data[CHESS_QUEEN_MODEL_INDEX])
-			# MeshData.CheckData(self._mesh_data[CHESS_BISHOP_MODEL_INDEX])
-			# MeshData.CheckData(self._mesh_data[CHESS_KNIGHT_MODEL_INDEX])
-			# MeshData.CheckData(self._mesh_data[CHESS_TOWER_MODEL_INDEX])
-			# MeshData.CheckData(self._mesh_data[CHESS_PAWN_MODEL_INDEX])
-			pass
-
-		self._create_shader()
-
-		# Setup mesh data
-		self._shader.bind()
-		for k, v in self._mesh_data.items():
-			self._models[k] = self._cpu_manager.load_to_vao(v)
-
-		# Setup diffuse lighting
-		for i in range(len(self._light_sources)):
-			self._shader.setUniformValue('light_position[{}]'.format(i), QVector3D(self._light_sources[i].position[0],
-			                                                                       self._light_sources[i].position[1],
-			                                                                       self._light_sources[i].position[2]))
-			self._shader.setUniformValue('light_color[{}]'.format(i), QVector3D(self._light_sources[i].color[0],
-			                                                                    self._light_sources[i].color[1],
-			                                                                    self._light_sources[i].color[2]))
-
-		self._shader.setUniformValue('shine_damper', 20.0)
-		self._shader.setUniformValue('reflectivity', 1.0)
-		self._shader.setUniformValue('projection_matrix',
-		                             QMatrix4x4(self._camera.get_projection_matrix().flatten().tolist()))
-		self._shader.release()
+			mesh_files[CHESS_KING_MODEL_INDEX] = ('mesh/king.obj', 'king', 0.0)
+			mesh_files[CHESS_QUEEN_MODEL_INDEX] = ('mesh/queen.obj', 'queen', 0.0)
+			mesh_files[CHESS_BISHOP_MODEL_INDEX] = ('mesh/bishop.obj', 'bishop', 0.0)
+			mesh_files[CHESS_KNIGHT_MODEL_INDEX] = ('mesh/knight.obj', 'knight', 0.0)
+			mesh_files[CHESS_TOWER_MODEL_INDEX] = ('mesh/tower.obj', 'tower', 0.0)
+			mesh_files[CHESS_PAWN_MODEL_INDEX] = ('mesh/pawn.obj', 'pawn', 0.0)
+
+		self._shader = self._create_shader()
+		self._tile_shader = self._create_shader(['INSTANCED'])
+		self._board_shader = self._create_shader(['BAKED_TILES'])
+		cache = self._program_cache
+		counts = (cache.hits, cache.misses, cache.rejected) if cache is not None else (0, 0, 0)
+		print('shader programs: {} hits, {} misses, {} rejected, {:.1f} ms'.format(*counts, self._program_seconds * 1000.0))
+
+		# Setup mesh data, every mesh is decoded in the reader's pool from here on, only the cube
+		# is needed up front (tiles and loading proxies), the rest is uploaded on first draw
+		for k, (file_name, name, offset) in mesh_files.items():
+			self._models.register(k, file_name, name, offset)
+		self._models.prefetch(mesh_files.keys())
+		self._models.load([CUBE_MODEL_INDEX])
+
+		# camera and diffuse lighting, shared by every program through one uniform buffer
+		self._frame_uniforms = FrameUniformBuffer(self._cpu_manager)
+		self._frame_uniforms.update(self._camera, self._light_sources)
+		self._gpu_timers = GpuTimerRing(PROFILER_QUERY_RING)
 
 		self._entity_creator = EntityCreator(self._models)
-		self._entity_creator.create_checker_board(self._title_entities)
-		self._entity_creator.create_chess_pieces(self._piece_entities, self._title_entities)
+		self._board = TileGrid.Checkerboard(BOARD_ROWS, BOARD_COLS, BOARD_TILE_LENGTH, BOARD_CHUNK_SIZE,
+		                                    scale = TILE_STATIC_SCALE)
+		file_name, _, offset = mesh_files[CUBE_MODEL_INDEX]
+		self._board_chunks = BoardChunkBuffers(self._cpu_manager,
+		                                       VertexLayout(VERTEX_POSITION_FORMAT, VERTEX_NORMAL_FORMAT, True),
+		                                       self._board, read_mesh_arrays(file_name, offset, self._mesh_cache))
+		self._entity_creator.create_chess_pieces(self._piece_entities, self._board.positions)
+		self._tile_instances = InstanceBuffer(self._cpu_manager, self._models[CUBE_MODEL_INDEX],
+		                                      BOARD_OVERLAY_CAPACITY)
 
 	def sync (self):
+		# the projection reaches the shaders with the next FrameUniformBuffer.update
 		self._camera.update_projection_matrix(self._window.width(), self._window.height())
-		self._shader.bind()
-		self._shader.setUniformValue('projection_matrix',
-		                             QMatrix4x4(self._camera.get_projection_matrix().flatten().tolist()))
-		self._shader.release()
 
 	def invalidate (self):
-		# TODO
-		pass
+		# the context goes away with the scene graph, free the models and stop the loader processes
+		self._models.release_all()
 
-	def prepare_titles (self, hover_table):
+	def prepare_titles (self, hover_table, region_table = None):
 		for row in range(8):
 			for col in range(8):
-				e = self._title_entities[col + 8 * row]
+				index = self._board.index(row, col)
 				if hover_table[row][col] > 0.0:
-					if e.position[1] < 0.0:
-						self.animate_hover_tile(e)
+					if index not in self._tile_overlays:
+						self._tile_hover_animations[index] = self.animate_hover_tile(self._add_tile_overlay(index))
 				else:
-					e.color = e.original_color.copy()
-					e.position[1] = -0.25
+					self._remove_tile_overlay(index)
+					if region_table is not None and region_table[row][col]:
+						color = TILE_REGION_COLOR
+					else:
+						color = self._board.original_colors[index]
+					# chunks are baked again only when a color really differs from the baked one
+					self._board.set_color(index, color)
+
+	def _add_tile_overlay (self, index):
+		"""
+		Hide a tile in its chunk and draw it as an entity that can be animated instead
+		"""
+		e = self._entity_creator.create_tile(self._board, index)
+		self._tile_overlays[index] = e
+		self._board.hidden[index] = True
+		return e
+
+	def _remove_tile_overlay (self, index):
+		e = self._tile_overlays.pop(index, None)
+		if e is None:
+			return
+		self._board.hidden[index] = False
+		# the hover animation must not outlive the entity it animates, the ones of other overlays keep running
+		group = self._tile_hover_animations.pop(index, None)
+		if group is not None and SceneRenderer._IsRunning(group):
+			group.stop()
+
+	def _set_tile_color (self, index, color):
+		self._board.set_color(index, color)
+		if index in self._tile_overlays:
+			self._tile_overlays[index].color = color.copy()
 
 	def prepare_pieces (self, board_table):
 		# Change the current entities table in the renderer using the board_table
@@ -178,7 +243,7 @@ class SceneRenderer(QObject):
 							                                     self._window.on_selection_scale_changed)
 
 						self.animate_select_piece(e)
-						self._title_entities[col + 8 * row].color = TILE_SELECTED_COLOR.copy()
+						self._set_tile_color(self._board.index(row, col), TILE_SELECTED_COLOR)
 
 				elif board_table[row][col].status == TILE_DESTINATION:
 					start_r, start_c = board_table.selected
@@ -190,38 +255,51 @@ class SceneRenderer(QObject):
 					e = self._piece_entities[start_r][start_c]
 					self._piece_entities[start_r][start_c] = None
 					self._piece_entities[row][col] = e
+					e.row = row
+					e.col = col
 					e.color = e.original_color
 
 					# after the animation the position will be changed
 					self.animate_piece_move(e,
-					                        self._title_entities[start_c + 8 * start_r].position,
-					                        self._title_entities[col + 8 * row].position)
+					                        self._board.positions[self._board.index(start_r, start_c)],
+					                        self._board.positions[self._board.index(row, col)])
 					self._move_animation_finished = False
 
 	def reset_piece (self, e, row, col):
 		# self.animate_reset_piece(e, row, col)
-		e.position = self._title_entities[col + 8 * row].position.copy()
-		e.position[1] += self._title_entities[col + 8 * row].position[1] + PIECE_STATIC_Y_OFFSET
-		e.scale = PIECE_STATIC_SCALE.copy()
-		e.color = e.original_color.copy()
-		e.rotation = np.zeros((3,))
+		position = self._board.positions[self._board.index(row, col)].copy()
+		position[1] += position[1] + PIECE_STATIC_Y_OFFSET
+
+		# this runs every frame for every resting piece, skip assignments that would invalidate the cache
+		if not np.array_equal(e.position, position):
+			e.position = position
+		if not np.array_equal(e.scale, PIECE_STATIC_SCALE):
+			e.scale = PIECE_STATIC_SCALE.copy()
+		if not np.array_equal(e.color, e.original_color):
+			e.color = e.original_color.copy()
+		if e.rotation.any():
+			e.rotation = np.zeros((3,))
 
 	def animate_hover_tile (self, e):
-		self._tile_hover_animation_group = QParallelAnimationGroup()
-		self._tile_hover_1 = QPropertyAnimation(e, str.encode('_color'))
-		self._tile_hover_1.setDuration(100)
-		self._tile_hover_1.setStartValue(QVector3D(e.color[0], e.color[1], e.color[2]))
-		self._tile_hover_1.setEndValue(QVector3D(TILE_HOVER_COLOR[0], TILE_HOVER_COLOR[1], TILE_HOVER_COLOR[2]))
+		"""
+		:return: the started animation group, deleted when it stops
+		"""
+		group = QParallelAnimationGroup()
+		a1 = QPropertyAnimation(e, str.encode('_color'))
+		a1.setDuration(100)
+		a1.setStartValue(QVector3D(e.color[0], e.color[1], e.color[2]))
+		a1.setEndValue(QVector3D(TILE_HOVER_COLOR[0], TILE_HOVER_COLOR[1], TILE_HOVER_COLOR[2]))
 
-		self._tile_hover_2 = QPropertyAnimation(e, str.encode('_position'))
-		self._tile_hover_2.setDuration(100)
-		self._tile_hover_2.setStartValue(QVector3D(e.position[0], e.position[1], e.position[2]))
-		self._tile_hover_2.setEndValue(QVector3D(e.position[0], TILE_HOVER_Y_POSITION, e.position[2]))
+		a2 = QPropertyAnimation(e, str.encode('_position'))
+		a2.setDuration(100)
+		a2.setStartValue(QVector3D(e.position[0], e.position[1], e.position[2]))
+		a2.setEndValue(QVector3D(e.position[0], TILE_HOVER_Y_POSITION, e.position[2]))
 
-		self._tile_hover_animation_group.addAnimation(self._tile_hover_1)
-		self._tile_hover_animation_group.addAnimation(self._tile_hover_2)
+		group.addAnimation(a1)
+		group.addAnimation(a2)
 
-		self._tile_hover_animation_group.start(policy = QParallelAnimationGroup.DeleteWhenStopped)
+		group.start(policy = QParallelAnimationGroup.DeleteWhenStopped)
+		return group
 
 	def animate_select_piece (self, e):
 		self._piece_select_animation_group = QParallelAnimationGroup()
@@ -317,8 +395,8 @@ class SceneRenderer(QObject):
 		a1.setEndValue(QVector3D(34.0, 0.0, 0.0))
 		self._piece_reset_animation.append(a1)
 
-		new_pos = self._title_entities[col + 8 * row].position.copy()
-		new_pos[1] = self._title_entities[col + 8 * row].position[1] + PIECE_STATIC_Y_OFFSET
+		new_pos = self._board.positions[self._board.index(row, col)].copy()
+		new_pos[1] += PIECE_STATIC_Y_OFFSET
 
 		a2 = QPropertyAnimation(e, str.encode('_position'))
 		a2.setDuration(3000)
@@ -346,130 +424,350 @@ class SceneRenderer(QObject):
 		self._piece_reset_animation_group.start(policy = QParallelAnimationGroup.DeleteWhenStopped)
 
 	def render (self):
-		w = self._window.width()
-		h = self._window.height()
-		GL.glViewport(0, 0, w * 2, h * 2)
-		GL.glClearColor(CLEAR_COLOR[0], CLEAR_COLOR[1], CLEAR_COLOR[2], 1)
-		GL.glEnable(GL.GL_DEPTH_TEST)
-		GL.glEnable(GL.GL_CULL_FACE)
-		GL.glCullFace(GL.GL_BACK)
-		GL.glEnable(GL.GL_LINE_SMOOTH)
-
-		GL.glClear(GL.GL_COLOR_BUFFER_BIT)
-		GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
+		# Qt Quick resets the GL state between our frames, nothing shadowed can be trusted anymore
+		self._gl.invalidate()
+		self._gl.reset_counters()
+		self._collect_gpu_timings()
+
+		# below full resolution the scene goes to an offscreen target that is then stretched over the window
+		width, height = self._native_size()
+		scaled_width, scaled_height = self._resolution.size(width, height)
+		scaled = (scaled_width, scaled_height) != (width, height)
+		if scaled:
+			window_target = int(GL.glGetIntegerv(GL.GL_DRAW_FRAMEBUFFER_BINDING))
+			self._bind_scene_target(scaled_width, scaled_height)
+		else:
+			self._scene_target = None
+		self._gl.viewport(0, 0, scaled_width, scaled_height)
+		self._gl.clear_color(CLEAR_COLOR[0], CLEAR_COLOR[1], CLEAR_COLOR[2], 1.0)
+		self._gl.enable(GL.GL_DEPTH_TEST)
+		self._gl.enable(GL.GL_CULL_FACE)
+		self._gl.cull_face(GL.GL_BACK)
+		self._gl.enable(GL.GL_LINE_SMOOTH)
+
+		GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
+
+		self._frame_uniforms.update(self._camera, self._light_sources)
+
+		self._models.begin_frame()
+		self._render_queue.reset_counters()
+		with self._gpu_pass('render_board'):
+			self._render_board()
+		with self._gpu_pass('render_pieces'):
+			self._render_pieces()
+		self._release_queue()  # already done by the queue when it drew anything, the cache skips it then
+		self._models.end_frame()
+
+		if scaled:
+			GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, self._scene_target.handle())
+			GL.glBindFramebuffer(GL.GL_DRAW_FRAMEBUFFER, window_target)
+			GL.glBlitFramebuffer(0, 0, scaled_width, scaled_height, 0, 0, width, height,
+			                     GL.GL_COLOR_BUFFER_BIT, GL.GL_LINEAR)
+			GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, window_target)
+		self._frames_rendered += 1
+
+	def _native_size (self):
+		"""
+		:return: (width, height) of the window in device pixels
+		"""
+		ratio = self._window.devicePixelRatio()
+		return int(round(self._window.width() * ratio)), int(round(self._window.height() * ratio))
 
-		view_matrix = self._camera.get_view_matrix()
+	def _bind_scene_target (self, width, height):
+		if self._scene_target is None or self._scene_target.width() != width or \
+				self._scene_target.height() != height:
+			self._scene_target = QOpenGLFramebufferObject(width, height, QOpenGLFramebufferObject.Depth)
+		self._scene_target.bind()
 
-		self._shader.bind()
-		self._shader.setUniformValue('view_matrix', QMatrix4x4(view_matrix.flatten().tolist()))
+	def _timing_gpu (self):
+		return self._profiler.enabled or self._resolution.min_scale < self._resolution.max_scale
 
-		self._render_tiles()
-		# cProfile.runctx('self.render_pieces()', globals(), locals())
-		self._render_pieces()
+	def _collect_gpu_timings (self):
+		"""
+		Hand finished timer queries to the profiler, and the gpu time of every complete frame to the resolution scaler
+		"""
+		for (profiler_frame, frame), name, seconds in self._gpu_timers.collect():
+			self._profiler.add_gpu(profiler_frame, name, seconds)
+			if self._gpu_frame is not None and self._gpu_frame[0] != frame:
+				self._resolution.update(self._gpu_frame[1] * 1000.0)  # results arrive in order, it is complete
+				self._gpu_frame = None
+			self._gpu_frame = (frame, seconds + (self._gpu_frame[1] if self._gpu_frame is not None else 0.0))
+
+	@contextlib.contextmanager
+	def _gpu_pass (self, name):
+		"""
+		Time a render pass on the cpu and, through the query ring, on the gpu
+		"""
+		if not self._timing_gpu():
+			yield
+			return
+		with self._profiler.cpu(name):
+			self._gpu_timers.begin((self._profiler.frame_index, self._frames_rendered), name)
+			try:
+				yield
+			finally:
+				self._gpu_timers.end()
+
+	def resolution_scaler (self):
+		return self._resolution
+
+	def profiler (self):
+		return self._profiler
+
+	def is_animating (self):
+		"""
+		:return: True while the scene changes without input, an animation runs or a model is still loading
+		"""
+		groups = list(self._tile_hover_animations.values()) + [self._piece_select_animation_group,
+		                                                       self._piece_move_animation_group,
+		                                                       self._piece_reset_animation_group]
+		return any(SceneRenderer._IsRunning(g) for g in groups) or self._models.has_pending()
 
-		self._shader.release()
-		self._window.update()
+	@staticmethod
+	def _IsRunning (animation):
+		try:
+			return animation.state() == QAbstractAnimation.Running
+		except RuntimeError:  # deleted when stopped
+			return False
 
-	def _render_tiles (self):
-		self._setup_model(self._models[CUBE_MODEL_INDEX])
+	def _render_board (self):
+		"""
+		One draw per visible baked chunk, then the tiles animated over the board in one instanced draw
+		"""
+		self._board_chunks.update()
+		chunks = self._board_chunks.chunks()
+		planes = frustum_planes(self._camera.get_view_projection_matrix())
+		visible = cull_aabbs(planes, np.broadcast_to(np.identity(4), (len(chunks), 4, 4)),
+		                     np.array([c.aabb_min for c in chunks]), np.array([c.aabb_max for c in chunks]))
+		if visible.any():
+			self._gl.use_program(self._board_shader)
+			self._board_chunks.bind_hidden_tiles(self._board_shader, 0)
+			for chunk in [c for c, v in zip(chunks, visible) if v]:
+				self._gl.bind_vertex_array(chunk.vao)
+				self._setup_quantization(self._board_shader, chunk)
+				GL.glDrawElements(GL.GL_TRIANGLES, chunk.num_indices, chunk.index_type, None)
+			self._render_queue.record(shader_binds = 1, model_binds = int(visible.sum()), draws = int(visible.sum()))
+
+		entities = list(self._tile_overlays.values())[:self._tile_instances.capacity]
+		if len(entities) == 0:
+			return
+		ModelEntity.UpdateModelMatrices(entities)
+		self._tile_instances.update(entities)
+		if not self._cull(entities).any():
+			return
+
+		self._gl.use_program(self._tile_shader)
+		self._setup_quantization(self._tile_shader, self._models[CUBE_MODEL_INDEX])
+		self._tile_instances.draw(len(entities), self._gl)
+		self._render_queue.record(shader_binds = 1, model_binds = 1, draws = 1)
 
+	def _render_pieces (self):
+		entities = [e for pieces in self._piece_entities for e in pieces if e is not None]
+		if len(entities) == 0:
+			return
+		ModelEntity.UpdateModelMatrices(entities)
+		# only visible pieces are loaded and drawn
+		entities = [e for e, v in zip(entities, self._cull(entities)) if v]
+		if len(entities) == 0:
+			return
+		self._select_lods(entities)
+
+		depths = la.norm(np.array([e.model_matrix[:3, 3] for e in entities]) - self._camera.eye, axis = 1)
+		for e, depth in zip(entities, depths):
+			model = self._models.acquire(e.model)
+			if model is None:
+				continue
+			if model is e.model:
+				self._render_queue.add(self._shader, 0, model.lod(e.lod), depth, e)
+			else:
+				self._render_queue.add(self._shader, 0, model, depth, e, proxy = True)
+
+		self._render_queue.submit(self._bind_shader, self._bind_model, self._draw_item, self._release_queue)
+
+	def _bind_shader (self, shader):
+		self._gl.use_program(shader)
+
+	def _bind_model (self, shader, model):
+		self._gl.bind_vertex_array(model.vao)
 		# [1] intel driver doesn't include this, must bind manually
-		GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER,
-		                self._models[CUBE_MODEL_INDEX].indices_vbo)
+		self._gl.bind_buffer(GL.GL_ELEMENT_ARRAY_BUFFER, model.indices_vbo)
+		self._setup_quantization(shader, model)
 
-		for row in range(8):
-			for col in range(8):
-				e = self._title_entities[col + 8 * row]
-				self._setup_entity(e)
-				GL.glDrawElements(GL.GL_TRIANGLES,
-				                  self._models[CUBE_MODEL_INDEX].num_indices,
-				                  GL.GL_UNSIGNED_INT,
-				                  None)  # [1]
-		GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)  # [1]
-		self._release_model()
+	def _draw_item (self, shader, item):
+		if item.proxy:
+			self._setup_proxy(item.entity)
+		else:
+			self._setup_entity(item.entity)
+		GL.glDrawElements(GL.GL_TRIANGLES,
+		                  item.model.num_indices,
+		                  item.model.index_type,
+		                  None)  # [1]
 
-	def _render_pieces (self):
-		for row in range(8):
-			for col in range(8):
-				e = self._piece_entities[row][col]
-				if e is None:
-					continue
-				self._setup_model(e.model)
-				GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, e.model.indices_vbo)
-				self._setup_entity(e)
-				GL.glDrawElements(GL.GL_TRIANGLES,
-				                  e.model.num_indices,
-				                  GL.GL_UNSIGNED_INT,
-				                  None)  # [1]
-				GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)  # [1]
-				self._release_model()
-
-	def set_viewport_size (self, size):
-		self._viewport_size = size
-
-	def _setup_model (self, model):
-		GL.glBindVertexArray(model.vao)
-		GL.glEnableVertexAttribArray(0)
-		GL.glEnableVertexAttribArray(1)
-		GL.glEnableVertexAttribArray(2)
-
-	def _release_model (self):
-		GL.glDisableVertexAttribArray(0)
-		GL.glDisableVertexAttribArray(1)
-		GL.glDisableVertexAttribArray(2)
-		GL.glBindVertexArray(0)
+	def _release_queue (self):
+		self._gl.bind_vertex_array(0)
+		self._gl.use_program(None)
+
+	def draw_counters (self):
+		"""
+		:return: dict of shader binds, model binds, draw calls and state changes issued and skipped
+		         by the state cache in the last frame
+		"""
+		counters = self._render_queue.counters()
+		counters.update(self._gl.counters())
+		counters['resolution_scale'] = self._resolution.scale
+		return counters
+
+	def _cull (self, entities):
+		"""
+		Test the world space bounding boxes of all entities against the view frustum in one pass,
+		models that are not loaded yet use the proxy bounds
+		:return: (N,) bool, True for entities that may be visible
+		"""
+		planes = frustum_planes(self._camera.get_view_projection_matrix())
+		matrices = np.array([e.model_matrix for e in entities])
+		bmin = np.array([e.model.aabb_min if e.model.aabb_min is not None else MODEL_PROXY_BOUNDS[0]
+		                 for e in entities])
+		bmax = np.array([e.model.aabb_max if e.model.aabb_max is not None else MODEL_PROXY_BOUNDS[1]
+		                 for e in entities])
+		return cull_aabbs(planes, matrices, bmin, bmax)
+
+	def _select_lods (self, entities):
+		"""
+		Choose the level of detail of every loaded entity from the projected size of its bounding sphere
+		"""
+		entities = [e for e in entities if e.model.bvh is not None]
+		if len(entities) == 0:
+			return
+		bounds_min = np.array([e.model.bvh.bounds_min[0] for e in entities])
+		bounds_max = np.array([e.model.bvh.bounds_max[0] for e in entities])
+		matrices = np.array([e.model_matrix for e in entities])
+
+		centers = np.einsum('nij,nj->ni', matrices[:, :3, :3], (bounds_min + bounds_max) / 2.0) + matrices[:, :3, 3]
+		radii = la.norm(bounds_max - bounds_min, axis = 1) / 2.0 * la.norm(matrices[:, :3, :3], axis = 1).max(axis = 1)
+		sizes = projected_sizes(centers, radii, self._camera.eye, self._camera.fovy, self._window.height())
+
+		levels = select_lod(sizes, [e.lod for e in entities], MESH_LOD_SCREEN_SIZES, MESH_LOD_HYSTERESIS)
+		for e, level in zip(entities, levels):
+			e.lod = int(level)
+
+	def _setup_quantization (self, shader, model):
+		if self._vertex_layout.position_format == 'unorm16':
+			shader.setUniformValue('position_scale', QVector3D(*model.position_scale))
+			shader.setUniformValue('position_offset', QVector3D(*model.position_offset))
 
 	def _setup_entity (self, entity):
-		m = create_transformation_matrix(entity.position,
-		                                 entity.rotation,
-		                                 entity.scale)
+		self._shader.setUniformValue('uniform_color', entity.color_qt)
+		self._shader.setUniformValue('model_matrix', entity.model_matrix_qt)
+
+	def _setup_proxy (self, entity):
+		# bounding box stand-in while the entity's mesh is loading
+		self._shader.setUniformValue('uniform_color', entity.color_qt)
+		self._shader.setUniformValue('model_matrix',
+		                             QMatrix4x4((entity.model_matrix @ self._models.proxy_matrix).flatten().tolist()))
+
+	def _create_shader (self, defines = ()):
+		"""
+		:param defines: symbols defined for the vertex shader on top of the ones the vertex layout needs
+		"""
+		defines = self._vertex_layout.defines() + list(defines)
+		with open('shaders/OpenGL_4_1/vertex.glsl', 'r') as f:
+			vertex_source = inject_defines(f.read(), defines)
+		with open('shaders/OpenGL_4_1/fragment.glsl', 'r') as f:
+			fragment_source = f.read()
+
+		start = time.perf_counter()
+		shader = QOpenGLShaderProgram()
+		shader.create()
+		cache = self._program_cache if self._program_cache is not None and self._ProgramBinarySupported() else None
+		key = cache.key((vertex_source, fragment_source), self._GLDevice(), defines) if cache is not None else None
+		entry = cache.load(key) if cache is not None else None
+		status = 'uncached'
+		if entry is not None and self._LoadProgramBinary(shader, *entry):
+			status = 'hit'
+		else:
+			if entry is not None:
+				cache.discard(key)
+				status = 'rejected'
+			elif cache is not None:
+				status = 'miss'
+			if cache is not None:
+				GL.glProgramParameteri(shader.programId(), GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
+			shader.addShaderFromSourceCode(QOpenGLShader.Vertex, vertex_source)
+			shader.addShaderFromSourceCode(QOpenGLShader.Fragment, fragment_source)
+			shader.link()
+			if cache is not None:
+				cache.store(key, *self._ProgramBinary(shader))
+
+		GL.glUniformBlockBinding(shader.programId(), GL.glGetUniformBlockIndex(shader.programId(), 'FrameData'),
+		                         FRAME_UNIFORM_BINDING)
+		elapsed = time.perf_counter() - start
+		self._program_seconds += elapsed
+		if PROGRAM_CACHE_VERBOSE:
+			print('program {}: {} in {:.1f} ms'.format(' '.join(defines) or '-', status, elapsed * 1000.0))
+		return shader
+
+	@staticmethod
+	def _GLDevice ():
+		return tuple(GL.glGetString(name).decode(errors = 'replace')
+		             for name in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION))
+
+	@staticmethod
+	def _ProgramBinarySupported ():
+		return GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) > 0
 
-		self._shader.setUniformValue('uniform_color', QVector3D(entity.color[0], entity.color[1], entity.color[2]))
-		self._shader.setUniformValue('model_matrix', QMatrix4x4(m.flatten().tolist()))
+	@staticmethod
+	def _ProgramBinary (shader):
+		"""
+		:return: (binary format, bytes) of a linked program
+		"""
+		size = GL.glGetProgramiv(shader.programId(), GL.GL_PROGRAM_BINARY_LENGTH)
+		length = GL.GLsizei(0)
+		binary_format = GL.GLenum(0)
+		binary = (ctypes.c_ubyte * size)()
+		GL.glGetProgramBinary(shader.programId(), size, ctypes.byref(length), ctypes.byref(binary_format), binary)
+		return binary_format.value, bytes(binary)[:length.value]
 
-	def _create_shader (self):
-		self._shader = QOpenGLShaderProgram()
-		self._shader.addShaderFromSourceFile(QOpenGLShader.Vertex, 'shaders/OpenGL_4_1/vertex.glsl')
-		self._shader.addShaderFromSourceFile(QOpenGLShader.Fragment, 'shaders/OpenGL_4_1/fragment.glsl')
-		self._shader.link()
+	@staticmethod
+	def _LoadProgramBinary (shader, binary_format, binary):
+		"""
+		:return: False when the driver rejects the binary, the program then has to be compiled from source
+		"""
+		try:
+			GL.glProgramBinary(shader.programId(), binary_format, binary, len(binary))
+		except GLError:
+			return False
+		if not GL.glGetProgramiv(shader.programId(), GL.GL_LINK_STATUS):
+			return False
+		# with no shaders attached, QOpenGLShaderProgram.link only adopts the link status of the program
+		return shader.link()
 
 	def update_mouse_position (self, x, y):
 		self._mouse_position[0] = x
 		self._mouse_position[1] = y
 
 	def move_camera (self, key):
-
-		vertical_direction = normalize_vector(np.cross(self._camera.up, self._camera.target))
-		head_direction = normalize_vector(np.cross(self._camera.target, vertical_direction))
-
-		if key == Camera.Translation.FORWARD:
-			self._camera.eye += normalize_vector(self._camera.target)
-		elif key == Camera.Translation.BACKWARD:
-			self._camera.eye -= normalize_vector(self._camera.target)
-		elif key == Camera.Translation.LEFT:
-			self._camera.eye += vertical_direction
-		elif key == Camera.Translation.RIGHT:
-			self._camera.eye -= vertical_direction
-		elif key == Camera.Translation.UP:
-			self._camera.eye += head_direction
-		elif key == Camera.Translation.DOWN:
-			self._camera.eye -= head_direction
-		self._camera.update_view_matrix()
+		self._camera.move(key)
 
 	def rotate_camera (self, dx, dy):
 		rate = 0.001
-		self._camera.target = rotate(-dx * rate, self._camera.up) @ self._camera.target
-		self._camera.target = rotate(dy * rate, np.cross(self._camera.up, self._camera.target)) @ self._camera.target
-		self._camera.update_view_matrix()
+		self._camera.turn(-dx * rate, dy * rate)
 
-	def checker_board_entities (self):
-		return self._title_entities
+	def checker_board (self):
+		return self._board
+
+	def pickable_entities (self):
+		"""
+		Entities that can be hit by a mouse ray, pieces first since they sit on top of the tiles
+		"""
+		return [e for pieces in self._piece_entities for e in pieces if e is not None]
 
 	def reset_board (self):
 		self._entity_creator = EntityCreator(self._models)
-		self._entity_creator.create_checker_board(self._title_entities)
+		for index in list(self._tile_overlays.keys()):
+			self._remove_tile_overlay(index)
+		self._board.reset_colors()
 		self._piece_entities = [[None for i in range(8)] for j in range(8)]
-		self._entity_creator.create_chess_pieces(self._piece_entities, self._title_entities)
+		self._entity_creator.create_chess_pieces(self._piece_entities, self._board.positions)
 
 	def on_color_changed (self, r, g, b):
 		SceneRenderer._AssignCustomAttribBuffer(self._custom_color_ptr, [r, g, b])
@@ -537,7 +835,13 @@ class GpuManager(object):
 	COLOR_LOCATION = 1
 	NORMAL_LOCATION = 2
 
-	def __init__ (self):
+	GL_TYPES = {'float': GL.GL_FLOAT,
+	            'half': GL.GL_HALF_FLOAT,
+	            'ushort': GL.GL_UNSIGNED_SHORT,
+	            'short': GL.GL_SHORT}
+
+	def __init__ (self, vertex_layout = None):
+		self.vertex_layout = vertex_layout if vertex_layout is not None else VertexLayout()
 		self.vaos = []
 		self.vbos = []
 		self.textures = []
@@ -546,23 +850,57 @@ class GpuManager(object):
 		# self.release_all()
 		pass
 
-	def load_to_vao (self, mesh_data):
+	def load_to_vao (self, mesh_data, model = None):
 		"""
 		Upload data to GPU
+		:param model: RawModel handle to fill, a new one is created if None
 		:return: RawModel
 		"""
-		vao = self.create_and_bind_vao()
-		self.set_vertex_attribute_data(GpuManager.POSITION_LOCATION, 3, mesh_data.vertices)
-		self.set_vertex_attribute_data(GpuManager.COLOR_LOCATION, 3, mesh_data.colors)
-		self.set_vertex_attribute_data(GpuManager.NORMAL_LOCATION, 3, mesh_data.normals)
+		if model is None:
+			model = RawModel(None, None, 0)
+		model.vao = self.create_and_bind_vao()
+		if mesh_data.vertex_data is not None:
+			# packed by the loader with the configured layout, memory-mapped on a cache hit
+			vertex_data = mesh_data.vertex_data
+			model.position_scale, model.position_offset = mesh_data.position_scale, mesh_data.position_offset
+		else:
+			vertex_data, scale, offset = self.vertex_layout.pack(mesh_data.vertices, mesh_data.colors, mesh_data.normals)
+			model.position_scale, model.position_offset = scale, offset
+		model.vbos = [self.set_interleaved_data(vertex_data)]
 
-		indices_vbo = self.create_indices_buffer(mesh_data.indices)
+		model.indices_vbo, model.index_type = self.create_indices_buffer(mesh_data.indices)
+		model.vbos.append(model.indices_vbo)
 		self.unbind_vao()
 
-		return RawModel(vao, indices_vbo, len(mesh_data.indices))
+		model.num_indices = len(mesh_data.indices)
+		model.bvh = mesh_data.bvh
+		model.aabb_min = mesh_data.aabb_min
+		model.aabb_max = mesh_data.aabb_max
+		model.gpu_bytes = vertex_data.nbytes + len(mesh_data.indices) * mesh_data.indices.itemsize
+
+		model.lods = [self.load_to_vao(lod) for lod in mesh_data.lods]
+		model.gpu_bytes += sum(lod.gpu_bytes for lod in model.lods)
+		return model
+
+	def release_model (self, model):
+		"""
+		Free the vao and buffers of a model and its levels of detail, the handle keeps its bvh and can be loaded again
+		"""
+		for lod in model.lods:
+			self.release_model(lod)
+		model.lods = []
+		GL.glDeleteVertexArrays(1, [model.vao])
+		GL.glDeleteBuffers(len(model.vbos), model.vbos)
+		self.vaos.remove(model.vao)
+		for b in model.vbos:
+			self.vbos.remove(b)
+		model.vao = None
+		model.indices_vbo = None
+		model.vbos = []
+		model.gpu_bytes = 0
 
 	def set_vertex_attribute_data (self, attrib_id, component_size, data):
-		data = data.astype(np.float32)  # data is of float64 by default
+		data = np.ascontiguousarray(data, dtype = np.float32)  # no copy for float32 and memory-mapped data
 		vbo = GL.glGenBuffers(1)
 		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo)
 		GL.glBufferData(GL.GL_ARRAY_BUFFER, len(data) * FLOAT_SIZE * component_size, data, GL.GL_STATIC_DRAW)
@@ -570,6 +908,32 @@ class GpuManager(object):
 		GL.glVertexAttribPointer(attrib_id, component_size, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
 		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
 		self.vbos.append(vbo)
+		return vbo
+
+	def set_interleaved_data (self, data):
+		"""
+		Upload packed vertices into one buffer and point every attribute of the layout into it
+		"""
+		data = np.ascontiguousarray(data)  # no copy for memory-mapped data
+		vbo = GL.glGenBuffers(1)
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo)
+		GL.glBufferData(GL.GL_ARRAY_BUFFER, data.nbytes, data, GL.GL_STATIC_DRAW)
+		self.set_vertex_layout_pointers()
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+		self.vbos.append(vbo)
+		return vbo
+
+	def set_vertex_layout_pointers (self, layout = None):
+		"""
+		Point the attributes of the layout into the bound GL_ARRAY_BUFFER
+		:param layout: VertexLayout, the one of the models by default
+		"""
+		layout = layout if layout is not None else self.vertex_layout
+		for a in layout.attributes:
+			GL.glEnableVertexAttribArray(a.location)
+			GL.glVertexAttribPointer(a.location, a.components, GpuManager.GL_TYPES[a.type_name],
+			                         GL.GL_TRUE if a.normalized else GL.GL_FALSE,
+			                         layout.stride, ctypes.c_void_p(a.offset))
 
 	# def load_texture ( self ):
 	# 	texture = Texture.CreateFromFile('')
@@ -587,18 +951,398 @@ class GpuManager(object):
 		GL.glBindVertexArray(0)
 
 	def create_indices_buffer (self, indices):
+		"""
+		:return: (vbo, index type), uint16 indices are kept as they are, anything else is uploaded as uint32
+		"""
+		if indices.dtype == np.uint16:
+			indices = np.ascontiguousarray(indices)
+			index_type = GL.GL_UNSIGNED_SHORT
+		else:
+			indices = np.ascontiguousarray(indices, dtype = np.uint32)
+			index_type = GL.GL_UNSIGNED_INT
 		vbo = GL.glGenBuffers(1)
 		GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, vbo)
 		GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER,
-		                len(indices) * UNSIGNED_INT_SIZE,
+		                indices.nbytes,
 		                indices,
 		                GL.GL_STATIC_DRAW)
 		GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)
 		self.vbos.append(vbo)
-		return vbo
+		return vbo, index_type
 
 	def release_all (self):
 		for b in self.vaos:
 			GL.glDeleteVertexArrays(b)
 		for b in self.vbos:
 			GL.glDeleteBuffers(b)
+
+
+class InstanceBuffer(object):
+	"""
+	Per-instance model matrix and color of entities that share one model, kept on the gpu
+	and drawn with a single glDrawElementsInstanced
+	"""
+	MATRIX_LOCATION = 3  # a mat4 takes locations 3 to 6
+	COLOR_LOCATION = 7
+	FLOATS_PER_INSTANCE = 20  # 16 matrix, 3 color, 1 padding
+
+	def __init__ (self, gpu_manager, model, capacity):
+		"""
+		:param model: resident RawModel whose vertex and index buffers are shared with the instances
+		"""
+		self._model = model
+		self.capacity = capacity
+		self._data = np.zeros(shape = (capacity, InstanceBuffer.FLOATS_PER_INSTANCE), dtype = np.float32)
+		self._uploaded = [(None, -1)] * capacity  # (entity, revision) of every slot on the gpu
+		stride = InstanceBuffer.FLOATS_PER_INSTANCE * FLOAT_SIZE
+
+		# own vao, the model's vao stays free of instance attributes
+		self.vao = gpu_manager.create_and_bind_vao()
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, model.vbos[0])
+		gpu_manager.set_vertex_layout_pointers()
+		GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, model.indices_vbo)
+
+		self.vbo = GL.glGenBuffers(1)
+		gpu_manager.vbos.append(self.vbo)
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+		GL.glBufferData(GL.GL_ARRAY_BUFFER, self._data.nbytes, self._data, GL.GL_DYNAMIC_DRAW)
+		for column in range(4):
+			location = InstanceBuffer.MATRIX_LOCATION + column
+			GL.glEnableVertexAttribArray(location)
+			GL.glVertexAttribPointer(location, 4, GL.GL_FLOAT, GL.GL_FALSE, stride,
+			                         ctypes.c_void_p(column * 4 * FLOAT_SIZE))
+			GL.glVertexAttribDivisor(location, 1)
+		GL.glEnableVertexAttribArray(InstanceBuffer.COLOR_LOCATION)
+		GL.glVertexAttribPointer(InstanceBuffer.COLOR_LOCATION, 3, GL.GL_FLOAT, GL.GL_FALSE, stride,
+		                         ctypes.c_void_p(16 * FLOAT_SIZE))
+		GL.glVertexAttribDivisor(InstanceBuffer.COLOR_LOCATION, 1)
+
+		gpu_manager.unbind_vao()
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+		GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+	def update (self, entities):
+		"""
+		Upload the instances whose entity changed since the last call, one glBufferSubData per run of slots
+		:return: number of instances uploaded
+		"""
+		dirty = [i for i, e in enumerate(entities) if self._uploaded[i][0] is not e or
+		         self._uploaded[i][1] != e.revision]
+		if len(dirty) == 0:
+			return 0
+
+		for i in dirty:
+			e = entities[i]
+			self._data[i, :16] = e.model_matrix.T.ravel()  # glsl matrices are column major
+			self._data[i, 16:19] = e.color
+			self._uploaded[i] = (e, e.revision)
+
+		stride = InstanceBuffer.FLOATS_PER_INSTANCE * FLOAT_SIZE
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+		for first, last in contiguous_runs(dirty):
+			GL.glBufferSubData(GL.GL_ARRAY_BUFFER, first * stride, (last - first) * stride, self._data[first:last])
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+		return len(dirty)
+
+	def draw (self, count, state):
+		"""
+		:param state: GLStateCache the vao is bound through
+		"""
+		state.bind_vertex_array(self.vao)
+		GL.glDrawElementsInstanced(GL.GL_TRIANGLES, self._model.num_indices, self._model.index_type, None, count)
+
+
+class BoardChunkBuffers(object):
+	"""
+	A vertex array per chunk of a TileGrid, with the tile index as an extra attribute, and a texture buffer
+	of one byte per tile telling the shader which tiles are hidden because they are drawn as overlays
+	"""
+	TILE_ID_LOCATION = 8
+
+	def __init__ (self, gpu_manager, layout, grid, template, gl = GL):
+		"""
+		:param layout: VertexLayout with colors, positions are quantized to the bounds of each chunk
+		:param template: dict of arrays of the tile model
+		:param gl: module the calls go to
+		"""
+		self._gl = gl
+		self._gpu_manager = gpu_manager
+		self._layout = layout
+		self._grid = grid
+		self._template = template
+		self._chunks = [None] * grid.chunk_count  # RawModel of every chunk
+		self._uploaded_hidden = None
+		self.bakes = 0
+
+		self.hidden_buffer = self._gl.glGenBuffers(1)
+		gpu_manager.vbos.append(self.hidden_buffer)
+		self._gl.glBindBuffer(self._gl.GL_TEXTURE_BUFFER, self.hidden_buffer)
+		self._gl.glBufferData(self._gl.GL_TEXTURE_BUFFER, len(grid), None, self._gl.GL_DYNAMIC_DRAW)
+		self._gl.glBindBuffer(self._gl.GL_TEXTURE_BUFFER, 0)
+		self.hidden_texture = self._gl.glGenTextures(1)
+		gpu_manager.textures.append(self.hidden_texture)
+		self._gl.glBindTexture(self._gl.GL_TEXTURE_BUFFER, self.hidden_texture)
+		self._gl.glTexBuffer(self._gl.GL_TEXTURE_BUFFER, self._gl.GL_R8, self.hidden_buffer)
+		self._gl.glBindTexture(self._gl.GL_TEXTURE_BUFFER, 0)
+
+	def chunks (self):
+		return self._chunks
+
+	def update (self):
+		"""
+		Bake the chunks whose tile colors changed and upload the hidden tiles if they changed
+		:return: number of chunks baked
+		"""
+		dirty = self._grid.dirty_chunks()
+		for chunk in dirty:
+			self._upload(chunk, self._grid.bake(chunk, self._template))
+		self.bakes += len(dirty)
+
+		hidden = self._grid.hidden.astype(np.uint8) * 255
+		if self._uploaded_hidden is None or (hidden != self._uploaded_hidden).any():
+			self._gl.glBindBuffer(self._gl.GL_TEXTURE_BUFFER, self.hidden_buffer)
+			self._gl.glBufferSubData(self._gl.GL_TEXTURE_BUFFER, 0, hidden.nbytes, hidden)
+			self._gl.glBindBuffer(self._gl.GL_TEXTURE_BUFFER, 0)
+			self._uploaded_hidden = hidden
+		return len(dirty)
+
+	def _upload (self, chunk, arrays):
+		vertex_data, scale, offset = self._layout.pack(arrays['vertices'], arrays['colors'], arrays['normals'])
+		model = self._chunks[chunk]
+		if model is None:
+			# the tiles of a chunk never change, only their colors, so the buffers are created once
+			model = RawModel(self._gpu_manager.create_and_bind_vao(), self._gl.glGenBuffers(1), len(arrays['indices']))
+			model.vbos = [self._gl.glGenBuffers(1), self._gl.glGenBuffers(1), model.indices_vbo]
+			self._gpu_manager.vbos.extend(model.vbos)
+			self._gl.glBindBuffer(self._gl.GL_ARRAY_BUFFER, model.vbos[0])
+			self._gpu_manager.set_vertex_layout_pointers(self._layout)
+			self._gl.glBindBuffer(self._gl.GL_ARRAY_BUFFER, model.vbos[1])
+			self._gl.glEnableVertexAttribArray(BoardChunkBuffers.TILE_ID_LOCATION)
+			self._gl.glVertexAttribPointer(BoardChunkBuffers.TILE_ID_LOCATION, 1, self._gl.GL_FLOAT, self._gl.GL_FALSE, 0, None)
+			self._gl.glBufferData(self._gl.GL_ARRAY_BUFFER, arrays['tile_ids'].nbytes, arrays['tile_ids'], self._gl.GL_STATIC_DRAW)
+			self._gl.glBindBuffer(self._gl.GL_ELEMENT_ARRAY_BUFFER, model.indices_vbo)  # recorded in the vao
+			self._gl.glBufferData(self._gl.GL_ELEMENT_ARRAY_BUFFER, arrays['indices'].nbytes, arrays['indices'], self._gl.GL_STATIC_DRAW)
+			model.index_type = self._gl.GL_UNSIGNED_INT
+			model.aabb_min, model.aabb_max = arrays['aabb_min'], arrays['aabb_max']
+			model.gpu_bytes = vertex_data.nbytes + arrays['tile_ids'].nbytes + arrays['indices'].nbytes
+			self._gpu_manager.unbind_vao()
+			self._gl.glBindBuffer(self._gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+			self._chunks[chunk] = model
+
+		self._gl.glBindBuffer(self._gl.GL_ARRAY_BUFFER, model.vbos[0])
+		self._gl.glBufferData(self._gl.GL_ARRAY_BUFFER, vertex_data.nbytes, vertex_data, self._gl.GL_STATIC_DRAW)
+		self._gl.glBindBuffer(self._gl.GL_ARRAY_BUFFER, 0)
+		model.position_scale = scale
+		model.position_offset = offset
+
+	def bind_hidden_tiles (self, shader, unit):
+		self._gl.glActiveTexture(self._gl.GL_TEXTURE0 + unit)
+		self._gl.glBindTexture(self._gl.GL_TEXTURE_BUFFER, self.hidden_texture)
+		shader.setUniformValue('hidden_tiles', unit)
+
+	def gpu_bytes (self):
+		return sum(c.gpu_bytes for c in self._chunks if c is not None) + len(self._grid)
+
+
+class FrameUniformBuffer(object):
+	"""
+	The std140 FrameData block of the shaders: view, projection, view-projection, camera position,
+	lights and material, uploaded only when any of it changed
+	"""
+	FLOATS = 72  # 3 mat4, 1 vec4, 2 x 2 vec4 light arrays (std140 pads vec3 array elements to vec4), 1 vec4
+
+	def __init__ (self, gpu_manager):
+		self._uploaded = None
+		self.uploads = 0
+		self.ubo = GL.glGenBuffers(1)
+		gpu_manager.vbos.append(self.ubo)
+		GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.ubo)
+		GL.glBufferData(GL.GL_UNIFORM_BUFFER, FrameUniformBuffer.FLOATS * FLOAT_SIZE, None, GL.GL_DYNAMIC_DRAW)
+		GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+		GL.glBindBufferBase(GL.GL_UNIFORM_BUFFER, FRAME_UNIFORM_BINDING, self.ubo)
+
+	@staticmethod
+	def Pack (camera, lights, shine_damper = SHINE_DAMPER, reflectivity = REFLECTIVITY):
+		"""
+		:return: float32 array laid out like the FrameData block, matrices column major
+		"""
+		data = np.zeros(FrameUniformBuffer.FLOATS, dtype = np.float32)
+		data[0:16] = camera.get_view_matrix().T.ravel()
+		data[16:32] = camera.get_projection_matrix().T.ravel()
+		data[32:48] = camera.get_view_projection_matrix().T.ravel()
+		data[48:51] = camera.eye
+		data[51] = 1.0
+		for i, light in enumerate(lights[:2]):
+			data[52 + 4 * i:55 + 4 * i] = light.position
+			data[60 + 4 * i:63 + 4 * i] = light.color
+		data[68] = shine_damper
+		data[69] = reflectivity
+		return data
+
+	def update (self, camera, lights):
+		"""
+		:return: True if the buffer was uploaded
+		"""
+		data = FrameUniformBuffer.Pack(camera, lights)
+		if self._uploaded is not None and np.array_equal(data, self._uploaded):
+			return False
+		GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.ubo)
+		GL.glBufferSubData(GL.GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+		GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+		self._uploaded = data
+		self.uploads += 1
+		return True
+
+
+class GpuTimerRing(object):
+	"""
+	GL_TIME_ELAPSED queries recycled through a fixed ring. A result is read only once the driver
+	reports it available, usually a frame or two later, so collecting never waits for the GPU.
+	A pass issued while every query is still in flight is not timed.
+	"""
+
+	def __init__ (self, size, gl = GL):
+		self._gl = gl
+		self._free = [int(q) for q in gl.glGenQueries(size)]
+		self._pending = collections.deque()  # (frame, name, query) in issue order
+		self._active = None
+		self.dropped = 0
+
+	@staticmethod
+	def Result (gl, query, pname):
+		value = np.zeros(1, dtype = np.uint64)
+		gl.glGetQueryObjectui64v(query, pname, value)
+		return int(value[0])
+
+	def begin (self, frame, name):
+		"""
+		:param frame: key the result is reported with, anything identifying the frame
+		"""
+		if len(self._free) == 0:
+			self.dropped += 1
+			return
+		self._active = (frame, name, self._free.pop())
+		self._gl.glBeginQuery(self._gl.GL_TIME_ELAPSED, self._active[2])
+
+	def end (self):
+		if self._active is not None:
+			self._gl.glEndQuery(self._gl.GL_TIME_ELAPSED)
+			self._pending.append(self._active)
+			self._active = None
+
+	def collect (self):
+		"""
+		:return: list of (frame, name, seconds) of the queries finished since the last call
+		"""
+		results = []
+		while len(self._pending) > 0:
+			frame, name, query = self._pending[0]
+			if not GpuTimerRing.Result(self._gl, query, self._gl.GL_QUERY_RESULT_AVAILABLE):
+				break  # later queries cannot have finished before this one
+			results.append((frame, name, GpuTimerRing.Result(self._gl, query, self._gl.GL_QUERY_RESULT) * 1e-9))
+			self._pending.popleft()
+			self._free.append(query)
+		return results
+
+	def release (self):
+		queries = self._free + [query for _, _, query in self._pending]
+		if len(queries) > 0:
+			self._gl.glDeleteQueries(len(queries), queries)
+		self._free = []
+		self._pending.clear()
+
+
+class GLStateCache(object):
+	"""
+	Shadow copy of the GL state the renderer touches, calls that would not change anything are skipped.
+	The element array buffer binding belongs to the bound vertex array and is tracked per vao.
+	"""
+
+	def __init__ (self, gl = GL):
+		"""
+		:param gl: module the calls go to
+		"""
+		self._gl = gl
+		self.issued = 0
+		self.skipped = 0
+		self.invalidate()
+
+	def invalidate (self):
+		"""
+		Forget everything, to be called whenever someone else may have changed the state
+		"""
+		self._capabilities = dict()
+		self._cull_face = None
+		self._clear_color = None
+		self._viewport = None
+		self._program = None
+		self._vertex_array = None
+		self._buffers = dict()
+		self._element_buffers = dict()  # vao -> element array buffer
+
+	def _changed (self, changed):
+		if changed:
+			self.issued += 1
+		else:
+			self.skipped += 1
+		return changed
+
+	def reset_counters (self):
+		self.issued = 0
+		self.skipped = 0
+
+	def counters (self):
+		return dict(state_calls_issued = self.issued, state_calls_skipped = self.skipped)
+
+	def enable (self, capability):
+		if self._changed(self._capabilities.get(capability) is not True):
+			self._gl.glEnable(capability)
+			self._capabilities[capability] = True
+
+	def disable (self, capability):
+		if self._changed(self._capabilities.get(capability) is not False):
+			self._gl.glDisable(capability)
+			self._capabilities[capability] = False
+
+	def cull_face (self, mode):
+		if self._changed(self._cull_face != mode):
+			self._gl.glCullFace(mode)
+			self._cull_face = mode
+
+	def clear_color (self, r, g, b, a):
+		color = (r, g, b, a)
+		if self._changed(self._clear_color != color):
+			self._gl.glClearColor(r, g, b, a)
+			self._clear_color = color
+
+	def viewport (self, x, y, width, height):
+		rect = (x, y, width, height)
+		if self._changed(self._viewport != rect):
+			self._gl.glViewport(x, y, width, height)
+			self._viewport = rect
+
+	def use_program (self, shader):
+		"""
+		:param shader: QOpenGLShaderProgram, or None for no program
+		"""
+		program = shader.programId() if shader is not None else 0
+		if self._changed(self._program != program):
+			if shader is not None:
+				shader.bind()
+			else:
+				self._gl.glUseProgram(0)
+			self._program = program
+
+	def bind_vertex_array (self, vao):
+		if self._changed(self._vertex_array != vao):
+			self._gl.glBindVertexArray(vao)
+			self._vertex_array = vao
+
+	def bind_buffer (self, target, buffer):
+		if target == self._gl.GL_ELEMENT_ARRAY_BUFFER:
+			bindings, key = self._element_buffers, self._vertex_array
+		else:
+			bindings, key = self._buffers, target
+		if self._changed(bindings.get(key) != buffer):
+			self._gl.glBindBuffer(target, buffer)
+			bindings[key] = buffer
@@ -0,0 +1,86 @@
+"""
+Draw items sorted by shader, then model, then front to back, so that every
+shader and every model is bound once per frame however the entities are laid out.
+"""
+
+
+class DrawItem(object):
+	__slots__ = ('shader', 'shader_order', 'model', 'depth', 'entity', 'proxy')
+
+	def __init__ (self, shader, shader_order, model, depth, entity, proxy = False):
+		self.shader = shader
+		self.shader_order = shader_order
+		self.model = model
+		self.depth = depth
+		self.entity = entity
+		self.proxy = proxy  # drawn in place of a model that is still loading
+
+
+class RenderQueue(object):
+	def __init__ (self):
+		self._items = []
+		self.shader_binds = 0
+		self.model_binds = 0
+		self.draws = 0
+
+	def __len__ (self):
+		return len(self._items)
+
+	def reset_counters (self):
+		self.shader_binds = 0
+		self.model_binds = 0
+		self.draws = 0
+
+	def record (self, shader_binds = 0, model_binds = 0, draws = 0):
+		"""
+		Count work done outside of the queue, such as the instanced board pass
+		"""
+		self.shader_binds += shader_binds
+		self.model_binds += model_binds
+		self.draws += draws
+
+	def counters (self):
+		return dict(shader_binds = self.shader_binds, model_binds = self.model_binds, draws = self.draws)
+
+	def add (self, shader, shader_order, model, depth, entity, proxy = False):
+		"""
+		:param shader_order: sort key of the shader, shaders are compared by it and not by identity
+		:param model: RawModel to draw, its vao is the second sort key
+		:param depth: distance to the camera, nearer items are drawn first within a model
+		"""
+		self._items.append(DrawItem(shader, shader_order, model, depth, entity, proxy))
+
+	def batches (self):
+		"""
+		:return: list of (shader, model, items) with the items of each batch sorted front to back
+		"""
+		self._items.sort(key = lambda item: (item.shader_order, item.model.vao, item.depth))
+		batches = []
+		for item in self._items:
+			if len(batches) == 0 or batches[-1][0] is not item.shader or batches[-1][1] is not item.model:
+				batches.append((item.shader, item.model, []))
+			batches[-1][2].append(item)
+		return batches
+
+	def submit (self, bind_shader, bind_model, draw, release):
+		"""
+		Sort and issue every item, then empty the queue
+		:param bind_shader: called with a shader when it changes
+		:param bind_model: called with (shader, model) when the model changes
+		:param draw: called with (shader, item) for every item
+		:param release: called once after the last draw if anything was drawn
+		"""
+		shader = None
+		for batch_shader, model, items in self.batches():
+			if batch_shader is not shader:
+				shader = batch_shader
+				bind_shader(shader)
+				self.shader_binds += 1
+			bind_model(shader, model)
+			self.model_binds += 1
+			for item in items:
+				draw(shader, item)
+				self.draws += 1
+		if shader is not None:
+			release()
+		self._items = []
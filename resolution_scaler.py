@@ -0,0 +1,66 @@
+"""
+Picks the resolution scale of the scene from measured GPU frame times. Shading
+cost grows with the pixel count, the square of the scale, so a slow frame
+shrinks the scale by the square root of target over measured time at once,
+while spare time grows it back one step at a time. Scales are quantized to
+steps so that the render target is not reallocated every frame, and changes
+wait a few frames for timer queries of the new resolution to arrive.
+"""
+import math
+
+
+class ResolutionScaler(object):
+	def __init__ (self, target_ms, min_scale = 0.5, max_scale = 1.0, step = 0.05, smoothing = 0.2, cooldown = 8):
+		"""
+		:param target_ms: GPU time a frame should take
+		:param step: granularity of the scale
+		:param smoothing: weight of the newest sample in the moving average
+		:param cooldown: frames to wait after a change before the next one
+		"""
+		self.target_ms = target_ms
+		self.min_scale = min_scale
+		self.max_scale = max_scale
+		self.step = step
+		self.smoothing = smoothing
+		self.cooldown = cooldown
+		self.scale = max_scale
+		self.average_ms = None
+		self._wait = 0
+
+	def _quantize (self, scale):
+		scale = math.floor(scale / self.step + 1e-9) * self.step
+		return min(max(scale, self.min_scale), self.max_scale)
+
+	def update (self, gpu_ms):
+		"""
+		:param gpu_ms: GPU time of one frame rendered at the current scale
+		:return: scale for the next frames
+		"""
+		if self.average_ms is None:
+			self.average_ms = gpu_ms
+		else:
+			self.average_ms += self.smoothing * (gpu_ms - self.average_ms)
+		if self._wait > 0:
+			self._wait -= 1
+			return self.scale
+
+		ratio = self.target_ms / max(self.average_ms, 1e-6)
+		if ratio < 0.95:
+			scale = self._quantize(self.scale * math.sqrt(ratio))
+		elif ratio > 1.25:
+			scale = self._quantize(min(self.scale * math.sqrt(ratio), self.scale + self.step))
+		else:
+			return self.scale
+
+		if scale != self.scale:
+			# expect the cost to follow the pixel count until samples at the new scale arrive
+			self.average_ms *= (scale / self.scale) ** 2
+			self.scale = scale
+			self._wait = self.cooldown
+		return self.scale
+
+	def size (self, width, height):
+		"""
+		:return: (width, height) of the render target for a native size
+		"""
+		return max(1, int(round(width * self.scale))), max(1, int(round(height * self.scale)))
@@ -5,9 +5,16 @@ in vec3 to_light_vector[2];
 in vec3 surface_normal_vector;
 in vec3 to_camera_vector;
 
-uniform vec3 light_color[2];
-uniform float shine_damper;
-uniform float reflectivity;
+// per-frame data shared by every program, see FrameUniformBuffer
+layout (std140) uniform FrameData {
+    mat4 view_matrix;
+    mat4 projection_matrix;
+    mat4 view_projection_matrix;
+    vec4 camera_position;
+    vec4 light_position[2];
+    vec4 light_color[2];
+    vec4 material;  // x shine damper, y reflectivity
+};
 out vec4 out_color;
 
 void main () {
@@ -23,10 +30,10 @@ void main () {
 
         float brightness = max(dot(normalized_normal, normalized_to_light), 0.0);
         float specular_factor = max(dot(reflected_light_direction, normalized_camera), 0.0);
-        float dampedFactor = pow(specular_factor, shine_damper);
+        float dampedFactor = pow(specular_factor, material.x);
 
-        total_diffuse = total_diffuse + brightness * light_color[i];
-        total_specular = total_specular + dampedFactor * reflectivity * light_color[i];
+        total_diffuse = total_diffuse + brightness * light_color[i].xyz;
+        total_specular = total_specular + dampedFactor * material.y * light_color[i].xyz;
     }
 
     total_diffuse = max(total_diffuse, 0.2);
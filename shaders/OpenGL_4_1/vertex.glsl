@@ -1,31 +1,92 @@
 #version 410
 
+// QUANTIZED_POSITIONS and OCTAHEDRAL_NORMALS are defined by the renderer to match its vertex layout,
+// INSTANCED reads the model matrix and color per instance instead of from uniforms,
+// BAKED_TILES draws board chunks baked in world space with per-vertex colors
 layout (location = 0) in vec3 position;
 layout (location = 1) in vec3 color;
+#ifdef OCTAHEDRAL_NORMALS
+layout (location = 2) in vec2 normal;
+#else
 layout (location = 2) in vec3 normal;
+#endif
 
-uniform mat4 model_matrix;
-uniform mat4 view_matrix;
-uniform mat4 projection_matrix;
+#ifdef INSTANCED
+layout (location = 3) in mat4 instance_model_matrix;  // locations 3 to 6
+layout (location = 7) in vec3 instance_color;
+#endif
+
+#ifdef BAKED_TILES
+layout (location = 8) in float tile_id;
+uniform samplerBuffer hidden_tiles;  // one byte per tile, set for tiles drawn over the board instead
+#endif
+
+#ifdef QUANTIZED_POSITIONS
+uniform vec3 position_scale;
+uniform vec3 position_offset;
+#endif
 
+uniform mat4 model_matrix;
 uniform vec3 uniform_color;
-uniform vec3 light_position[2];
+
+// per-frame data shared by every program, see FrameUniformBuffer
+layout (std140) uniform FrameData {
+    mat4 view_matrix;
+    mat4 projection_matrix;
+    mat4 view_projection_matrix;
+    vec4 camera_position;
+    vec4 light_position[2];
+    vec4 light_color[2];
+    vec4 material;  // x shine damper, y reflectivity
+};
 
 out vec3 to_light_vector[2];
 out vec3 pass_color;
 out vec3 surface_normal_vector;
 out vec3 to_camera_vector;
 
+vec3 decode_octahedral (vec2 e) {
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    float t = max(-n.z, 0.0);
+    n.xy += mix(vec2(t), vec2(-t), greaterThanEqual(n.xy, vec2(0.0)));
+    return normalize(n);
+}
+
 void main () {
-    vec4 world_position = model_matrix * vec4(position, 1.0);
-    vec4 view_position = view_matrix * world_position;
-    gl_Position = projection_matrix * view_position;
+#ifdef QUANTIZED_POSITIONS
+    vec3 local_position = position_offset + position * position_scale;
+#else
+    vec3 local_position = position;
+#endif
+#ifdef OCTAHEDRAL_NORMALS
+    vec3 local_normal = decode_octahedral(normal);
+#else
+    vec3 local_normal = normal;
+#endif
+
+#ifdef INSTANCED
+    mat4 model = instance_model_matrix;
+    pass_color = instance_color;
+#elif defined(BAKED_TILES)
+    mat4 model = mat4(1.0);
+    pass_color = color;
+#else
+    mat4 model = model_matrix;
     pass_color = uniform_color;
+#endif
+
+    vec4 world_position = model * vec4(local_position, 1.0);
+    gl_Position = view_projection_matrix * world_position;
+#ifdef BAKED_TILES
+    if (texelFetch(hidden_tiles, int(tile_id)).r > 0.5) {
+        gl_Position = vec4(0.0, 0.0, 2.0, 1.0);  // beyond the far plane, the whole tile is clipped
+    }
+#endif
     for (int i = 0; i < 2; ++i) {
-        to_light_vector[i] = light_position[i] - world_position.xyz;
+        to_light_vector[i] = light_position[i].xyz - world_position.xyz;
     }
 
-    surface_normal_vector = (model_matrix * vec4(normal, 0.0)).xyz;
-    to_camera_vector= (inverse(view_matrix) * vec4(0.0, 0.0, 0.0, 1.0)).xyz - world_position.xyz;
+    surface_normal_vector = (model * vec4(local_normal, 0.0)).xyz;
+    to_camera_vector = camera_position.xyz - world_position.xyz;
 //    pass_color = vec3(uniform_color, uniform_color, uniform_color);
 }
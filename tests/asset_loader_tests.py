@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from asset_loader import MeshReader, read_mesh_arrays
+from bvh import BVH
+from common import *
+from mesh_cache import MeshCache
+from utils import intersect_ray_triangles
+from vertex_format import VertexLayout
+
+MESH_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mesh')
+
+
+class ReadMeshArraysTest(unittest.TestCase):
+	def test_bvh_indexes_stored_triangles ( self ):
+		arrays = read_mesh_arrays(os.path.join(MESH_DIRECTORY, 'knight.obj'))
+		bvh = BVH.FromArrays(dict((k[4:], v) for k, v in arrays.items() if k.startswith('bvh_')))
+		faces = np.asarray(arrays['indices'], dtype = np.int64).reshape(-1, 3)
+		v = np.asarray(arrays['vertices'], dtype = np.float64)[faces]
+		lo, hi = bvh.bounds()
+
+		rng = np.random.default_rng(5)
+		hits = 0
+		for i in range(50):
+			origin = (lo + hi) / 2.0 + rng.normal(size = 3) * np.linalg.norm(hi - lo) * 2.0
+			target = rng.uniform(lo, hi)
+			t = intersect_ray_triangles(origin, target - origin, v[:, 0], v[:, 1], v[:, 2])
+			hit_t, triangle = bvh.intersect(origin, target - origin)
+			if np.isinf(t.min()):
+				self.assertEqual(triangle, -1)
+				continue
+			hits += 1
+			self.assertAlmostEqual(hit_t, t.min())
+			self.assertAlmostEqual(t[triangle], t.min())
+		self.assertGreater(hits, 0)
+
+	def test_vertices_packed_once ( self ):
+		layout = VertexLayout(VERTEX_POSITION_FORMAT, VERTEX_NORMAL_FORMAT, VERTEX_COLOR_ATTRIBUTE)
+		with tempfile.TemporaryDirectory() as directory:
+			cache = MeshCache(directory)
+			read_mesh_arrays(os.path.join(MESH_DIRECTORY, 'pawn.obj'), 0.5, cache)
+			arrays = read_mesh_arrays(os.path.join(MESH_DIRECTORY, 'pawn.obj'), 0.5, cache)
+			self.assertEqual(cache.hits, 1)
+
+			prefixes = [''] + ['lod{}_'.format(level) for level in range(1, len(MESH_LOD_GRID_SIZES) + 1)]
+			for prefix in prefixes:
+				self.assertIsInstance(arrays[prefix + 'vertex_data'], np.memmap)
+				data, scale, offset = layout.pack(arrays[prefix + 'vertices'], arrays[prefix + 'colors'],
+				                                  arrays[prefix + 'normals'])
+				np.testing.assert_array_equal(arrays[prefix + 'vertex_data'], data)
+				np.testing.assert_array_equal(arrays[prefix + 'position_scale'], scale)
+				np.testing.assert_array_equal(arrays[prefix + 'position_offset'], offset)
+
+
+class MeshReaderTest(unittest.TestCase):
+	def test_cache_loaded_once_per_request ( self ):
+		with tempfile.TemporaryDirectory() as directory:
+			cache = MeshCache(directory)
+			reader = MeshReader(cache, workers = 1)
+			reader.request(os.path.join(MESH_DIRECTORY, 'cube.obj'))
+			self.assertEqual((cache.hits, cache.misses), (0, 1))
+			reader.request(os.path.join(MESH_DIRECTORY, 'cube.obj'))
+			self.assertEqual((cache.hits, cache.misses), (1, 1))
+			reader.shutdown()
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from board_chunks import TileGrid
+from model import MeshData
+
+
+class TileGridTest(unittest.TestCase):
+	def setUp ( self ):
+		mesh = MeshData.ReadFromFile('../mesh/cube.obj')
+		self.template = dict(vertices = np.asarray(mesh.vertices).reshape(-1, 3),
+		                     normals = np.asarray(mesh.normals).reshape(-1, 3),
+		                     indices = np.asarray(mesh.indices).reshape(-1))
+
+	def test_chunks ( self ):
+		grid = TileGrid.Checkerboard(5, 7, 10.0, 4)
+		self.assertEqual((grid.chunk_rows, grid.chunk_cols, grid.chunk_count), (2, 2, 4))
+		tiles = np.concatenate([grid.chunk_tiles(c) for c in range(grid.chunk_count)])
+		np.testing.assert_array_equal(np.sort(tiles), np.arange(35))
+		np.testing.assert_array_equal(grid.chunk_tiles(3), [grid.index(4, 4), grid.index(4, 5), grid.index(4, 6)])
+		np.testing.assert_array_equal(grid.colors[grid.index(0, 0)], [0.0, 0.0, 0.0])
+		np.testing.assert_array_equal(grid.colors[grid.index(0, 1)], [1.0, 1.0, 1.0])
+
+	def test_bake ( self ):
+		grid = TileGrid.Checkerboard(4, 4, 10.0, 2, scale = (9.0, 0.5, 9.0))
+		arrays = grid.bake(1, self.template)
+		count = len(self.template['vertices'])
+		tiles = grid.chunk_tiles(1)
+		self.assertEqual(len(arrays['vertices']), 4 * count)
+		self.assertEqual(len(arrays['indices']), 4 * len(self.template['indices']))
+		np.testing.assert_array_equal(arrays['tile_ids'][::count], tiles)
+		np.testing.assert_array_equal(arrays['colors'][::count], grid.colors[tiles])
+
+		# every tile is the template scaled and moved to its position
+		first = arrays['vertices'][:count]
+		expected = self.template['vertices'] * [9.0, 0.5, 9.0] + grid.positions[tiles[0]]
+		np.testing.assert_allclose(first, expected, atol = 1e-4)
+		np.testing.assert_allclose(np.linalg.norm(arrays['normals'], axis = 1), 1.0, atol = 1e-5)
+		self.assertEqual(arrays['indices'].max(), len(arrays['vertices']) - 1)
+
+	def test_bounds_contain_tiles ( self ):
+		grid = TileGrid.Checkerboard(5, 7, 10.0, 4, scale = (4.5, 0.5, 4.5))
+		tile_min = self.template['vertices'].min(axis = 0) * [4.5, 0.5, 4.5]
+		tile_max = self.template['vertices'].max(axis = 0) * [4.5, 0.5, 4.5]
+		for chunk in range(grid.chunk_count):
+			arrays = grid.bake(chunk, self.template)
+			tiles = grid.positions[grid.chunk_tiles(chunk)]
+			self.assertTrue((arrays['aabb_min'] <= tiles + tile_min + 1e-5).all())
+			self.assertTrue((arrays['aabb_max'] >= tiles + tile_max - 1e-5).all())
+			np.testing.assert_allclose(arrays['aabb_min'], arrays['vertices'].min(axis = 0), atol = 1e-5)
+			np.testing.assert_allclose(arrays['aabb_max'], arrays['vertices'].max(axis = 0), atol = 1e-5)
+
+	def test_rebake_only_changed_chunks ( self ):
+		grid = TileGrid.Checkerboard(4, 4, 10.0, 2)
+		self.assertEqual(grid.dirty_chunks(), [0, 1, 2, 3])
+		for chunk in grid.dirty_chunks():
+			grid.bake(chunk, self.template)
+		self.assertEqual(grid.dirty_chunks(), [])
+
+		index = grid.index(3, 0)
+		grid.set_color(index, [0.5, 0.5, 0.5])
+		self.assertEqual(grid.dirty_chunks(), [2])
+
+		# setting the baked color again is not a change
+		grid.set_color(index, grid.original_colors[index])
+		self.assertEqual(grid.dirty_chunks(), [])
+
+		# hiding a tile for an overlay does not rebake anything
+		grid.hidden[index] = True
+		self.assertEqual(grid.dirty_chunks(), [])
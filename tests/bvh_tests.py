@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from bvh import BVH
+from utils import intersect_ray_triangles
+
+
+class BVHTest(unittest.TestCase):
+	def setUp ( self ):
+		# bumpy height field, 2 * 40 * 40 triangles
+		n = 41
+		xs, zs = np.meshgrid(np.linspace(-1.0, 1.0, n), np.linspace(-1.0, 1.0, n))
+		ys = 0.2 * np.sin(4.0 * xs) * np.cos(3.0 * zs)
+		self.vertices = np.stack([xs, ys, zs], axis = -1).reshape(-1, 3)
+		ids = np.arange(n * n).reshape(n, n)
+		a, b, c, d = ids[:-1, :-1], ids[:-1, 1:], ids[1:, :-1], ids[1:, 1:]
+		self.faces = np.concatenate([np.stack([a, c, b], -1).reshape(-1, 3),
+		                             np.stack([b, c, d], -1).reshape(-1, 3)])
+		self.bvh = BVH(self.vertices, self.faces.flatten())
+
+	def test_matches_brute_force ( self ):
+		rng = np.random.default_rng(3)
+		v = self.vertices[self.faces]
+		for i in range(100):
+			origin = rng.uniform(-2.0, 2.0, 3) + np.array([0.0, 3.0, 0.0])
+			direction = rng.uniform(-1.0, 1.0, 3) * np.array([0.5, 0.0, 0.5]) - origin * np.array([0.3, 1.0, 0.3])
+			t = intersect_ray_triangles(origin, direction, v[:, 0], v[:, 1], v[:, 2])
+			hit_t, triangle = self.bvh.intersect(origin, direction)
+			if np.isinf(t.min()):
+				self.assertEqual(triangle, -1)
+			else:
+				self.assertAlmostEqual(hit_t, t.min())
+				self.assertAlmostEqual(t[triangle], t.min())
+
+	def test_bounds ( self ):
+		lo, hi = self.bvh.bounds()
+		np.testing.assert_allclose(lo, self.vertices.min(axis = 0))
+		np.testing.assert_allclose(hi, self.vertices.max(axis = 0))
@@ -0,0 +1,72 @@
+import os
+import unittest
+
+import numpy as np
+
+from asset_loader import read_mesh_arrays
+from entity import Camera, MousePicker
+from model import MeshData, ModelEntity, RawModel
+from utils import intersect_ray_triangles
+
+MESH_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mesh')
+
+
+class MousePickerTest(unittest.TestCase):
+	def test_rays_match_single ( self ):
+		camera = Camera()
+		camera.update_projection_matrix(800.0, 600.0)
+		picker = MousePicker(camera)
+		rng = np.random.default_rng(6)
+		points = np.vstack([rng.uniform([0.0, 0.0], [800.0, 600.0], (100, 2)),
+		                    [[0.0, 0.0], [800.0, 600.0], [400.0, 300.0]]])
+		rays = picker.compute_mouse_rays(points, 800, 600)
+		self.assertEqual(rays.shape, (len(points), 3))
+		for point, ray in zip(points, rays):
+			np.testing.assert_allclose(ray, picker.compute_mouse_ray(point[0], point[1], 800, 600), atol = 1e-12)
+
+	def test_pick_matches_brute_force ( self ):
+		rng = np.random.default_rng(7)
+		meshes = [MeshData.FromArrays(name, read_mesh_arrays(os.path.join(MESH_DIRECTORY, name + '.obj')))
+		          for name in ('knight', 'pawn', 'torus')]
+		entities = []
+		for i in range(9):
+			mesh = meshes[i % len(meshes)]
+			e = ModelEntity()
+			e.model = RawModel(None, None, 0, mesh.bvh)
+			e.position = np.array([(i % 3) * 6.0 - 6.0, rng.uniform(-0.5, 0.5), (i // 3) * 6.0 - 6.0])
+			e.rotation = rng.uniform(0.0, 360.0, 3)
+			e.scale = rng.uniform(6.0, 10.0, 3)
+			entities.append((e, mesh))
+
+		hits = 0
+		for _ in range(60):
+			origin = rng.normal(size = 3) * 30.0
+			e, mesh = entities[rng.integers(len(entities))]
+			target = e.model_matrix[:3, :3] @ rng.uniform(*mesh.bvh.bounds()) + e.model_matrix[:3, 3]
+			direction = target - origin
+
+			expected = (None, -1, np.inf)
+			for e, mesh in entities:
+				m = e.model_matrix
+				vertices = np.asarray(mesh.vertices, dtype = np.float64) @ m[:3, :3].T + m[:3, 3]
+				v = vertices[np.asarray(mesh.indices, dtype = np.int64).reshape(-1, 3)]
+				t = intersect_ray_triangles(origin, direction, v[:, 0], v[:, 1], v[:, 2])
+				if t.min() < expected[2]:
+					expected = (e, int(np.argmin(t)), t.min())
+
+			entity, triangle, t = MousePicker.pick_entity([e for e, _ in entities], origin, direction)
+			self.assertIs(entity, expected[0])
+			if entity is None:
+				continue
+			hits += 1
+			self.assertAlmostEqual(t, expected[2], places = 6)
+			mesh = [m for e, m in entities if e is entity][0]
+			faces = np.asarray(mesh.indices, dtype = np.int64).reshape(-1, 3)
+			if triangle != expected[1]:
+				# a shared edge can be hit at the same t by both triangles
+				v = np.asarray(mesh.vertices, dtype = np.float64)[faces[[triangle, expected[1]]]]
+				local = entity.inverse_model_matrix
+				t_local = intersect_ray_triangles(local[:3, :3] @ origin + local[:3, 3], local[:3, :3] @ direction,
+				                                  v[:, 0], v[:, 1], v[:, 2])
+				self.assertAlmostEqual(t_local[0], t_local[1], places = 6)
+		self.assertGreater(hits, 30)
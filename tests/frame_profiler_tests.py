@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from frame_profiler import FrameProfiler
+
+
+class FrameProfilerTest(unittest.TestCase):
+	def test_disabled_records_nothing ( self ):
+		profiler = FrameProfiler(enabled = False)
+		profiler.begin_frame()
+		with profiler.cpu('render'):
+			pass
+		profiler.end_frame()
+		self.assertEqual(profiler.frames(), [])
+		self.assertEqual(profiler.frame_index, 1)
+
+	def test_late_gpu_results ( self ):
+		profiler = FrameProfiler(enabled = True, history = 2)
+		for _ in range(3):
+			profiler.begin_frame()
+			with profiler.cpu('render_tiles'):
+				pass
+			with profiler.cpu('render_pieces'):
+				pass
+			profiler.end_frame()
+
+		# results of finished frames arrive later, the ones of dropped frames are ignored
+		profiler.add_gpu(0, 'render_tiles', 0.004)
+		profiler.add_gpu(1, 'render_tiles', 0.002)
+		profiler.add_gpu(2, 'render_tiles', 0.001)
+		frames = profiler.frames()
+		self.assertEqual([f.index for f in frames], [1, 2])
+		self.assertEqual([f.gpu for f in frames], [[('render_tiles', 0.002)], [('render_tiles', 0.001)]])
+
+		summary = profiler.summary()
+		self.assertEqual(list(summary['cpu'].keys()), ['render_tiles', 'render_pieces'])
+		self.assertAlmostEqual(summary['gpu']['render_tiles'], 1.5)
+
+	def test_export_trace ( self ):
+		profiler = FrameProfiler(enabled = True)
+		profiler.begin_frame()
+		with profiler.cpu('render_tiles'):
+			pass
+		profiler.add_gpu(profiler.frame_index, 'render_tiles', 0.003)
+		profiler.end_frame()
+
+		with tempfile.TemporaryDirectory() as directory:
+			file_name = os.path.join(directory, 'trace.json')
+			profiler.export_trace(file_name)
+			with open(file_name) as f:
+				trace = json.load(f)
+
+		events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+		cpu, gpu = events
+		self.assertEqual((cpu['tid'], gpu['tid']), (1, 2))
+		self.assertEqual(gpu['ts'], cpu['ts'])  # placed at the start of the cpu phase of the same name
+		self.assertAlmostEqual(gpu['dur'], 3000.0)
+
+	def test_read_while_recording ( self ):
+		profiler = FrameProfiler(enabled = True, history = 8)
+		done = threading.Event()
+
+		def record ():
+			while not done.is_set():
+				profiler.begin_frame()
+				with profiler.cpu('render'):
+					pass
+				profiler.add_gpu(profiler.frame_index, 'render', 0.001)
+				profiler.end_frame()
+
+		recorder = threading.Thread(target = record)
+		recorder.start()
+		try:
+			for _ in range(2000):
+				profiler.format_summary()
+				profiler.trace_events()
+		finally:
+			done.set()
+			recorder.join()
+		self.assertEqual(profiler.summary()['frames'], 8)
@@ -0,0 +1,50 @@
+import unittest
+
+from frame_scheduler import FrameScheduler
+
+
+class FrameSchedulerTest(unittest.TestCase):
+	def frame ( self, scheduler, animating = False ):
+		scheduler.frame_started()
+		scheduler.frame_rendered(animating)
+
+	def test_on_demand ( self ):
+		requests = []
+		scheduler = FrameScheduler(lambda: requests.append(1), on_demand = True)
+		self.frame(scheduler)
+		self.assertEqual(len(requests), 0)
+
+		# several changes before the frame is drawn ask for it once
+		scheduler.invalidate()
+		scheduler.invalidate()
+		self.assertEqual(len(requests), 1)
+		self.frame(scheduler)
+		self.assertEqual(len(requests), 1)
+
+		# animations keep frames coming until they stop
+		scheduler.invalidate()
+		self.frame(scheduler, animating = True)
+		self.frame(scheduler, animating = True)
+		self.assertEqual(len(requests), 4)
+		self.frame(scheduler, animating = False)
+		self.assertEqual(len(requests), 4)
+		self.assertEqual(scheduler.stats()['frames'], 5)
+
+	def test_change_while_drawing ( self ):
+		requests = []
+		scheduler = FrameScheduler(lambda: requests.append(1), on_demand = True)
+		scheduler.invalidate()
+		scheduler.frame_started()
+		scheduler.invalidate()  # input arriving on the GUI thread while the frame renders
+		scheduler.frame_rendered()
+		self.assertEqual(len(requests), 2)
+
+	def test_continuous_counts_idle_frames ( self ):
+		requests = []
+		scheduler = FrameScheduler(lambda: requests.append(1), on_demand = False)
+		for i in range(4):
+			self.frame(scheduler)
+		self.assertEqual(len(requests), 4)
+		stats = scheduler.stats()
+		self.assertEqual((stats['frames'], stats['idle_frames']), (4, 3))
+		self.assertGreaterEqual(stats['cpu_percent'], 0.0)
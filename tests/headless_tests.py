@@ -0,0 +1,40 @@
+import os
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtGui import QGuiApplication
+
+from headless import COUNTER_COLUMNS, HeadlessRenderer, summarize
+
+
+class SummarizeTest(unittest.TestCase):
+	def test_summarize ( self ):
+		samples = [dict(cpu_ms = float(v)) for v in range(1, 101)]
+		stats = summarize(samples, 'cpu_ms')
+		self.assertAlmostEqual(stats['mean'], 50.5)
+		self.assertAlmostEqual(stats['median'], 50.5)
+		self.assertAlmostEqual(stats['p95'], 95.05)
+		self.assertEqual(stats['max'], 100.0)
+
+
+class HeadlessRendererTest(unittest.TestCase):
+	def test_frames_are_reproducible ( self ):
+		app = QGuiApplication.instance() or QGuiApplication([])
+		cwd = os.getcwd()
+		os.chdir('..')  # the renderer loads shaders and meshes relative to the repository
+		try:
+			try:
+				headless = HeadlessRenderer(64, 48, scale = 1.0)
+			except RuntimeError as e:
+				self.skipTest(str(e))
+			headless.settle()
+			samples = headless.run(3, 'static', checksum = True)
+			headless.release()
+		finally:
+			os.chdir(cwd)
+
+		self.assertEqual(len(samples), 3)
+		self.assertTrue(all(s['cpu_ms'] > 0.0 and s['gpu_ms'] >= 0.0 for s in samples))
+		self.assertEqual(len(set(s['checksum'] for s in samples)), 1)
+		self.assertTrue(all(s['draws'] > 0 and all(name in s for name in COUNTER_COLUMNS) for s in samples))
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from mesh_cache import MeshCache
+
+
+class MeshCacheTest(unittest.TestCase):
+	def test_round_trip ( self ):
+		with tempfile.TemporaryDirectory() as directory:
+			source = os.path.join(directory, 'mesh.obj')
+			with open(source, 'w') as f:
+				f.write('v 0 0 0\n')
+
+			cache = MeshCache(os.path.join(directory, 'cache'))
+			key = cache.key(source, 0.5)
+			self.assertIsNone(cache.load(key))
+
+			vertices = np.arange(9, dtype = np.float32).reshape(3, 3)
+			indices = np.arange(3, dtype = np.uint32)
+			cache.store(key, dict(vertices = vertices, indices = indices))
+
+			arrays = cache.load(key)
+			self.assertIsInstance(arrays['vertices'], np.memmap)
+			np.testing.assert_array_equal(arrays['vertices'], vertices)
+			self.assertEqual(arrays['indices'].dtype, np.uint32)
+			self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+			# different parameters or content must not reuse the entry
+			self.assertNotEqual(cache.key(source, 0.0), key)
+			with open(source, 'a') as f:
+				f.write('v 1 1 1\n')
+			self.assertNotEqual(cache.key(source, 0.5), key)
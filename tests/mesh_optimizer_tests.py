@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from mesh_optimizer import *
+
+
+def grid ( n ):
+	"""
+	n x n quads with every triangle owning its own corners, like an unwelded export
+	"""
+	xs, zs = np.meshgrid(np.arange(n + 1), np.arange(n + 1))
+	points = np.stack([xs.ravel(), np.zeros(xs.size), zs.ravel()], axis = 1).astype(np.float32)
+	quads = []
+	for r in range(n):
+		for c in range(n):
+			a, b, d, e = r * (n + 1) + c, r * (n + 1) + c + 1, (r + 1) * (n + 1) + c, (r + 1) * (n + 1) + c + 1
+			quads += [a, d, b, b, d, e]
+	vertices = points[quads] + np.float32(1e-6) * (np.arange(len(quads))[:, np.newaxis] % 2)  # jitter below the tolerance
+	return dict(vertices = vertices,
+	            colors = np.zeros(shape = (0, 3), dtype = np.float32),
+	            normals = np.tile(np.float32([0.0, 1.0, 0.0]), (len(quads), 1)),
+	            indices = np.arange(len(quads), dtype = np.uint32),
+	            texturecoords = np.zeros(shape = (0, len(quads), 3), dtype = np.float32))
+
+
+def triangle_set ( arrays ):
+	corners = np.round(arrays['vertices'][np.asarray(arrays['indices'], dtype = np.int64)], 4).reshape(-1, 9)
+	return sorted(map(tuple, corners))
+
+
+class MeshOptimizerTest(unittest.TestCase):
+	def test_weld ( self ):
+		arrays = grid(4)
+		welded = weld_vertices(arrays, 1e-5)
+		self.assertEqual(len(welded['vertices']), 25)
+		self.assertEqual(len(welded['normals']), 25)
+		self.assertEqual(triangle_set(welded), triangle_set(arrays))
+
+		# exact matching keeps the jittered copies apart
+		self.assertGreater(len(weld_vertices(arrays, 0.0)['vertices']), 25)
+
+	def test_optimize_mesh ( self ):
+		arrays = grid(20)
+		rng = np.random.default_rng(3)
+		triangles = arrays['indices'].reshape(-1, 3)
+		arrays['indices'] = triangles[rng.permutation(len(triangles))].reshape(-1)
+
+		optimized, stats = optimize_mesh(arrays)
+		self.assertEqual(optimized['indices'].dtype, np.uint16)
+		self.assertEqual(stats['vertices_after'], 21 * 21)
+		self.assertEqual(stats['indices_after'], stats['indices_before'])
+		self.assertEqual(triangle_set(optimized), triangle_set(arrays))
+		self.assertLess(stats['acmr_after'], 1.0)
+		self.assertLess(stats['acmr_after'], compute_acmr(weld_vertices(arrays)['indices']))
+
+		# vertices appear in the order the index stream first uses them
+		_, first = np.unique(optimized['indices'], return_index = True)
+		np.testing.assert_array_equal(np.argsort(first), np.arange(21 * 21))
+
+	def test_acmr ( self ):
+		self.assertEqual(compute_acmr(np.arange(9)), 3.0)
+		self.assertEqual(compute_acmr([0, 1, 2, 2, 1, 3]), 2.0)
+		self.assertEqual(compute_acmr([0, 1, 2, 0, 1, 2], cache_size = 2), 3.0)
@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+
+from asset_loader import read_mesh_arrays
+from mesh_simplifier import *
+from model import MeshData
+
+
+class MeshSimplifierTest(unittest.TestCase):
+	def test_generate_lods ( self ):
+		arrays = read_mesh_arrays('../mesh/king.obj')
+		lods = MeshData.FromArrays('king', arrays).lods
+		self.assertGreater(len(lods), 1)
+
+		triangle_counts = [len(arrays['indices']) // 3] + [len(lod.indices) // 3 for lod in lods]
+		self.assertEqual(triangle_counts, sorted(triangle_counts, reverse = True))
+		self.assertLess(triangle_counts[-1], triangle_counts[0] / 10)
+
+		for lod in lods:
+			self.assertLess(int(lod.indices.max()), len(lod.vertices))
+			self.assertEqual(len(lod.normals), len(lod.vertices))
+			# the simplified surface stays inside the original bounds, within one cell
+			self.assertTrue((lod.vertices.min(axis = 0) >= arrays['vertices'].min(axis = 0) - 0.1).all())
+			self.assertTrue((lod.vertices.max(axis = 0) <= arrays['vertices'].max(axis = 0) + 0.1).all())
+
+	def test_keeps_coarse_meshes ( self ):
+		arrays = read_mesh_arrays('../mesh/cube_tile.obj', 0.5)
+		self.assertEqual(generate_lods(arrays, (32, 16, 8)), [])
@@ -0,0 +1,130 @@
+import contextlib
+import io
+import unittest
+from concurrent.futures import Future
+
+from asset_loader import read_mesh_arrays
+from model_registry import ModelRegistry
+
+
+class FakeGpuManager(object):
+	def __init__ ( self ):
+		self.next_vao = 1
+
+	def load_to_vao ( self, mesh_data, model ):
+		model.vao = self.next_vao
+		model.num_indices = len(mesh_data.indices)
+		model.gpu_bytes = 1000
+		self.next_vao += 1
+		return model
+
+	def release_model ( self, model ):
+		model.vao = None
+		model.gpu_bytes = 0
+
+
+class FakeReader(object):
+	def __init__ ( self ):
+		self.futures = dict()
+		self.shut_down = False
+
+	def request ( self, file_name, offset = 0.0 ):
+		if file_name.endswith('cube_tile.obj'):
+			return read_mesh_arrays(file_name, offset)
+		self.futures[file_name] = Future()
+		return self.futures[file_name]
+
+	def finish ( self, file_name ):
+		self.futures[file_name].set_result(read_mesh_arrays(file_name))
+
+	def fail ( self, file_name ):
+		self.futures[file_name].set_exception(IOError('truncated'))
+
+	def shutdown ( self ):
+		self.shut_down = True
+
+
+class ModelRegistryTest(unittest.TestCase):
+	def setUp ( self ):
+		self.reader = FakeReader()
+		self.registry = ModelRegistry(FakeGpuManager(), self.reader, proxy_index = 0, memory_budget = 2500)
+		self.registry.register(0, '../mesh/cube_tile.obj', 'cube', 0.5)
+		self.registry.register(1, '../mesh/cube.obj', 'a')
+		self.registry.register(2, '../mesh/cone.obj', 'b')
+		self.registry.register(3, '../mesh/sphere.obj', 'c')
+
+	def test_proxy_until_loaded ( self ):
+		model = self.registry[1]
+		self.assertFalse(model.is_resident())
+		self.assertIsNone(model.bvh)
+		self.assertIs(self.registry.acquire(model), self.registry[0])
+		self.assertEqual(list(self.reader.futures), ['../mesh/cube.obj'])
+
+		self.reader.finish('../mesh/cube.obj')
+		self.assertIs(self.registry.acquire(model), model)
+		self.assertTrue(model.is_resident())
+		self.assertIsNotNone(model.bvh)
+
+	def test_nothing_loaded_before_use ( self ):
+		self.assertEqual(self.registry.gpu_bytes(), 0)
+		self.registry.load([0])
+		self.assertEqual(self.registry.gpu_bytes(), 1000)
+		self.assertFalse(self.registry[2].is_resident())
+
+	def test_prefetch ( self ):
+		self.registry.prefetch([0, 1, 2])
+		self.assertEqual(sorted(self.reader.futures), ['../mesh/cone.obj', '../mesh/cube.obj'])
+		self.assertEqual(self.registry.gpu_bytes(), 0)
+		self.assertFalse(self.registry.has_pending())
+
+		# read before the first draw, which uploads it without another request
+		self.reader.finish('../mesh/cube.obj')
+		futures = dict(self.reader.futures)
+		self.assertIs(self.registry.acquire(self.registry[1]), self.registry[1])
+		self.assertEqual(self.reader.futures, futures)
+
+		self.assertIs(self.registry.acquire(self.registry[2]), self.registry[0])
+		self.assertTrue(self.registry.has_pending())
+
+	def test_evicts_least_recently_used ( self ):
+		self.registry.load([0])
+		for index, name in [(1, 'cube'), (2, 'cone'), (3, 'sphere')]:
+			self.registry.acquire(self.registry[index])
+			self.reader.finish('../mesh/{}.obj'.format(name))
+
+		# over budget, but everything was drawn this frame
+		self.registry.begin_frame()
+		self.registry.acquire(self.registry[1])
+		self.registry.acquire(self.registry[2])
+		self.assertEqual(self.registry.end_frame(), 0)
+		self.assertEqual(self.registry.gpu_bytes(), 3000)
+
+		self.registry.begin_frame()
+		self.registry.acquire(self.registry[3])
+		self.assertEqual(self.registry.end_frame(), 2)
+		self.assertEqual([self.registry[i].is_resident() for i in range(4)], [True, False, False, True])
+		self.assertIsNotNone(self.registry[1].bvh)
+
+		# evicted models are uploaded again without reading the file
+		self.assertIs(self.registry.acquire(self.registry[1]), self.registry[1])
+
+	def test_failed_load_keeps_proxy ( self ):
+		model = self.registry[2]
+		self.registry.acquire(model)
+		self.reader.fail('../mesh/cone.obj')
+
+		log = io.StringIO()
+		with contextlib.redirect_stdout(log):
+			for _ in range(3):
+				self.assertIs(self.registry.acquire(model), self.registry[0])
+		self.assertEqual(log.getvalue().count('cone.obj'), 1)
+		self.assertFalse(model.is_resident())
+		self.assertFalse(self.registry.has_pending())
+
+	def test_release_all ( self ):
+		self.registry.load([0])
+		self.registry.acquire(self.registry[1])
+		self.registry.release_all()
+		self.assertEqual(self.registry.gpu_bytes(), 0)
+		self.assertFalse(self.registry.has_pending())
+		self.assertTrue(self.reader.shut_down)
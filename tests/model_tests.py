@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+
+from model import ModelEntity
+from utils import create_transformation_matrices
+
+
+class ModelEntityTest(unittest.TestCase):
+	def setUp ( self ):
+		self.entity = ModelEntity()
+		self.entity.position = np.array([1.0, 2.0, 3.0])
+		self.entity.rotation = np.array([10.0, 20.0, 30.0])
+		self.entity.scale = np.array([1.0, 2.0, 1.0])
+
+	def expected ( self ):
+		e = self.entity
+		return create_transformation_matrices(e.position, e.rotation, e.scale)[0]
+
+	def test_in_place_writes_invalidate ( self ):
+		e = self.entity
+		first = e.model_matrix
+		self.assertIs(e.model_matrix, first)  # cached while nothing changes
+
+		e.position[1] = 5.0
+		self.assertEqual(ModelEntity.UpdateModelMatrices([e]), 1)
+		np.testing.assert_allclose(e.model_matrix, self.expected())
+		self.assertEqual(e.model_matrix[1, 3], 5.0)
+
+		e.rotation += 15.0
+		np.testing.assert_allclose(e.model_matrix, self.expected())
+		e.scale *= 2.0
+		np.testing.assert_allclose(e.model_matrix, self.expected())
+		e.position[:] = [0.0, 0.0, 0.0]
+		np.testing.assert_allclose(e.model_matrix, self.expected())
+		np.testing.assert_allclose(e.inverse_model_matrix, np.linalg.inv(self.expected()), atol = 1e-12)
+
+	def test_derived_arrays_do_not_invalidate ( self ):
+		e = self.entity
+		matrix = e.model_matrix
+		revision = e.revision
+
+		copy = e.position.copy()
+		copy[0] = 100.0
+		part = e.position[:2]
+		self.assertIsNone(part._on_change)
+		part.copy()[0] = 100.0
+		moved = e.position + 1.0
+		moved[2] = 50.0
+		self.assertEqual(ModelEntity.UpdateModelMatrices([e]), 0)
+		self.assertIs(e.model_matrix, matrix)
+		self.assertEqual(e.revision, revision)
+
+	def test_batch_update_only_dirty ( self ):
+		entities = [ModelEntity() for _ in range(3)]
+		for i, e in enumerate(entities):
+			e.position = np.array([float(i), 0.0, 0.0])
+			e.rotation = np.zeros(3)
+			e.scale = np.ones(3)
+		self.assertEqual(ModelEntity.UpdateModelMatrices(entities), 3)
+		self.assertEqual(ModelEntity.UpdateModelMatrices(entities), 0)
+
+		entities[1].position[2] = 4.0
+		self.assertEqual(ModelEntity.UpdateModelMatrices(entities), 1)
+		np.testing.assert_allclose(entities[1].model_matrix[:3, 3], [1.0, 0.0, 4.0])
+
+	def test_assignment_bumps_revision ( self ):
+		# instance buffers re-upload an entity only when its revision changed
+		e = self.entity
+		revision = e.revision
+		e.color = np.array([1.0, 0.0, 0.0])
+		self.assertGreater(e.revision, revision)
+		revision = e.revision
+		e.position = np.array([0.0, 1.0, 0.0])
+		self.assertGreater(e.revision, revision)
+		np.testing.assert_allclose(e.model_matrix, self.expected())
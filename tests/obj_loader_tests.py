@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from obj_loader import load_obj
+
+
+class ObjLoaderTest(unittest.TestCase):
+	def _load ( self, text ):
+		with tempfile.TemporaryDirectory() as directory:
+			file_name = os.path.join(directory, 'mesh.obj')
+			with open(file_name, 'w') as f:
+				f.write(text)
+			return load_obj(file_name)
+
+	def test_quad_is_triangulated_and_welded ( self ):
+		vertices, colors, normals, indices, texturecoords = self._load('\n'.join([
+			'v 0 0 0', 'v 1 0 0', 'v 1 0 1', 'v 0 0 1',
+			'vn 0 1 0',
+			'f 1//1 2//1 3//1 4//1',
+		]))
+		self.assertEqual(vertices.dtype, np.float32)
+		self.assertEqual(indices.dtype, np.uint32)
+		self.assertEqual(len(vertices), 4)
+		self.assertEqual(len(indices), 6)
+		np.testing.assert_array_equal(normals, np.tile([0.0, 1.0, 0.0], (4, 1)))
+		self.assertEqual(len(texturecoords), 0)
+		self.assertEqual(len(colors), 0)
+
+	def test_shared_position_with_different_normals_is_split ( self ):
+		vertices, _, normals, indices, texturecoords = self._load('\n'.join([
+			'v 0 0 0', 'v 1 0 0', 'v 0 1 0', 'v 0 0 1',
+			'vt 0 0', 'vt 1 0', 'vt 0 1',
+			'vn 0 0 1', 'vn 0 1 0',
+			'f 1/1/1 2/2/1 3/3/1',
+			'f -4/1/2 -3/2/2 -1/3/2',
+		]))
+		self.assertEqual(len(vertices), 6)
+		self.assertEqual(texturecoords.shape, (1, 6, 3))
+		triangles = vertices[indices.reshape(-1, 3)]
+		np.testing.assert_array_equal(triangles[1], [[0, 0, 0], [1, 0, 0], [0, 0, 1]])
+
+	def test_missing_normals_are_generated ( self ):
+		vertices, _, normals, indices, _ = self._load('v 0 0 0\nv 1 0 0\nv 0 0 -1\nf 1 2 3\n')
+		np.testing.assert_allclose(normals, np.tile([0.0, 1.0, 0.0], (3, 1)))
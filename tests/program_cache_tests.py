@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from program_cache import ProgramCache
+
+
+class ProgramCacheTest(unittest.TestCase):
+	def test_round_trip ( self ):
+		with tempfile.TemporaryDirectory() as directory:
+			cache = ProgramCache(os.path.join(directory, 'cache'))
+			device = ('vendor', 'renderer', '4.1')
+			key = cache.key(('vertex', 'fragment'), device, ['INSTANCED'])
+			self.assertIsNone(cache.load(key))
+
+			cache.store(key, 0x8741, b'\x01\x02\x03')
+			self.assertEqual(cache.load(key), (0x8741, b'\x01\x02\x03'))
+			self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+			# sources, defines and the driver all invalidate the binary
+			self.assertNotEqual(cache.key(('vertex ', 'fragment'), device, ['INSTANCED']), key)
+			self.assertNotEqual(cache.key(('vertex', 'fragment'), device), key)
+			self.assertNotEqual(cache.key(('vertex', 'fragment'), ('vendor', 'renderer', '4.5'), ['INSTANCED']), key)
+
+	def test_discard ( self ):
+		with tempfile.TemporaryDirectory() as directory:
+			cache = ProgramCache(directory)
+			key = cache.key(('vertex', 'fragment'), ('vendor', 'renderer', '4.1'))
+			cache.store(key, 1, b'\x00')
+			cache.discard(key)
+			self.assertIsNone(cache.load(key))
+			self.assertEqual(cache.rejected, 1)
+
+			# truncated entries are misses
+			with open(os.path.join(directory, key + '.bin'), 'wb') as f:
+				f.write(b'\x01')
+			self.assertIsNone(cache.load(key))
+			self.assertFalse(os.path.exists(os.path.join(directory, key + '.bin')))
@@ -1,6 +1,18 @@
+import os
+import time
 import unittest
 
-from model import MeshData
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication
+
+from board_chunks import TileGrid
+from common import *
+from entity import Camera, Light
+from model import EntityCreator, MeshData
+from render_engine import BoardChunkBuffers, FrameUniformBuffer, GLStateCache, GpuTimerRing, SceneRenderer
+from vertex_format import VertexLayout
 
 
 class MeshDataLoaderTest(unittest.TestCase):
@@ -22,3 +34,189 @@ class MeshDataLoaderTest(unittest.TestCase):
 			print('indices is empty')
 		if len(mesh.texturecoords) == 0:
 			print('texturecoords is empty')
+
+
+class FrameUniformBufferTest(unittest.TestCase):
+	def test_pack_std140 ( self ):
+		camera = Camera()
+		lights = [Light('a', np.array([1.0, 2.0, 3.0]), np.array([0.1, 0.2, 0.3])),
+		          Light('b', np.array([4.0, 5.0, 6.0]), np.array([0.4, 0.5, 0.6]))]
+		data = FrameUniformBuffer.Pack(camera, lights, 20.0, 1.0)
+		self.assertEqual(data.nbytes, 288)
+
+		# matrices are column major, element (row, col) at col * 4 + row
+		view = data[0:16].reshape(4, 4).T
+		np.testing.assert_allclose(view, camera.get_view_matrix(), rtol = 1e-6, atol = 1e-5)
+		np.testing.assert_allclose(data[32:48].reshape(4, 4).T, camera.get_view_projection_matrix(), rtol = 1e-5,
+		                           atol = 1e-5)
+		np.testing.assert_allclose(data[48:52], list(camera.eye) + [1.0], rtol = 1e-6)
+		np.testing.assert_allclose(data[52:60], [1.0, 2.0, 3.0, 0.0, 4.0, 5.0, 6.0, 0.0])
+		np.testing.assert_allclose(data[60:68], [0.1, 0.2, 0.3, 0.0, 0.4, 0.5, 0.6, 0.0], rtol = 1e-6)
+		np.testing.assert_allclose(data[68:72], [20.0, 1.0, 0.0, 0.0])
+
+
+class _RecordingGL(object):
+	GL_ELEMENT_ARRAY_BUFFER = 0x8893
+	GL_ARRAY_BUFFER = 0x8892
+	GL_TIME_ELAPSED = 0x88BF
+	GL_QUERY_RESULT = 0x8866
+	GL_QUERY_RESULT_AVAILABLE = 0x8867
+
+	def __init__ (self):
+		self.calls = []
+
+	def __getattr__ (self, name):
+		return lambda *args: self.calls.append((name,) + args)
+
+
+class GLStateCacheTest(unittest.TestCase):
+	def test_skips_redundant_calls ( self ):
+		gl = _RecordingGL()
+		state = GLStateCache(gl)
+		for _ in range(3):
+			state.enable(1)
+			state.viewport(0, 0, 10, 10)
+			state.bind_vertex_array(5)
+		self.assertEqual(gl.calls, [('glEnable', 1), ('glViewport', 0, 0, 10, 10), ('glBindVertexArray', 5)])
+		self.assertEqual(state.counters(), dict(state_calls_issued = 3, state_calls_skipped = 6))
+		state.reset_counters()
+		state.enable(1)
+		self.assertEqual(state.counters(), dict(state_calls_issued = 0, state_calls_skipped = 1))
+
+		state.disable(1)
+		state.invalidate()
+		state.disable(1)
+		self.assertEqual(gl.calls[-2:], [('glDisable', 1), ('glDisable', 1)])
+
+	def test_element_buffer_follows_vertex_array ( self ):
+		gl = _RecordingGL()
+		state = GLStateCache(gl)
+		state.bind_vertex_array(1)
+		state.bind_buffer(gl.GL_ELEMENT_ARRAY_BUFFER, 7)
+		state.bind_vertex_array(2)
+		state.bind_buffer(gl.GL_ELEMENT_ARRAY_BUFFER, 7)  # a different vao, must be bound again
+		state.bind_vertex_array(1)
+		state.bind_buffer(gl.GL_ELEMENT_ARRAY_BUFFER, 7)  # still recorded in vao 1
+		self.assertEqual([c for c in gl.calls if c[0] == 'glBindBuffer'],
+		                 [('glBindBuffer', gl.GL_ELEMENT_ARRAY_BUFFER, 7)] * 2)
+
+
+class _QueryGL(_RecordingGL):
+	"""
+	Queries finish when the test says so, each one measured 1 ms per id
+	"""
+
+	def __init__ (self):
+		super(_QueryGL, self).__init__()
+		self.finished = set()
+
+	def glGenQueries (self, n):
+		return list(range(1, n + 1))
+
+	def glGetQueryObjectui64v (self, query, pname, value):
+		if pname == self.GL_QUERY_RESULT_AVAILABLE:
+			value[0] = query in self.finished
+		else:
+			value[0] = query * 1000000
+
+
+class GpuTimerRingTest(unittest.TestCase):
+	def test_collect_without_waiting ( self ):
+		gl = _QueryGL()
+		ring = GpuTimerRing(2, gl)
+		for frame in range(3):
+			ring.begin(frame, 'tiles')
+			ring.end()
+		self.assertEqual(ring.dropped, 1)  # both queries in flight during the third frame
+		self.assertEqual(ring.collect(), [])
+
+		gl.finished.update([1, 2])
+		results = ring.collect()
+		self.assertEqual([(f, n) for f, n, _ in results], [(0, 'tiles'), (1, 'tiles')])
+		self.assertAlmostEqual(results[0][2], 0.002)  # queries are handed out from the end of the ring
+
+		ring.begin(3, 'tiles')
+		ring.end()
+		self.assertEqual(ring.dropped, 1)
+
+
+class _BufferGL(_RecordingGL):
+	def __init__ (self):
+		super(_BufferGL, self).__init__()
+		self.next_name = 1
+
+	def glGenBuffers (self, n):
+		self.next_name += 1
+		return self.next_name
+
+	glGenTextures = glGenBuffers
+
+
+class _FakeGpuManager(object):
+	def __init__ (self):
+		self.vbos = []
+		self.textures = []
+
+	def create_and_bind_vao (self):
+		return 1
+
+	def set_vertex_layout_pointers (self, layout = None):
+		pass
+
+	def unbind_vao (self):
+		pass
+
+
+class BoardChunkBuffersTest(unittest.TestCase):
+	def test_update_without_context ( self ):
+		mesh = MeshData.ReadFromFile('../mesh/cube_tile.obj', offset = 0.5)
+		template = dict(vertices = mesh.vertices, normals = mesh.normals, indices = mesh.indices)
+		grid = TileGrid.Checkerboard(8, 8, 2.0, 4)
+		gl = _BufferGL()
+		chunks = BoardChunkBuffers(_FakeGpuManager(), VertexLayout('unorm16', 'oct16', True), grid, template, gl)
+
+		self.assertEqual(chunks.update(), 4)
+		for chunk, model in enumerate(chunks.chunks()):
+			self.assertEqual(model.num_indices, len(grid.chunk_tiles(chunk)) * len(mesh.indices))
+			self.assertTrue((model.aabb_min <= grid.positions[grid.chunk_tiles(chunk)]).all())
+			self.assertTrue((model.aabb_max >= grid.positions[grid.chunk_tiles(chunk)]).all())
+		self.assertGreater(chunks.gpu_bytes(), 0)
+
+		# only the changed chunk is uploaded again, hiding a tile only updates the texture buffer
+		self.assertEqual(chunks.update(), 0)
+		grid.set_color(grid.index(7, 7), [0.5, 0.5, 0.5])
+		grid.hidden[grid.index(0, 0)] = True
+		del gl.calls[:]
+		self.assertEqual(chunks.update(), 1)
+		self.assertEqual([c[0] for c in gl.calls if c[0] in ('glBufferData', 'glBufferSubData')],
+		                 ['glBufferData', 'glBufferSubData'])
+
+
+class TileOverlayTest(unittest.TestCase):
+	def setUp ( self ):
+		self.app = QGuiApplication.instance() or QGuiApplication([])
+		self.renderer = SceneRenderer(None, Camera())
+		self.renderer._board = TileGrid.Checkerboard(8, 8, 2.0, BOARD_CHUNK_SIZE)
+		self.renderer._models.register(CUBE_MODEL_INDEX, '../mesh/cube_tile.obj', 'cube')
+		self.renderer._entity_creator = EntityCreator(self.renderer._models)
+
+	def hover ( self, row, col ):
+		hover_table = np.zeros((8, 8))
+		hover_table[row][col] = 1.0
+		self.renderer.prepare_titles(hover_table)
+
+	def test_hover_moving_backwards ( self ):
+		# the new overlay comes before the old one in row-major order, removing the old one must not stop it
+		self.hover(5, 5)
+		self.hover(2, 3)
+		start = time.perf_counter()
+		while time.perf_counter() - start < 0.3:
+			self.app.processEvents()
+
+		board = self.renderer.checker_board()
+		self.assertEqual(list(self.renderer._tile_overlays.keys()), [board.index(2, 3)])
+		self.assertEqual(list(np.flatnonzero(board.hidden)), [board.index(2, 3)])
+		e = self.renderer._tile_overlays[board.index(2, 3)]
+		self.assertAlmostEqual(e.position[1], TILE_HOVER_Y_POSITION, places = 5)
+		np.testing.assert_allclose(e.color, TILE_HOVER_COLOR, atol = 1e-5)
+		self.assertFalse(self.renderer.is_animating())
@@ -0,0 +1,39 @@
+import unittest
+
+from render_queue import RenderQueue
+
+
+class FakeModel(object):
+	def __init__ ( self, vao ):
+		self.vao = vao
+
+
+class RenderQueueTest(unittest.TestCase):
+	def test_sorted_submission ( self ):
+		shader_a, shader_b = object(), object()
+		king, pawn = FakeModel(2), FakeModel(1)
+		queue = RenderQueue()
+		queue.add(shader_b, 1, king, 5.0, 'b-king-far')
+		queue.add(shader_a, 0, king, 9.0, 'a-king-far')
+		queue.add(shader_a, 0, pawn, 3.0, 'a-pawn')
+		queue.add(shader_a, 0, king, 1.0, 'a-king-near')
+		queue.add(shader_b, 1, king, 2.0, 'b-king-near')
+
+		calls = []
+		queue.submit(lambda shader: calls.append(('shader', shader)),
+		             lambda shader, model: calls.append(('model', model.vao)),
+		             lambda shader, item: calls.append(('draw', item.entity)),
+		             lambda: calls.append(('release',)))
+
+		self.assertEqual(calls, [('shader', shader_a),
+		                         ('model', 1), ('draw', 'a-pawn'),
+		                         ('model', 2), ('draw', 'a-king-near'), ('draw', 'a-king-far'),
+		                         ('shader', shader_b),
+		                         ('model', 2), ('draw', 'b-king-near'), ('draw', 'b-king-far'),
+		                         ('release',)])
+		self.assertEqual(queue.counters(), dict(shader_binds = 2, model_binds = 3, draws = 5))
+		self.assertEqual(len(queue), 0)
+
+		queue.reset_counters()
+		queue.submit(None, None, None, None)  # nothing queued, nothing called
+		self.assertEqual(queue.counters(), dict(shader_binds = 0, model_binds = 0, draws = 0))
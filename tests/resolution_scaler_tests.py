@@ -0,0 +1,32 @@
+import unittest
+
+from resolution_scaler import ResolutionScaler
+
+
+class ResolutionScalerTest(unittest.TestCase):
+	def test_drops_and_recovers ( self ):
+		scaler = ResolutionScaler(10.0, 0.5, 1.0, step = 0.05, smoothing = 1.0, cooldown = 0)
+		self.assertEqual(scaler.size(3840, 2160), (3840, 2160))
+
+		# twice the target: the pixel count has to halve, the scale drops to about 1 / sqrt(2) at once
+		self.assertAlmostEqual(scaler.update(20.0), 0.70)
+		self.assertEqual(scaler.size(3840, 2160), (2688, 1512))
+
+		# plenty of headroom: one step at a time, never above the maximum
+		self.assertAlmostEqual(scaler.update(4.0), 0.75)
+		for _ in range(10):
+			scaler.update(1.0)
+		self.assertEqual(scaler.scale, 1.0)
+
+	def test_bounds_and_cooldown ( self ):
+		scaler = ResolutionScaler(10.0, 0.5, 1.0, smoothing = 1.0, cooldown = 3)
+		self.assertEqual(scaler.update(100.0), 0.5)
+		for _ in range(3):
+			self.assertEqual(scaler.update(1.0), 0.5)  # waiting for samples at the new scale
+		self.assertAlmostEqual(scaler.update(1.0), 0.55)
+
+	def test_within_target ( self ):
+		scaler = ResolutionScaler(10.0, 0.5, 1.0, smoothing = 1.0, cooldown = 0)
+		scaler.update(20.0)
+		scale = scaler.scale
+		self.assertEqual(scaler.update(9.0), scale)
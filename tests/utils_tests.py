@@ -0,0 +1,152 @@
+import unittest
+
+import numpy as np
+
+from utils import *
+
+
+class TransformationMatrixTest(unittest.TestCase):
+	def test_batched_matches_single ( self ):
+		rng = np.random.default_rng(1)
+		positions = rng.uniform(-50.0, 50.0, (32, 3))
+		rotations = rng.uniform(0.0, 360.0, (32, 3))
+		scales = rng.uniform(0.5, 20.0, (32, 3))
+
+		matrices = create_transformation_matrices(positions, rotations, scales)
+		self.assertEqual(matrices.shape, (32, 4, 4))
+		self.assertEqual(matrices.dtype, np.float32)
+
+		for i in range(32):
+			expected = create_transformation_matrix(positions[i], rotations[i], scales[i])
+			np.testing.assert_allclose(matrices[i], expected, rtol = 1e-5, atol = 1e-4)
+
+
+class CameraMathTest(unittest.TestCase):
+	def test_inverse_perspective_projection ( self ):
+		m = perspective_projection(45.0, 4.0 / 3.0, 0.001, 500.0)
+		np.testing.assert_allclose(inverse_perspective_projection(m) @ m, np.identity(4), atol = 1e-9)
+
+	def test_rotate_vector_matches_matrix ( self ):
+		v = np.array([0.3, -0.7, 0.5])
+		axis = normalize_vector(np.array([1.0, 2.0, -0.5]))
+		np.testing.assert_allclose(rotate_vector(v, 37.0, axis), rotate(37.0, axis) @ v, atol = 1e-12)
+
+
+class BoardLookupTest(unittest.TestCase):
+	@staticmethod
+	def _scan ( point, length, rows, cols, gap ):
+		for row in range(rows):
+			for col in range(cols):
+				x = col * length - length * cols / 2.0 + length / 2.0
+				z = row * length - length * rows / 2.0 + length / 2.0
+				if abs(point[0] - x) < length / 2.0 - gap and abs(point[2] - z) < length / 2.0 - gap:
+					return row, col
+		return None, None
+
+	def test_matches_scan ( self ):
+		rng = np.random.default_rng(2)
+		for rows, cols, length, gap in [(8, 8, 10.0, 0.1), (5, 13, 2.5, 0.3), (100, 120, 1.0, 0.0)]:
+			points = np.zeros((500, 3))
+			points[:, 0] = rng.uniform(-0.6, 0.6, 500) * length * cols
+			points[:, 2] = rng.uniform(-0.6, 0.6, 500) * length * rows
+			batch_rows, batch_cols = find_coords_on_plane_batch(points, length, rows, cols, gap)
+			for i, p in enumerate(points):
+				expected = self._scan(p, length, rows, cols, gap)
+				self.assertEqual(find_coords_on_plane(p, length, rows, cols, gap), expected)
+				if expected[0] is None:
+					self.assertEqual((batch_rows[i], batch_cols[i]), (-1, -1))
+				else:
+					self.assertEqual((batch_rows[i], batch_cols[i]), expected)
+
+	def test_parallel_ray_misses ( self ):
+		eye = np.array([-35.0, 0.0, -70.0])
+		with np.errstate(divide = 'ignore', invalid = 'ignore'):
+			point = find_plane_point(eye, eye + np.array([1.0, 0.0, 0.5]) * 500.0)
+		self.assertFalse(np.isfinite(point).all())
+		self.assertEqual(find_coords_on_plane(point, 10.0, 8, 8), (None, None))
+		for value in (np.inf, -np.inf, np.nan):
+			self.assertEqual(find_coords_on_plane(np.array([value, 0.0, 1.0]), 10.0, 8, 8), (None, None))
+			self.assertEqual(find_coords_on_plane(np.array([1.0, 0.0, value]), 10.0, 8, 8), (None, None))
+
+	def test_plane_points_match_single ( self ):
+		eye = np.array([-35.0, 80.0, -70.0])
+		directions = np.array([[0.3, -0.7, 0.5], [0.1, 0.2, 0.3], [-0.2, -0.9, 0.1]])
+		points = find_plane_points(eye, directions)
+		np.testing.assert_allclose(points[0], find_plane_point(eye, eye + directions[0] * 500.0))
+		self.assertTrue(np.isnan(points[1]).all())
+		np.testing.assert_allclose(points[2], find_plane_point(eye, eye + directions[2] * 500.0))
+
+
+class LevelOfDetailTest(unittest.TestCase):
+	def test_projected_sizes ( self ):
+		sizes = projected_sizes(np.array([[0.0, 0.0, -10.0], [0.0, 0.0, -20.0]]), np.array([1.0, 1.0]),
+		                        np.zeros(3), 90.0, 400.0)
+		np.testing.assert_allclose(sizes, [40.0, 20.0])
+
+	def test_select_lod_hysteresis ( self ):
+		thresholds = (100.0, 50.0)
+		np.testing.assert_array_equal(select_lod([200.0, 80.0, 10.0], [0, 0, 0], thresholds), [0, 1, 2])
+
+		# just below a threshold keeps the finer level, just above keeps the coarser one
+		np.testing.assert_array_equal(select_lod([95.0, 105.0], [0, 1], thresholds, 0.1), [0, 1])
+		np.testing.assert_array_equal(select_lod([85.0, 115.0], [0, 1], thresholds, 0.1), [1, 0])
+		np.testing.assert_array_equal(select_lod([10.0], [0], thresholds, 0.1), [2])
+
+
+class ShaderSourceTest(unittest.TestCase):
+	def test_inject_defines ( self ):
+		source = '#version 410\nvoid main () {}'
+		self.assertEqual(inject_defines(source, ['A', 'B']), '#version 410\n#define A\n#define B\nvoid main () {}')
+		self.assertEqual(inject_defines('void main () {}', ['A']), '#define A\nvoid main () {}')
+
+
+class FrustumCullingTest(unittest.TestCase):
+	def test_compute_bounds ( self ):
+		bmin, bmax, center, radius = compute_bounds(np.array([[0.0, 0.0, 0.0], [2.0, 4.0, 4.0], [1.0, 1.0, 1.0]]))
+		np.testing.assert_allclose(bmin, [0.0, 0.0, 0.0])
+		np.testing.assert_allclose(bmax, [2.0, 4.0, 4.0])
+		np.testing.assert_allclose(center, [1.0, 2.0, 2.0])
+		self.assertAlmostEqual(radius, 3.0)
+
+	def test_cull_aabbs ( self ):
+		planes = frustum_planes(perspective_projection(90.0, 1.0, 0.1, 100.0))
+		positions = np.array([[0.0, 0.0, -10.0],  # ahead
+		                      [0.0, 0.0, 10.0],  # behind
+		                      [-30.0, 0.0, -10.0],  # left
+		                      [-10.5, 0.0, -10.0],  # straddling the left plane
+		                      [0.0, 0.0, -150.0]])  # past the far plane
+		matrices = create_transformation_matrices(positions, np.zeros((5, 3)), np.ones((5, 3)))
+		visible = cull_aabbs(planes, matrices, np.array([-1.0, -1.0, -1.0]), np.array([1.0, 1.0, 1.0]))
+		np.testing.assert_array_equal(visible, [True, False, False, True, False])
+
+	def test_cull_aabbs_is_conservative ( self ):
+		rng = np.random.default_rng(6)
+		view_projection = perspective_projection(45.0, 4.0 / 3.0, 0.1, 100.0) @ \
+		                  create_transformation_matrix([3.0, -2.0, -5.0], [20.0, 30.0, 0.0], [1.0, 1.0, 1.0])
+		matrices = create_transformation_matrices(rng.uniform(-60.0, 60.0, (300, 3)),
+		                                          rng.uniform(0.0, 360.0, (300, 3)),
+		                                          rng.uniform(0.5, 8.0, (300, 3)))
+		visible = cull_aabbs(frustum_planes(view_projection), matrices, -np.ones(3), np.ones(3))
+
+		corners = np.array(np.meshgrid([-1.0, 1.0], [-1.0, 1.0], [-1.0, 1.0])).reshape(3, -1).T
+		for m, v in zip(matrices, visible):
+			clip = (view_projection @ m @ np.hstack([corners, np.ones((8, 1))]).T).T
+			w = clip[:, 3:]
+			inside = ((np.abs(clip[:, :3]) <= w) & (w > 0)).all(axis = 1)
+			if inside.any():
+				self.assertTrue(v)
+
+			# culled only when the world space box enclosing the transformed one is outside a single plane
+			world = (m @ np.hstack([corners, np.ones((8, 1))]).T).T[:, :3]
+			box = np.where(corners > 0.0, world.max(axis = 0), world.min(axis = 0))
+			clip = (view_projection @ np.hstack([box, np.ones((8, 1))]).T).T
+			w = clip[:, 3:]
+			outside_one_plane = ((clip[:, :3] < -w).all(axis = 0) | (clip[:, :3] > w).all(axis = 0)).any()
+			self.assertEqual(v, not outside_one_plane)
+
+
+class ContiguousRunsTest(unittest.TestCase):
+	def test_runs ( self ):
+		self.assertEqual(contiguous_runs([]), [])
+		self.assertEqual(contiguous_runs([4]), [(4, 5)])
+		self.assertEqual(contiguous_runs([0, 1, 2, 5, 7, 8]), [(0, 3), (5, 6), (7, 9)])
@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from vertex_format import *
+
+
+class VertexFormatTest(unittest.TestCase):
+	def test_octahedral_round_trip ( self ):
+		rng = np.random.default_rng(4)
+		normals = rng.normal(size = (2000, 3))
+		normals /= np.linalg.norm(normals, axis = 1)[:, np.newaxis]
+		normals[:6] = np.vstack([np.identity(3), -np.identity(3)])
+
+		encoded = np.round(encode_octahedral(normals) * 32767.0) / 32767.0
+		decoded = decode_octahedral(encoded)
+		self.assertLess(np.degrees(np.arccos(np.clip((decoded * normals).sum(axis = 1), -1.0, 1.0))).max(), 0.01)
+
+	def test_pack ( self ):
+		rng = np.random.default_rng(5)
+		vertices = rng.uniform(-2.0, 3.0, (50, 3)).astype(np.float32)
+		normals = np.tile(np.float32([0.0, 0.0, -1.0]), (50, 1))
+		colors = np.zeros(shape = (0, 3), dtype = np.float32)
+
+		layout = VertexLayout('unorm16', 'oct16')
+		self.assertEqual(layout.stride, 12)
+		self.assertEqual([(a.location, a.offset) for a in layout.attributes], [(0, 0), (2, 8)])
+		self.assertEqual(layout.defines(), ['QUANTIZED_POSITIONS', 'OCTAHEDRAL_NORMALS'])
+
+		data, scale, offset = layout.pack(vertices, colors, normals)
+		self.assertEqual(data.nbytes, 50 * 12)
+		packed = data.view(layout.dtype)
+		positions = offset + packed['position'][:, :3] / 65535.0 * scale
+		np.testing.assert_allclose(positions, vertices, atol = 5.0 / 65535.0)
+		np.testing.assert_allclose(decode_octahedral(packed['normal'] / 32767.0), normals, atol = 1e-4)
+
+		data, _, _ = VertexLayout('float32', 'float32', colors = True).pack(vertices, colors, normals)
+		self.assertEqual(data.nbytes, 50 * 36)
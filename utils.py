@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 import numpy.linalg as la
 
@@ -16,6 +18,23 @@ def perspective_projection ( fovy, aspect_ratio, near_z, far_z ):
 	return m
 
 
+def inverse_perspective_projection ( m ):
+	"""
+	Closed form inverse of a matrix created by perspective_projection
+	:param m: perspective projection matrix
+	:return: inverse matrix
+	"""
+	inv = np.zeros(shape = (4, 4))
+
+	inv[0][0] = 1.0 / m[0][0]
+	inv[1][1] = 1.0 / m[1][1]
+	inv[2][3] = -1.0
+	inv[3][2] = 1.0 / m[2][3]
+	inv[3][3] = m[2][2] / m[2][3]
+
+	return inv
+
+
 def look_at ( eye, center, up ):
 	f = normalize_vector(center - eye)
 	u = normalize_vector(up)
@@ -113,6 +132,46 @@ def create_transformation_matrix ( trans, rotation, scale_val ):
 	return m
 
 
+def create_transformation_matrices ( translations, rotations, scales ):
+	"""
+	Batched version of create_transformation_matrix, T * Rz * Ry * Rx * S is
+	expanded in closed form so no per-entity matrix products are needed
+	:param translations: (N, 3) positions
+	:param rotations: (N, 3) euler angles in degrees, applied x, y, then z
+	:param scales: (N, 3) scale factors
+	:return: (N, 4, 4) float32 matrices
+	"""
+	translations = np.asarray(translations, dtype = np.float64).reshape(-1, 3)
+	rotations = np.asarray(rotations, dtype = np.float64).reshape(-1, 3)
+	scales = np.asarray(scales, dtype = np.float64).reshape(-1, 3)
+
+	rad = np.radians(rotations)
+	c = np.cos(rad)
+	s = np.sin(rad)
+	cx, cy, cz = c[:, 0], c[:, 1], c[:, 2]
+	sx, sy, sz = s[:, 0], s[:, 1], s[:, 2]
+
+	m = np.zeros(shape = (len(translations), 4, 4), dtype = np.float32)
+
+	# rotation part, each column scaled by the corresponding scale component
+	m[:, 0, 0] = cz * cy * scales[:, 0]
+	m[:, 1, 0] = sz * cy * scales[:, 0]
+	m[:, 2, 0] = -sy * scales[:, 0]
+
+	m[:, 0, 1] = (cz * sy * sx - sz * cx) * scales[:, 1]
+	m[:, 1, 1] = (sz * sy * sx + cz * cx) * scales[:, 1]
+	m[:, 2, 1] = cy * sx * scales[:, 1]
+
+	m[:, 0, 2] = (cz * sy * cx + sz * sx) * scales[:, 2]
+	m[:, 1, 2] = (sz * sy * cx - cz * sx) * scales[:, 2]
+	m[:, 2, 2] = cy * cx * scales[:, 2]
+
+	m[:, :3, 3] = translations
+	m[:, 3, 3] = 1.0
+
+	return m
+
+
 def convert_to_normalized_device_coords ( x, y, width, height ):
 	"""
 	Convert (x, y) screen coords to OpenGL's NDC
@@ -169,6 +228,20 @@ def rotate ( angle, axis ):
 	return m
 
 
+def rotate_vector ( v, angle, axis ):
+	"""
+	Rotate v around a unit axis using Rodrigues' formula, same result as rotate(angle, axis) @ v
+	:param v: 3d vector
+	:param angle: degrees
+	:param axis: unit 3d vector
+	:return: rotated vector
+	"""
+	t = np.radians(angle)
+	cos = np.cos(t)
+	sin = np.sin(t)
+	return v * cos + np.cross(axis, v) * sin + axis * (np.dot(axis, v) * (1.0 - cos))
+
+
 def find_plane_point ( start_point, end_point ):
 	"""
 	Find the coordinates on the checker board using binary search
@@ -183,26 +256,209 @@ def find_plane_point ( start_point, end_point ):
 	return np.array([x, 0.0, z])
 
 
-def find_coords_on_plane ( point, length, rows, cols ):
+def intersect_ray_aabbs ( origin, direction, bounds_min, bounds_max ):
+	"""
+	Slab test of one ray against many axis aligned boxes
+	:param origin: 3d ray origin
+	:param direction: 3d ray direction, does not need to be normalized
+	:param bounds_min: (N, 3) box minimum corners
+	:param bounds_max: (N, 3) box maximum corners
+	:return: (t_near, t_far, hit) arrays of length N
+	"""
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		inv_direction = 1.0 / direction
+		t0 = (bounds_min - origin) * inv_direction
+		t1 = (bounds_max - origin) * inv_direction
+	t_near = np.minimum(t0, t1).max(axis = 1)
+	t_far = np.maximum(t0, t1).min(axis = 1)
+	hit = (t_near <= t_far) & (t_far >= 0.0)
+	return np.maximum(t_near, 0.0), t_far, hit
+
+
+def intersect_ray_triangles ( origin, direction, v0, v1, v2, epsilon = 1e-9 ):
+	"""
+	Moller-Trumbore test of one ray against many triangles
+	:param origin: 3d ray origin
+	:param direction: 3d ray direction, does not need to be normalized
+	:param v0: (N, 3) first corners
+	:param v1: (N, 3) second corners
+	:param v2: (N, 3) third corners
+	:return: (N,) ray parameters, inf where there is no hit
+	"""
+	e1 = v1 - v0
+	e2 = v2 - v0
+	p = np.cross(direction, e2)
+	det = np.einsum('ij,ij->i', e1, p)
+	valid = np.abs(det) > epsilon
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		inv_det = 1.0 / det
+		s = origin - v0
+		u = np.einsum('ij,ij->i', s, p) * inv_det
+		q = np.cross(s, e1)
+		v = (q @ direction) * inv_det
+		t = np.einsum('ij,ij->i', e2, q) * inv_det
+	valid &= (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > epsilon)
+	return np.where(valid, t, np.inf)
+
+
+def find_plane_points ( origin, directions ):
+	"""
+	Intersect rays sharing one origin with the y = 0 plane
+	:param origin: 3d ray origin
+	:param directions: (N, 3) ray directions
+	:return: (N, 3) points, NaN where the ray does not hit the plane
+	"""
+	directions = np.asarray(directions, dtype = np.float64).reshape(-1, 3)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		t = -origin[1] / directions[:, 1]
+	t[~(t > 0.0)] = np.nan
+	return origin + t[:, np.newaxis] * directions
+
+
+def find_coords_on_plane ( point, length, rows, cols, gap = 0.1 ):
 	"""
 	Check if point is in the check board plane,
 	return (row, col) if found, otherwise None
 	:param point: 3d point
+	:param length: tile length, the board is centered at the origin
+	:param gap: margin inside each tile border that does not count as a hit
 	:return: coords
 	"""
-	for row in range(rows):  # y
-		for col in range(cols):  # x
-			position = np.array([col * length - length * cols / 2.0 + length / 2.0,
-			                     0.0,
-			                     row * length - length * rows / 2.0 + length / 2.0])
+	if not np.isfinite(point).all():  # rays parallel to the board never reach it
+		return None, None
+	u = (point[0] + length * cols / 2.0) / length
+	v = (point[2] + length * rows / 2.0) / length
+	col = math.floor(u)
+	row = math.floor(v)
+
+	if not (0 <= row < rows and 0 <= col < cols):
+		return None, None
+
+	# local offsets inside the tile
+	x = (u - col) * length
+	z = (v - row) * length
+	if gap < x < length - gap and gap < z < length - gap:
+		return row, col
 
-			x_lo = position[0] - length / 2.0 + 0.1
-			x_hi = position[0] + length / 2.0 - 0.1
+	return None, None
 
-			z_lo = position[2] - length / 2.0 + 0.1
-			z_hi = position[2] + length / 2.0 - 0.1
 
-			if (x_lo < point[0]) and (point[0] < x_hi) and (z_lo < point[2]) and (point[2] < z_hi):
-				return row, col
+def find_coords_on_plane_batch ( points, length, rows, cols, gap = 0.1 ):
+	"""
+	Vectorized find_coords_on_plane
+	:param points: (N, 3) points on the plane
+	:return: (rows, cols) int arrays of length N, -1 where there is no tile
+	"""
+	points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+	u = (points[:, 0] + length * cols / 2.0) / length
+	v = (points[:, 2] + length * rows / 2.0) / length
+	col = np.floor(u)
+	row = np.floor(v)
+	x = (u - col) * length
+	z = (v - row) * length
 
-	return None, None
+	hit = (row >= 0) & (row < rows) & (col >= 0) & (col < cols) & \
+	      (gap < x) & (x < length - gap) & (gap < z) & (z < length - gap)
+
+	return np.where(hit, row, -1).astype(np.int64), np.where(hit, col, -1).astype(np.int64)
+
+
+def compute_bounds ( vertices ):
+	"""
+	:return: (aabb min, aabb max, sphere center, sphere radius), the sphere is centered on the box
+	"""
+	vertices = np.asarray(vertices, dtype = np.float64).reshape(-1, 3)
+	if len(vertices) == 0:
+		return np.zeros(3), np.zeros(3), np.zeros(3), 0.0
+	bmin = vertices.min(axis = 0)
+	bmax = vertices.max(axis = 0)
+	center = (bmin + bmax) / 2.0
+	return bmin, bmax, center, float(np.sqrt(((vertices - center) ** 2).sum(axis = 1).max()))
+
+
+def frustum_planes ( view_projection ):
+	"""
+	Extract the clipping planes of a view-projection matrix (Gribb and Hartmann)
+	:return: (6, 4) planes (a, b, c, d) with unit normals pointing inside, left, right, bottom, top, near, far
+	"""
+	m = np.asarray(view_projection, dtype = np.float64)
+	planes = np.array([m[3] + m[0], m[3] - m[0],
+	                   m[3] + m[1], m[3] - m[1],
+	                   m[3] + m[2], m[3] - m[2]])
+	return planes / la.norm(planes[:, :3], axis = 1)[:, np.newaxis]
+
+
+def cull_aabbs ( planes, matrices, bmin, bmax ):
+	"""
+	Test model space boxes, transformed to world space, against frustum planes all at once
+	:param planes: (6, 4) from frustum_planes
+	:param matrices: (N, 4, 4) model matrices
+	:param bmin: (N, 3) or (3,) model space box minimum
+	:param bmax: (N, 3) or (3,) model space box maximum
+	:return: (N,) bool, True when the box is at least partly inside
+	"""
+	matrices = np.asarray(matrices, dtype = np.float64)
+	center = (np.asarray(bmin) + np.asarray(bmax)) / 2.0
+	extent = (np.asarray(bmax) - np.asarray(bmin)) / 2.0
+	center = np.broadcast_to(center, (len(matrices), 3))
+	extent = np.broadcast_to(extent, (len(matrices), 3))
+
+	# world space box enclosing the transformed one
+	world_center = np.einsum('nij,nj->ni', matrices[:, :3, :3], center) + matrices[:, :3, 3]
+	world_extent = np.einsum('nij,nj->ni', np.abs(matrices[:, :3, :3]), extent)
+
+	distances = world_center @ planes[:, :3].T + planes[:, 3]  # (N, 6)
+	radii = world_extent @ np.abs(planes[:, :3]).T
+	return (distances + radii >= 0.0).all(axis = 1)
+
+
+def contiguous_runs ( indices ):
+	"""
+	:param indices: sorted integers
+	:return: list of (first, last) half-open ranges covering them
+	"""
+	indices = np.asarray(indices, dtype = np.int64)
+	if len(indices) == 0:
+		return []
+	breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+	firsts = indices[np.concatenate([[0], breaks])]
+	lasts = indices[np.concatenate([breaks - 1, [len(indices) - 1]])] + 1
+	return list(zip(firsts.tolist(), lasts.tolist()))
+
+
+def inject_defines ( source, defines ):
+	"""
+	Add '#define' lines to GLSL source, right after the '#version' line which has to stay first
+	"""
+	lines = source.split('\n')
+	first = 1 if lines and lines[0].lstrip().startswith('#version') else 0
+	return '\n'.join(lines[:first] + ['#define ' + d for d in defines] + lines[first:])
+
+
+def projected_sizes ( centers, radii, eye, fovy, height ):
+	"""
+	Approximate on-screen diameter of bounding spheres under a perspective projection
+	:param centers: (N, 3) world space sphere centers
+	:param radii: (N,) world space radii
+	:param fovy: vertical field of view in degrees
+	:param height: viewport height in pixels
+	:return: (N,) diameters in pixels
+	"""
+	distances = np.maximum(la.norm(np.asarray(centers) - eye, axis = 1), 1e-6)
+	return np.asarray(radii) / (distances * math.tan(math.radians(fovy) / 2.0)) * height
+
+
+def select_lod ( sizes, levels, thresholds, hysteresis = 0.0 ):
+	"""
+	Pick a level of detail per object, level i + 1 is used below thresholds[i],
+	a level only changes once the size is past the threshold by the hysteresis fraction
+	:param sizes: (N,) projected sizes
+	:param levels: (N,) levels used so far
+	:param thresholds: decreasing sizes
+	:return: (N,) int levels
+	"""
+	sizes = np.asarray(sizes, dtype = np.float64)[:, np.newaxis]
+	thresholds = np.asarray(thresholds, dtype = np.float64)
+	coarsest = (sizes < thresholds * (1.0 - hysteresis)).sum(axis = 1)
+	finest = (sizes < thresholds * (1.0 + hysteresis)).sum(axis = 1)
+	return np.clip(np.asarray(levels), coarsest, finest).astype(np.int64)
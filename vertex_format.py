@@ -0,0 +1,134 @@
+"""
+Interleaved vertex layouts. A layout packs the attributes of a mesh into one
+byte array with a single stride, every attribute padded to four bytes, and
+describes the glVertexAttribPointer call and shader defines needed to read it.
+"""
+import numpy as np
+
+POSITION_FORMATS = ('float32', 'float16', 'unorm16')
+NORMAL_FORMATS = ('float32', 'oct16')
+
+
+def encode_octahedral ( normals ):
+	"""
+	Map unit vectors onto the octahedron unfolded into [-1, 1]^2
+	:return: (N, 2) float64
+	"""
+	n = np.asarray(normals, dtype = np.float64)
+	n = n / np.maximum(np.abs(n).sum(axis = 1), 1e-12)[:, np.newaxis]
+	xy = n[:, :2].copy()
+	lower = n[:, 2] < 0.0
+	sign = np.where(xy[lower] >= 0.0, 1.0, -1.0)
+	xy[lower] = (1.0 - np.abs(xy[lower][:, ::-1])) * sign
+	return xy
+
+
+def decode_octahedral ( xy ):
+	"""
+	Inverse of encode_octahedral, as done in vertex.glsl
+	"""
+	xy = np.asarray(xy, dtype = np.float64)
+	n = np.concatenate([xy, (1.0 - np.abs(xy).sum(axis = 1))[:, np.newaxis]], axis = 1)
+	t = np.maximum(-n[:, 2], 0.0)[:, np.newaxis]
+	n[:, :2] += np.where(n[:, :2] >= 0.0, -t, t)
+	return n / np.linalg.norm(n, axis = 1)[:, np.newaxis]
+
+
+def _snorm16 ( values ):
+	return np.round(np.clip(values, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+class VertexAttribute(object):
+	def __init__ (self, location, components, type_name, normalized, offset):
+		self.location = location
+		self.components = components  # as passed to glVertexAttribPointer
+		self.type_name = type_name  # 'float', 'half', 'ushort' or 'short'
+		self.normalized = normalized
+		self.offset = offset  # bytes from the start of the vertex
+
+
+class VertexLayout(object):
+	POSITION_LOCATION = 0
+	COLOR_LOCATION = 1
+	NORMAL_LOCATION = 2
+
+	def __init__ (self, position_format = 'float32', normal_format = 'float32', colors = False):
+		"""
+		:param position_format: 'float32', 'float16' or 'unorm16' relative to the mesh bounds
+		:param normal_format: 'float32' or 'oct16', octahedral encoded snorm16
+		:param colors: keep the per-vertex color attribute, the shaders draw with uniform_color instead
+		"""
+		if position_format not in POSITION_FORMATS:
+			raise ValueError('unknown position format {}'.format(position_format))
+		if normal_format not in NORMAL_FORMATS:
+			raise ValueError('unknown normal format {}'.format(normal_format))
+		self.position_format = position_format
+		self.normal_format = normal_format
+		self.colors = colors
+
+		# (name, numpy dtype of one component, stored components, glVertexAttribPointer arguments)
+		fields = []
+		if position_format == 'float32':
+			fields.append(('position', np.float32, 3, VertexLayout.POSITION_LOCATION, 3, 'float', False))
+		elif position_format == 'float16':
+			fields.append(('position', np.float16, 4, VertexLayout.POSITION_LOCATION, 3, 'half', False))
+		else:
+			fields.append(('position', np.uint16, 4, VertexLayout.POSITION_LOCATION, 3, 'ushort', True))
+		if colors:
+			fields.append(('color', np.float32, 3, VertexLayout.COLOR_LOCATION, 3, 'float', False))
+		if normal_format == 'float32':
+			fields.append(('normal', np.float32, 3, VertexLayout.NORMAL_LOCATION, 3, 'float', False))
+		else:
+			fields.append(('normal', np.int16, 2, VertexLayout.NORMAL_LOCATION, 2, 'short', True))
+
+		self.dtype = np.dtype([(name, dtype, (count,)) for name, dtype, count, _, _, _, _ in fields])
+		self.stride = self.dtype.itemsize
+		self.attributes = [VertexAttribute(location, components, type_name, normalized,
+		                                   self.dtype.fields[name][1])
+		                   for name, _, _, location, components, type_name, normalized in fields]
+
+	def locations (self):
+		return [a.location for a in self.attributes]
+
+	def defines (self):
+		"""
+		:return: preprocessor symbols the vertex shader needs to decode this layout
+		"""
+		defines = []
+		if self.position_format == 'unorm16':
+			defines.append('QUANTIZED_POSITIONS')
+		if self.normal_format == 'oct16':
+			defines.append('OCTAHEDRAL_NORMALS')
+		return defines
+
+	def pack (self, vertices, colors, normals):
+		"""
+		:param colors: per-vertex colors, only stored by layouts that keep them
+		:param normals: per-vertex normals, left zero when there are none
+		:return: (uint8 array of len(vertices) * stride bytes, position scale, position offset),
+		         positions are decoded as offset + stored * scale
+		"""
+		vertices = np.asarray(vertices, dtype = np.float64).reshape(-1, 3)
+		packed = np.zeros(len(vertices), dtype = self.dtype)
+		scale = np.ones(3)
+		offset = np.zeros(3)
+
+		if self.position_format == 'unorm16':
+			if len(vertices) > 0:
+				offset = vertices.min(axis = 0)
+				scale = np.maximum(vertices.max(axis = 0) - offset, 1e-12)
+			packed['position'][:, :3] = np.round((vertices - offset) / scale * 65535.0)
+		else:
+			packed['position'][:, :3] = vertices
+
+		if self.colors and len(colors) == len(vertices):
+			packed['color'] = colors
+
+		normals = np.asarray(normals, dtype = np.float64).reshape(-1, 3)
+		if len(normals) == len(vertices):
+			if self.normal_format == 'oct16':
+				packed['normal'] = _snorm16(encode_octahedral(normals))
+			else:
+				packed['normal'] = normals
+
+		return packed.view(np.uint8), scale, offset
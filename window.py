@@ -1,7 +1,9 @@
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtQuick import QQuickView
 
+from common import *
 from entity import *
+from frame_scheduler import FrameScheduler
 from render_engine import SceneRenderer
 from game_engine import GameEngine
 
@@ -18,37 +20,81 @@ class View(QQuickView):
 		self._camera = Camera()
 		self._renderer = SceneRenderer(self, self._camera)
 		self._game = GameEngine(self, self._camera)
+		self._scheduler = FrameScheduler(self.update, RENDER_ON_DEMAND)
+		self._profiler = self._renderer.profiler()
+		self._draw_counters = dict()  # of the last rendered frame, read by the GUI thread
 
 		self.sceneGraphInitialized.connect(self.initialize_scene, type = Qt.DirectConnection)
 		self.beforeSynchronizing.connect(self.synchronize_scene, type = Qt.DirectConnection)
 		self.beforeRendering.connect(self.render_scene, type = Qt.DirectConnection)
 		self.sceneGraphInvalidated.connect(self.invalidate_scene, type = Qt.DirectConnection)
+		self.widthChanged.connect(self._scheduler.invalidate)
+		self.heightChanged.connect(self._scheduler.invalidate)
+		self.screenChanged.connect(self._scheduler.invalidate)  # the device pixel ratio may differ
 
 		self.rootContext().setContextProperty("_camera", self._camera)
 		self.rootContext().setContextProperty("_window", self)
-		# self.rootContext().setContextProperty("_checker_board_entities", self._renderer._title_entities)
 
 		self.setClearBeforeRendering(False)  # otherwise quick would clear everything we render
 
+		# Input received between two frames, merged and applied once in synchronize_scene
+		self._pending_hover = None
+		self._pending_mouse_position = None
+		self._pending_rotation = [0, 0]
+		self._pending_slider_values = dict()
+
 		self._game.delete_entity.connect(self._renderer.on_delete_entity)
+		self._game.set_entity_source(self._renderer.pickable_entities)
 
 	def initialize_scene (self):
 		self._renderer.initialize()
 		self.resetOpenGLState()
 
 	def render_scene (self):
-		self._renderer.prepare_titles(self._game.hover_table())
-		self._renderer.prepare_pieces(self._game.board_table())
+		with self._profiler.cpu('prepare_titles'):
+			self._renderer.prepare_titles(self._game.hover_table(), self._game.region_table())
+		with self._profiler.cpu('prepare_pieces'):
+			self._renderer.prepare_pieces(self._game.board_table())
 		self._renderer.render()
-		self.resetOpenGLState()
+		with self._profiler.cpu('resetOpenGLState'):
+			self.resetOpenGLState()
+		self._profiler.end_frame()
+		self._scheduler.frame_rendered(self._renderer.is_animating())
 
 	def invalidate_scene (self):
 		self._renderer.invalidate()
 		self.resetOpenGLState()
 
 	def synchronize_scene (self):
-		self._renderer.sync()
-		self.resetOpenGLState()
+		self._profiler.begin_frame()
+		self._scheduler.frame_started()
+		with self._profiler.cpu('synchronize_scene'):
+			self._draw_counters = self._renderer.draw_counters()
+			self.flush_input()
+			self._renderer.sync()
+		with self._profiler.cpu('resetOpenGLState'):
+			self.resetOpenGLState()
+
+	def flush_input (self):
+		"""
+		Apply the input queued since the last frame, the GUI thread is blocked while this runs
+		"""
+		if self._pending_rotation[0] != 0 or self._pending_rotation[1] != 0:
+			self._renderer.rotate_camera(self._pending_rotation[0], self._pending_rotation[1])
+			self._pending_rotation = [0, 0]
+
+		if self._pending_mouse_position is not None:
+			self._renderer.update_mouse_position(*self._pending_mouse_position)
+			self._pending_mouse_position = None
+
+		if self._pending_hover is not None:
+			self._game.on_mouse_move(*self._pending_hover)
+			self._pending_hover = None
+
+		slider_values = self._pending_slider_values
+		self._pending_slider_values = dict()
+		for handler, values in slider_values.items():
+			handler(*values)
 
 	@pyqtSlot(int, int, int)
 	def add_piece (self, kind, row, col):
@@ -65,44 +111,100 @@ class View(QQuickView):
 	@pyqtSlot(int)
 	def move_camera (self, key):
 		self._renderer.move_camera(key)
+		self._scheduler.invalidate()
 
 	@pyqtSlot(int, int)
 	def rotate_camera (self, dx, dy):
-		self._renderer.rotate_camera(dx, dy)
+		self._pending_rotation[0] += dx
+		self._pending_rotation[1] += dy
+		self._scheduler.invalidate()
 
 	@pyqtSlot(int, int)
 	def set_mouse_position (self, x, y):
-		self._renderer.update_mouse_position(x, y)
+		self._pending_mouse_position = (x, y)
+		self._scheduler.invalidate()
 
 	@pyqtSlot(int, int)
 	def on_hover (self, x, y):
-		self._game.on_mouse_move(x, y)
+		self._pending_hover = (x, y)
+		self._scheduler.invalidate()
 
 	@pyqtSlot(int, int, int)
 	def on_clicked (self, button, x, y):
 		self._game.on_clicked(button, x, y)
+		self._scheduler.invalidate()
+
+	@pyqtSlot(int, int, int, int)
+	def select_region (self, x, y, width, height):
+		self._game.select_region(x, y, width, height)
+		self._scheduler.invalidate()
 
 	@pyqtSlot()
 	def reset_board (self):
 		self._renderer.reset_board()
 		self._game.reset_board()
+		self._scheduler.invalidate()
+
+	@pyqtSlot(result = 'QVariantMap')
+	def frame_stats (self):
+		"""
+		Frames drawn, frames drawn without any change and cpu usage since the last call
+		"""
+		stats = self._scheduler.stats()
+		self._scheduler.reset_stats()
+		return stats
+
+	@pyqtSlot(result = bool)
+	def toggle_profiler (self):
+		"""
+		Start or stop recording frame phase timings, the recorded frames are dropped when stopping
+		"""
+		self._profiler.enabled = not self._profiler.enabled
+		if not self._profiler.enabled:
+			self._profiler.clear()
+		self._scheduler.invalidate()
+		return self._profiler.enabled
+
+	@pyqtSlot(result = str)
+	def profiler_summary (self):
+		"""
+		:return: recorded phase timings followed by the draw counters of the last frame
+		"""
+		counters = self._draw_counters
+		lines = [self._profiler.format_summary()]
+		lines.extend('{:<22} {:>9}'.format(name, counters[name]) for name in sorted(counters))
+		return '\n'.join(lines)
+
+	@pyqtSlot(result = str)
+	def export_trace (self):
+		"""
+		Write the recorded frames as a Chrome trace
+		:return: the file written
+		"""
+		self._profiler.export_trace(PROFILER_TRACE_FILE)
+		return PROFILER_TRACE_FILE
 
 	# SLots for signals from QML
+	# only the latest value of each slider within a frame is applied
 	@pyqtSlot(float, float, float)
 	def onScaleChanged (self, x, y, z):
-		self._renderer.on_scale_changed(x, y, z)
+		self._pending_slider_values[self._renderer.on_scale_changed] = (x, y, z)
+		self._scheduler.invalidate()
 
 	@pyqtSlot(float, float, float)
 	def onPositionChanged (self, x, y, z):
-		self._renderer.on_position_changed(x, y, z)
+		self._pending_slider_values[self._renderer.on_position_changed] = (x, y, z)
+		self._scheduler.invalidate()
 
 	@pyqtSlot(float, float, float)
 	def onColorChanged (self, r, g, b):
-		self._renderer.on_color_changed(r, g, b)
+		self._pending_slider_values[self._renderer.on_color_changed] = (r, g, b)
+		self._scheduler.invalidate()
 
 	@pyqtSlot(float, float, float)
 	def onRotationChanged (self, rx, ry, rz):
-		self._renderer.on_rotation_changed(rx, ry, rz)
+		self._pending_slider_values[self._renderer.on_rotation_changed] = (rx, ry, rz)
+		self._scheduler.invalidate()
 
 	# Send signals to QML
 	@pyqtSlot(float, float, float)
@@ -124,3 +226,4 @@ class View(QQuickView):
 	@pyqtSlot()
 	def on_delete_current_selection (self):
 		self._game.delete_current_selection()
+		self._scheduler.invalidate()